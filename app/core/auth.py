@@ -1,27 +1,91 @@
 # app/core/auth.py
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from app.database import get_db
 from app import models
+from app.core.config import settings
+from app.core.const.permissions import PERMISSION_BITS
+from app.core.rbac import rbac_index
+from app.core.revocation import token_versions
 from app.exceptions import CredentialsException
-from app.core import security
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-# ---------------- Get current user ----------------
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+
+class Principal:
+    """Caller identity with role names and a permission bitmask.
+
+    Built from claims-mode JWT claims or from the RBAC index, never from ORM
+    objects. Exposes the same has_role/has_permission API as models.User.
+    """
+
+    __slots__ = ("id", "roles", "permissions")
+
+    def __init__(self, id: int, roles, permissions: int):
+        self.id = id
+        self.roles = frozenset(roles)
+        self.permissions = permissions
+
+    def has_role(self, role_name: str) -> bool:
+        return role_name in self.roles
+
+    def has_permission(self, permission_name: str) -> bool:
+        return bool(self.permissions & PERMISSION_BITS.get(permission_name, 0))
+
+
+def decode_token(token: str) -> dict:
+    # python-jose (and the cryptography backends it loads) is imported on the
+    # first token rather than at startup
+    from jose import JWTError, jwt
+
     try:
-        payload = jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise CredentialsException()
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
     except JWTError:
         raise CredentialsException()
 
-    user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+    if payload.get("sub") is None:
+        raise CredentialsException()
+    return payload
+
+
+# ---------------- Get current user ----------------
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+):
+    user_id = decode_token(token)["sub"]
+
+    # Roles and permissions are loaded up front: lazy loads are not allowed on
+    # an AsyncSession, and has_role/has_permission need both.
+    user = await db.scalar(
+        select(models.User)
+        .options(selectinload(models.User.roles).selectinload(models.Role.permissions))
+        .where(models.User.id == int(user_id))
+    )
     if user is None:
         raise CredentialsException()
 
     return user
+
+
+# ---------------- Get current principal ----------------
+# Used by guards and handlers that only need the caller's id and access rights.
+# In "claims" mode it is answered from the token alone (plus a version check);
+# otherwise from the RBAC index, which only queries on a cache miss.
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+):
+    payload = decode_token(token)
+    user_id = int(payload["sub"])
+
+    if settings.AUTH_TOKEN_MODE == "claims" and "roles" in payload:
+        if payload.get("ver", 0) != await token_versions.get(user_id):
+            raise CredentialsException()
+        return Principal(user_id, payload["roles"], payload.get("perms", 0))
+
+    roles = await rbac_index.roles_for(db, user_id)
+    if roles is None:
+        raise CredentialsException()
+    return Principal(user_id, roles, rbac_index.mask_for(roles))
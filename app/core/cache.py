@@ -1,11 +1,410 @@
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-# from redis import asyncio as aioredis
-from fastapi_cache.backends.inmemory import InMemoryBackend
+# Two-tier response cache for hot read endpoints, with tag-based invalidation.
+#
+# L1 is a per-process LRU; L2 is shared by every worker: Redis, or a SQLite
+# file read through mmap for multi-worker single-host setups. With
+# CACHE_BACKEND=memory there is no L2 and L1 is the whole cache.
+#
+# Entries hold an encoded JSON body plus headers, so a hit skips the DB, the
+# ORM and response validation. Each entry records the version of every tag
+# it depends on ("food:42", "foods:list") when it was built; invalidating a
+# tag bumps its version, which turns all entries built before into misses.
+# Tag versions are read before the loader runs, so a write racing a miss
+# can never leave a stale entry behind. L1 entries are checked against this
+# process's tag versions only: an invalidation made by another worker
+# reaches them within CACHE_L1_TTL_SECONDS.
+#
+# Expiry never stampedes the DB:
+# - concurrent misses on a key share one build (single-flight, per process),
+#   unless the build read its tag versions before an invalidation the
+#   missing request has seen: that request starts a build of its own, and a
+#   build invalidated while it ran answers its waiters but is not stored;
+# - shortly before expiry one request refreshes the entry in the background
+#   while others keep the cached copy (XFetch, probabilistic early refresh);
+# - for CACHE_STALE_SECONDS after expiry the old entry is served while it is
+#   rebuilt (stale-while-revalidate). Invalidated entries are never served.
+#
+# Caching is opt-in: a route calls fetch() with a CachePolicy naming its TTLs
+# and auth scope. "public" entries are shared by every caller; "user" entries
+# are keyed by the principal, so one user never sees another's response.
+#
+# Builds read from a read replica when the request itself could (see
+# database.reads_from_replica), except within READ_YOUR_WRITES_SECONDS of an
+# invalidation of one of their tags: a lagging replica could still miss that
+# write, and the entry would then pin the old data for its whole TTL, for
+# the writer too. Invalidation times are shared through the L2.
+import asyncio
+import json
+import logging
+import math
+import random
+import sqlite3
+import time
+from fastapi import Response
+from app.core.config import settings
+from app.core.lru import LRUCache
+from app.database import read_session, reads_from_replica
+
+logger = logging.getLogger(__name__)
+
+# Tags: every page of GET /foods depends on FOODS_LIST, GET /foods/{id} on
+# food_tag(id). FOOD_MACROS covers responses computed from food macros.
+FOODS_LIST = "foods:list"
+FOOD_MACROS = "foods:macros"
+
+
+def food_tag(food_id: int) -> str:
+    return f"food:{food_id}"
+
+
+def user_meals_tag(user_id: int) -> str:
+    return f"meals:user:{user_id}"
+
+
+class CachePolicy:
+    """How one route is cached. Unset TTLs fall back to the CACHE_* settings."""
+
+    __slots__ = ("name", "scope", "ttl", "stale_ttl")
+    SCOPES = ("public", "user")
+
+    def __init__(self, name: str, scope: str = "public", ttl: float | None = None, stale_ttl: float | None = None):
+        if scope not in self.SCOPES:
+            raise ValueError(f"Unknown cache scope: {scope}")
+        self.name = name
+        self.scope = scope
+        self.ttl = settings.CACHE_TTL_SECONDS if ttl is None else ttl
+        self.stale_ttl = settings.CACHE_STALE_SECONDS if stale_ttl is None else stale_ttl
+
+    def key(self, key: str, principal=None) -> str:
+        if self.scope == "public":
+            return f"{self.name}:{key}"
+        if principal is None:
+            raise ValueError(f"Cache policy {self.name!r} is user-scoped but got no principal")
+        return f"{self.name}:user:{principal.id}:{key}"
+
+
+# ---------- Shared (L2) backends ----------
+class RedisCacheBackend:
+    def __init__(self, redis, prefix: str = "response-cache"):
+        self.redis = redis
+        self.prefix = prefix
+
+    def _tag(self, tag: str) -> str:
+        return f"{self.prefix}:tag:{tag}"
+
+    def _invalidated(self, tag: str) -> str:
+        return f"{self.prefix}:invalidated:{tag}"
+
+    async def get(self, key: str, tags) -> tuple:
+        # Entry and tag versions in one round trip
+        raw, *versions = await self.redis.mget(
+            f"{self.prefix}:entry:{key}", *(self._tag(tag) for tag in tags)
+        )
+        entry = json.loads(raw) if raw is not None else None
+        return entry, [int(version or 0) for version in versions]
+
+    async def versions(self, tags) -> list[int]:
+        return [int(version or 0) for version in await self.redis.mget(*map(self._tag, tags))]
+
+    async def last_invalidated(self, tags) -> float:
+        return max(float(at or 0) for at in await self.redis.mget(*map(self._invalidated, tags)))
+
+    async def set(self, key: str, entry: dict, ttl: float):
+        await self.redis.set(f"{self.prefix}:entry:{key}", json.dumps(entry), ex=max(1, math.ceil(ttl)))
+
+    async def invalidate(self, tags):
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.incr(self._tag(tag))
+                # Only read within the read-your-writes window
+                pipe.set(self._invalidated(tag), now, ex=max(1, math.ceil(settings.READ_YOUR_WRITES_SECONDS)))
+            await pipe.execute()
+
+    async def ping(self):
+        return await self.redis.ping()
+
+
+class SQLiteCacheBackend:
+    """Cache file shared by the workers of one host.
+
+    Reads go through SQLite's mmap of the file (no syscalls once pages are
+    mapped) and WAL lets them run alongside a writer. Every call is a
+    microsecond-scale local query, so it runs inline on the event loop.
+    """
+
+    def __init__(self, path: str, mmap_size: int = 256 * 2**20):
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        for pragma in (
+            "journal_mode=WAL",
+            "synchronous=OFF",  # a cache can lose its last writes on power loss
+            f"mmap_size={mmap_size}",
+            "busy_timeout=100",
+        ):
+            self.connection.execute(f"PRAGMA {pragma}")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entry "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_tag (tag TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+            "invalidated_at REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(cache_tag)")}
+        if "invalidated_at" not in columns:  # cache file from an older release
+            self.connection.execute(
+                "ALTER TABLE cache_tag ADD COLUMN invalidated_at REAL NOT NULL DEFAULT 0"
+            )
+
+    async def get(self, key: str, tags) -> tuple:
+        row = self.connection.execute(
+            "SELECT value FROM cache_entry WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        entry = json.loads(row[0]) if row else None
+        return entry, await self.versions(tags)
+
+    async def versions(self, tags) -> list[int]:
+        tags = list(tags)
+        rows = dict(
+            self.connection.execute(
+                f"SELECT tag, version FROM cache_tag WHERE tag IN ({','.join('?' * len(tags))})",
+                tags,
+            )
+        )
+        return [rows.get(tag, 0) for tag in tags]
+
+    async def last_invalidated(self, tags) -> float:
+        tags = list(tags)
+        row = self.connection.execute(
+            f"SELECT max(invalidated_at) FROM cache_tag WHERE tag IN ({','.join('?' * len(tags))})",
+            tags,
+        ).fetchone()
+        return row[0] or 0.0
+
+    async def set(self, key: str, entry: dict, ttl: float):
+        now = time.time()
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cache_entry VALUES (?, ?, ?)", (key, json.dumps(entry), now + ttl)
+            )
+            # Keep the file from growing forever; cheap on the expires_at scan
+            if random.random() < 0.01:
+                self.connection.execute("DELETE FROM cache_entry WHERE expires_at <= ?", (now,))
+
+    async def invalidate(self, tags):
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT INTO cache_tag VALUES (?, 1, ?) "
+                "ON CONFLICT(tag) DO UPDATE SET version = version + 1, "
+                "invalidated_at = excluded.invalidated_at",
+                [(tag, time.time()) for tag in tags],
+            )
+
+    async def ping(self):
+        self.connection.execute("SELECT 1")
+        return True
+
+
+# ---------- Cache ----------
+class _Flight:
+    """An in-progress build of one key, with the tag versions it started from."""
+
+    __slots__ = ("task", "local", "versions")
+
+    def __init__(self, local: list[int]):
+        self.task: asyncio.Task | None = None
+        self.local = local
+        self.versions: list[int] | None = None  # L2 versions, once read
+
+    def joinable(self, local: list[int], seen: list[int] | None) -> bool:
+        if self.local != local:
+            return False  # invalidated in this process since the build started
+        if seen is None or self.versions is None:
+            return True  # the build reads L2 versions after `seen` was read
+        return all(mine >= theirs for mine, theirs in zip(self.versions, seen))
+
+
+class ResponseCache:
+    def __init__(self, l2=None, l1_maxsize: int = 10_000, l1_ttl: float | None = None):
+        self.l2 = l2
+        # Without an L2, L1 entries live until their stale window ends
+        self.l1_ttl = l1_ttl if l2 is not None else None
+        self.l1 = LRUCache(l1_maxsize)
+        self.tag_versions: dict[str, int] = {}  # this process's invalidations
+        self.invalidated_at: dict[str, float] = {}  # and when they happened
+        self._inflight: dict[str, _Flight] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.refreshes = 0
+
+    def _local_versions(self, tags) -> list[int]:
+        return [self.tag_versions.get(tag, 0) for tag in tags]
+
+    async def _lookup(self, key: str, tags) -> tuple[dict | None, list[int] | None]:
+        """The valid entry for `key`, if any, and the L2 tag versions read."""
+        local = self._local_versions(tags)
+        cached = self.l1.get(key)
+        if cached is not None and cached[1] == local:
+            return cached[0], None
+        if self.l2 is None:
+            return None, None
+
+        entry, versions = await self.l2.get(key, tags)
+        if entry is None or entry["versions"] != versions:
+            return None, versions
+        self._remember(key, entry, local)
+        return entry, versions
+
+    def _remember(self, key: str, entry: dict, local_versions: list[int]):
+        ttl = entry["stale_until"] - time.time()
+        if self.l1_ttl is not None:
+            ttl = min(ttl, self.l1_ttl)
+        if ttl > 0:
+            self.l1.set(key, (entry, local_versions), ttl)
+
+    async def fetch(
+        self, policy: CachePolicy, key: str, tags: list[str], build, principal=None, request=None
+    ) -> Response:
+        """Cached JSON response, or `await build(db) -> (body bytes, headers)`.
+
+        build() gets its own session: it may outlive the request that
+        triggered it (background refresh) or serve several (single-flight).
+        Given the `request`, that session is a replica's when the request
+        would read from one.
+        """
+        key = policy.key(key, principal)
+        entry, seen = await self._lookup(key, tags)
+        if entry is not None:
+            now = time.time()
+            # XFetch: the closer to expiry, and the slower the build, the
+            # likelier a request refreshes early (-log(random()) is Exp(1))
+            early = entry["delta"] * settings.CACHE_XFETCH_BETA * -math.log(1.0 - random.random())
+            if now + early < entry["expires_at"]:
+                self.hits += 1
+                return _response(entry)
+            if now < entry["stale_until"]:
+                # Early refresh or stale-while-revalidate: answer now, rebuild behind
+                if now < entry["expires_at"]:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                self._refresh(policy, key, tags, build, await _replica(request))
+                return _response(entry)
+
+        self.misses += 1
+        flight = self._inflight.get(key)
+        task = self._refresh(policy, key, tags, build, await _replica(request), seen)
+        if flight is not None and task is flight.task:
+            self.coalesced += 1
+        # shield: a client disconnecting must not cancel a build others wait on
+        return _response(await asyncio.shield(task))
+
+    def _refresh(self, policy: CachePolicy, key: str, tags, build, replica: bool, seen=None) -> asyncio.Task:
+        local = self._local_versions(tags)
+        flight = self._inflight.get(key)
+        if flight is not None and flight.joinable(local, seen):
+            return flight.task
+        # A build from older versions keeps running for its own waiters
+        flight = _Flight(local)
+        flight.task = asyncio.ensure_future(self._build(policy, key, tags, build, replica, flight))
+        self._inflight[key] = flight
+        flight.task.add_done_callback(lambda done: self._finished(key, flight))
+        return flight.task
+
+    def _finished(self, key: str, flight: _Flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        task = flight.task
+        if not task.cancelled() and task.exception() is not None:
+            # Also marks the exception retrieved for background refreshes
+            logger.debug("cache build for %s failed: %r", key, task.exception())
+
+    async def _recently_invalidated(self, tags) -> bool:
+        since = time.time() - settings.READ_YOUR_WRITES_SECONDS
+        if any(self.invalidated_at.get(tag, 0.0) > since for tag in tags):
+            return True
+        return self.l2 is not None and await self.l2.last_invalidated(tags) > since
+
+    async def _build(self, policy: CachePolicy, key: str, tags, build, replica: bool, flight: _Flight) -> dict:
+        self.refreshes += 1
+        # Versions are read before the data: a concurrent invalidation wins
+        local = flight.local
+        versions = await self.l2.versions(tags) if self.l2 is not None else local
+        flight.versions = versions
+        replica = replica and not await self._recently_invalidated(tags)
+
+        started = time.time()
+        async with read_session(replica) as db:
+            body, headers = await build(db)
+        now = time.time()
+
+        entry = {
+            "body": body.decode(),
+            "headers": headers,
+            "versions": versions,
+            "delta": now - started,
+            "expires_at": now + policy.ttl,
+            "stale_until": now + policy.ttl + policy.stale_ttl,
+        }
+        if self._local_versions(tags) != local:
+            # Invalidated here while building: the waiters (who came before
+            # the invalidation) get it, later requests never do. An entry
+            # invalidated by another worker carries its old versions, so L2
+            # lookups reject it anyway.
+            return entry
+        if self.l2 is not None:
+            await self.l2.set(key, entry, policy.ttl + policy.stale_ttl)
+        self._remember(key, entry, local)
+        return entry
+
+    async def invalidate(self, *tags: str):
+        now = time.time()
+        for tag in tags:
+            self.tag_versions[tag] = self.tag_versions.get(tag, 0) + 1
+            self.invalidated_at[tag] = now
+        if self.l2 is not None:
+            await self.l2.invalidate(tags)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "backend": settings.CACHE_BACKEND,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+async def _replica(request) -> bool:
+    return request is not None and await reads_from_replica(request)
+
+
+def _response(entry: dict) -> Response:
+    return Response(content=entry["body"], media_type="application/json", headers=entry["headers"])
+
+
+def _build_l2():
+    if settings.CACHE_BACKEND == "redis":
+        from redis import asyncio as aioredis
+
+        return RedisCacheBackend(aioredis.from_url(settings.REDIS_URL))
+    if settings.CACHE_BACKEND == "sqlite":
+        return SQLiteCacheBackend(settings.CACHE_SQLITE_PATH)
+    return None
+
+
+response_cache = ResponseCache(
+    _build_l2(), l1_maxsize=settings.CACHE_MAX_ENTRIES, l1_ttl=settings.CACHE_L1_TTL_SECONDS
+)
 
 
-# TODO: add conditional cache using depending on the context
 async def init_cache():
-    # redis = aioredis.from_url("redis://localhost")
-    # FastAPICache.init(RedisBackend(redis), prefix="nutrition-cache")
-    FastAPICache.init(InMemoryBackend(), prefix="dev-cache")
+    # Fail at startup rather than on the first request if the L2 is unreachable
+    if response_cache.l2 is not None:
+        await response_cache.l2.ping()
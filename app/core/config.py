@@ -5,18 +5,66 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt worker processes
+    PASSWORD_HASH_QUEUE_SIZE: int = 64  # jobs allowed to wait before 503
+    AUTH_TOKEN_MODE: str = "db"  # "db" | "claims" (roles/permissions embedded in the JWT)
+    TOKEN_VERSION_BACKEND: str = "memory"  # "memory" | "redis"
+    RBAC_CACHE_SIZE: int = 10_000  # users whose roles are kept in memory
+    RBAC_CACHE_TTL_SECONDS: int = 300
 
     # Database
     DATABASE_URL: str
     DEV_DATABASE_URL: str
     TEST_DATABASE_URL: str | None = None
+    DATABASE_PROFILE: str = "default"  # "default" | "production" (WAL, tuned pragmas, single writer)
+    DATABASE_POOL_SIZE: int = 10  # production profile: reader connections per worker
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_WRITE_TIMEOUT_SECONDS: float = 30  # production profile: max wait for the writer connection
+    SQLITE_MMAP_SIZE: int = 256 * 2**20
+    SQLITE_CACHE_SIZE_KB: int = 64_000  # page cache per connection
+    SQLITE_BUSY_TIMEOUT_MS: int = 5_000  # wait for another process's write lock
+    DATABASE_REPLICA_URLS: str = ""  # comma-separated read replicas for GET requests
+    DATABASE_REPLICA_STRATEGY: str = "round_robin"  # "round_robin" | "least_connections"
+    READ_YOUR_WRITES_SECONDS: float = 5  # a user's reads stay on the primary after a write
+    READ_YOUR_WRITES_BACKEND: str = "memory"  # "memory" (per process) | "redis"
 
     # Environment
     ENVIRONMENT: str = "local"
     DEBUG: bool = True
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (per process) | "shm" (per host) | "redis"
+    RATE_LIMIT_DEFAULT: str = "60/minute"  # every request, per client IP
+    RATE_LIMIT_AUTH: str = "5/minute"  # register and login, per client IP
+    RATE_LIMIT_SHM_PATH: str = ""  # defaults to a file in /dev/shm
+    RATE_LIMIT_SHM_SLOTS: int = 65_536  # keys tracked at once by the shm backend
+
+    # Search
+    SEARCH_RANK_WINDOW: int = 1000  # best-ranked matches loaded per query (bounds worst case)
+    FOOD_NEIGHBORS_LEAF_SIZE: int = 32  # foods per KD-tree leaf
+    FOOD_NEIGHBORS_REBUILD_FRACTION: float = 0.1  # pending inserts + deletions, as a share of the tree
+
+    # Import / export
+    FOOD_IMPORT_CHUNK_SIZE: int = 5000  # rows validated and committed together
+    FOOD_IMPORT_MAX_ERRORS: int = 1000  # row errors kept in the report
+    MEAL_EXPORT_BATCH_SIZE: int = 1000  # rows fetched per server-side cursor round trip
+    MEAL_BATCH_MAX_SIZE: int = 5000  # meals accepted by one POST /meals/batch
+
+    # Metrics
+    PROMETHEUS_MULTIPROC_DIR: str = ""  # shared by all workers; empty: single-process metrics
+    METRICS_SYNC_SECONDS: float = 5  # how often component stats are copied into metrics
+    SQL_PROFILER_ENABLED: bool = False  # can also be switched at runtime: PUT /sql-profiler
+    SQL_SLOW_QUERY_MS: float = 100  # statements logged as slow
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5  # same statement this many times in one request
 
     # Cache
     REDIS_URL: str
+    CACHE_BACKEND: str = "memory"  # shared L2: "memory" (none) | "redis" | "sqlite"
+    CACHE_SQLITE_PATH: str = "./cache.db"  # mmap-backed L2 shared by one host's workers
+    CACHE_MAX_ENTRIES: int = 10_000  # per-process L1
+    CACHE_L1_TTL_SECONDS: float = 5  # bounds staleness of L1 after another worker invalidates
+    CACHE_TTL_SECONDS: float = 300
+    CACHE_STALE_SECONDS: float = 60  # served while being rebuilt after expiry
+    CACHE_XFETCH_BETA: float = 1.0  # >1 refreshes earlier, 0 disables early refresh
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -21,3 +21,16 @@ class PERMISSIONS:
         MEAL_UPDATE,
         MEAL_DELETE,
     ]
+
+
+# Bit assigned to each permission in compact bitmasks (JWT claims, RBAC index).
+# Only ever append to PERMISSIONS.ALL: reordering changes the meaning of
+# masks that are already issued.
+PERMISSION_BITS = {name: 1 << index for index, name in enumerate(PERMISSIONS.ALL)}
+
+
+def permissions_to_mask(permission_names) -> int:
+    mask = 0
+    for name in permission_names:
+        mask |= PERMISSION_BITS.get(name, 0)
+    return mask
@@ -0,0 +1,102 @@
+# Weak ETags from version counters, for conditional GETs.
+#
+# Writes bump table_version counters, which never go down: "food" for any
+# food write (stamped on the row as food.revision), and one counter per user
+# for their meals (user_meals_counter, stamped on the row as meal.version).
+# Ids can be reused once the highest row is deleted, and a reused id would
+# otherwise start again at version 1, so:
+# - a single row's ETag is its id and version plus its counter stamp, which
+#   a later row with the same id can never repeat;
+# - a page's ETag is an aggregate over the rows the page reads (count, sum of
+#   ids, sum of versions) plus the counter, which every insert, edit and
+#   delete moves; meals also carry the "food" counter, as they embed foods.
+# Checking If-None-Match therefore costs one indexed lookup and never loads
+# or serializes the rows themselves.
+from fastapi import Request, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+
+
+def weak_etag(*parts) -> str:
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def _opaque(tag: str) -> str:
+    # Weak comparison (RFC 9110 8.8.3.2): W/ prefixes are ignored
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_fresh(request: Request, etag: str) -> bool:
+    """True when the client's If-None-Match already names `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(tag) for tag in header.split(",")}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+# ---------- Version counters ----------
+def user_meals_counter(user_id: int) -> str:
+    """table_version name counting writes to one user's meals."""
+    return f"meal:user:{user_id}"
+
+
+def table_version_column(name: str):
+    """Scalar subquery for a table's version, to embed in another query."""
+    return (
+        select(func.coalesce(func.max(models.TableVersion.version), 0))
+        .where(models.TableVersion.name == name)
+        .scalar_subquery()
+    )
+
+
+def _bump(dialect_name: str, name: str):
+    table = models.TableVersion.__table__
+    insert = (postgresql if dialect_name == "postgresql" else sqlite).insert
+    statement = insert(table).values(name=name, version=1)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.name], set_={"version": table.c.version + 1}
+    ).returning(table.c.version)
+
+
+async def bump_table_version(db: AsyncSession, name: str) -> int:
+    """Count one more write to `name`, in the caller's transaction; the new version."""
+    return await db.scalar(_bump(db.bind.dialect.name, name))
+
+
+def bump_table_version_sync(connection, name: str) -> int:
+    """bump_table_version on a sync connection (seeders and scripts)."""
+    return connection.scalar(_bump(connection.dialect.name, name))
+
+
+# ---------- ETags ----------
+async def row_etag(db: AsyncSession, prefix: str, model, row_id: int, *extra_columns) -> str | None:
+    """ETag of one row by primary key, or None if it doesn't exist."""
+    row = (
+        await db.execute(select(model.version, *extra_columns).where(model.id == row_id))
+    ).first()
+    return weak_etag(prefix, row_id, *row) if row is not None else None
+
+
+async def range_etag(db: AsyncSession, prefix: str, range_query, model, *extra_columns) -> str:
+    """ETag of the rows `range_query` (an ordered, limited select) reads."""
+    rows = range_query.with_only_columns(model.id, model.version).subquery()
+    stats = (
+        await db.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(rows.c.id), 0),
+                func.coalesce(func.sum(rows.c.version), 0),
+                *extra_columns,
+            ).select_from(rows)
+        )
+    ).one()
+    return weak_etag(prefix, *stats)
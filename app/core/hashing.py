@@ -0,0 +1,71 @@
+# Password hashing runs in a bounded process pool: bcrypt is CPU bound and
+# would otherwise stall the event loop (and every other request) while it works.
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from app.core.config import settings
+from app.exceptions import ServiceUnavailableException
+
+_pwd_context = None
+_executor: ProcessPoolExecutor | None = None
+_in_flight = 0
+
+
+def _context():
+    # passlib is only imported by the processes that hash, on first use
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+
+def verify_password(plain_password, hashed_password):
+    return _context().verify(plain_password, hashed_password)
+
+
+def get_password_hash(password):
+    return _context().hash(password)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    # Created on first use so importing the app doesn't fork workers
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+    return _executor
+
+
+def queue_depth() -> int:
+    """Hash jobs submitted to the pool and not finished yet."""
+    return _in_flight
+
+
+async def _run_in_pool(fn, *args):
+    global _in_flight
+    # Backpressure: once every worker is busy and the queue is full, fail fast
+    # instead of piling up requests that will time out anyway.
+    if _in_flight >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE:
+        raise ServiceUnavailableException()
+
+    _in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _in_flight -= 1
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_in_pool(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    return await _run_in_pool(get_password_hash, password)
+
+
+def shutdown_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,18 +1,270 @@
-from fastapi import FastAPI, Request
-from slowapi import Limiter
-from slowapi.errors import RateLimitExceeded
-from slowapi.util import get_remote_address
+# Rate limiting with GCRA (generic cell rate algorithm).
+#
+# A limit of N requests per period admits one request every period/N
+# seconds with bursts of up to N. Per key, the only state is the
+# "theoretical arrival time" (TAT) of the next request, so a check is one
+# read-modify-write: one dict lookup, one locked mmap slot, or one Redis
+# script call (EVALSHA) for the shared backends.
+#
+# Backends (RATE_LIMIT_BACKEND):
+# - memory: per process. With N workers the effective limit is N times higher.
+# - shm: a memory-mapped file shared by every worker of one host, one
+#   fcntl-locked slot per key.
+# - redis: shared by every host.
+#
+# Every request is counted against RATE_LIMIT_DEFAULT per client IP by
+# RateLimitMiddleware; routes add their own limits with
+# Depends(rate_limit("5/minute")), keyed by IP or by authenticated user.
+# Responses carry X-RateLimit-Limit/-Remaining/-Reset for the most specific
+# limit that applied, and 429s a Retry-After.
+import fcntl
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from fastapi import Depends, FastAPI, Request, Response
+from app.core import auth
+from app.core.config import settings
+from app.core.lru import LRUCache
 from app.exceptions import RateLimitException
-from slowapi.middleware import SlowAPIMiddleware
 
-limiter = Limiter(key_func=get_remote_address, default_limits=["60/minute"])
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
 
 
-def register_rate_limiter(app: FastAPI):
-    @app.exception_handler(RateLimitExceeded)
-    async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
-        return RateLimitException()
+class RateLimit:
+    """N requests per period, parsed from "5/minute" or "1000/hour"."""
+
+    __slots__ = ("count", "period", "interval", "text")
+
+    def __init__(self, count: int, period: float, text: str):
+        self.count = count
+        self.period = period
+        self.interval = period / count  # emission interval
+        self.text = text
+
+    @classmethod
+    def parse(cls, text: str) -> "RateLimit":
+        try:
+            count, unit = text.split("/")
+            return cls(int(count), PERIODS[unit.strip().rstrip("s")], text)
+        except (ValueError, KeyError):
+            raise ValueError(f"Invalid rate limit {text!r}, expected e.g. '5/minute'")
+
+
+class RateLimitResult:
+    __slots__ = ("allowed", "limit", "remaining", "reset_after", "retry_after")
+
+    def __init__(self, limit: RateLimit, allowed: bool, tat: float, now: float):
+        """`tat` is the key's TAT after the check (unchanged if rejected)."""
+        self.allowed = allowed
+        self.limit = limit
+        self.reset_after = max(0.0, tat - now)  # until the full burst is available
+        if allowed:
+            self.remaining = int((now - (tat - limit.period)) / limit.interval)
+            self.retry_after = 0.0
+        else:
+            self.remaining = 0
+            self.retry_after = tat + limit.interval - limit.period - now
+
+    def headers(self) -> dict:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit.count),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def _gcra(tat: float | None, now: float, limit: RateLimit) -> tuple[bool, float]:
+    """(allowed, TAT to store)."""
+    tat = now if tat is None or tat < now else tat
+    new_tat = tat + limit.interval
+    if now < new_tat - limit.period:
+        return False, tat
+    return True, new_tat
+
+
+# ---------- Backends ----------
+class InMemoryRateLimitBackend:
+    def __init__(self, maxsize: int = 100_000):
+        self.tats = LRUCache(maxsize)
+
+    async def hit(self, key: str, limit: RateLimit) -> RateLimitResult:
+        now = time.monotonic()
+        allowed, tat = _gcra(self.tats.get(key), now, limit)
+        if allowed:
+            # A TAT in the past carries no information, so let it expire
+            self.tats.set(key, tat, tat - now)
+        return RateLimitResult(limit, allowed, tat, now)
+
+
+class SharedMemoryRateLimitBackend:
+    """Fixed table of (key hash, TAT) slots in a file mapped by every worker.
+
+    A key owns slot hash % slots; a colliding key takes the slot over, which
+    can only make the limit more lenient for the evicted key. CLOCK_MONOTONIC
+    is system-wide, so TATs compare across processes.
+    """
+
+    SLOT = struct.Struct("<Qd")
+
+    def __init__(self, path: str, slots: int):
+        self.slots = slots
+        size = slots * self.SLOT.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+
+    async def hit(self, key: str, limit: RateLimit) -> RateLimitResult:
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+        offset = (digest % self.slots) * self.SLOT.size
+
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, self.SLOT.size, offset)
+        try:
+            now = time.monotonic()
+            owner, stored = self.SLOT.unpack_from(self.map, offset)
+            allowed, tat = _gcra(stored if owner == digest else None, now, limit)
+            if allowed:
+                self.SLOT.pack_into(self.map, offset, digest, tat)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, self.SLOT.size, offset)
+        return RateLimitResult(limit, allowed, tat, now)
+
+
+class RedisRateLimitBackend:
+    # Same algorithm as _gcra(), on Redis' clock so hosts agree on "now"
+    SCRIPT = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local interval, period = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local tat = tonumber(redis.call('GET', KEYS[1]))
+    if not tat or tat < now then tat = now end
+    local new_tat = tat + interval
+    if now < new_tat - period then
+        return {0, tostring(tat), tostring(now)}
+    end
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+    return {1, tostring(new_tat), tostring(now)}
+    """
+
+    def __init__(self, redis, prefix: str = "rate-limit"):
+        self.prefix = prefix
+        self.script = redis.register_script(self.SCRIPT)
+
+    async def hit(self, key: str, limit: RateLimit) -> RateLimitResult:
+        allowed, tat, now = await self.script(
+            keys=[f"{self.prefix}:{key}"], args=[limit.interval, limit.period]
+        )
+        return RateLimitResult(limit, bool(allowed), float(tat), float(now))
+
 
-    app.state.limiter = limiter
-    app.add_middleware(SlowAPIMiddleware)
-    app.add_exception_handler(RateLimitExceeded, rate_limit_handler)
+def _build_backend():
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        from redis import asyncio as aioredis
+
+        return RedisRateLimitBackend(aioredis.from_url(settings.REDIS_URL))
+    if settings.RATE_LIMIT_BACKEND == "shm":
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        path = settings.RATE_LIMIT_SHM_PATH or os.path.join(directory, "nutrition-api-rate-limit")
+        return SharedMemoryRateLimitBackend(path, settings.RATE_LIMIT_SHM_SLOTS)
+    return InMemoryRateLimitBackend()
+
+
+class RateLimiter:
+    def __init__(self, backend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.rejected = 0
+
+    async def hit(self, scope: str, key: str, limit: RateLimit) -> RateLimitResult:
+        result = await self.backend.hit(f"{scope}:{key}", limit)
+        if not result.allowed:
+            self.rejected += 1
+        return result
+
+
+limiter = RateLimiter(_build_backend(), enabled=settings.RATE_LIMIT_ENABLED)
+
+
+def client_ip(request_or_scope) -> str:
+    client = request_or_scope.client if isinstance(request_or_scope, Request) else request_or_scope.get("client")
+    return client[0] if client else "unknown"
+
+
+# ---------- Route limits ----------
+def rate_limit(limit: str, key: str = "ip"):
+    """Dependency limiting one route, per client IP or per authenticated user."""
+    parsed = RateLimit.parse(limit)
+
+    async def check(request: Request, response: Response, subject: str):
+        if not limiter.enabled:
+            return
+        # Buckets are per route: the same client has separate quotas on /login and /register
+        result = await limiter.hit(request.scope["route"].path, subject, parsed)
+        if not result.allowed:
+            raise RateLimitException(headers=result.headers())
+        response.headers.update(result.headers())
+
+    if key == "user":
+        async def by_user(request: Request, response: Response, principal=Depends(auth.get_current_principal)):
+            await check(request, response, f"user:{principal.id}")
+
+        return by_user
+    if key == "ip":
+        async def by_ip(request: Request, response: Response):
+            await check(request, response, f"ip:{client_ip(request)}")
+
+        return by_ip
+    raise ValueError(f"Unknown rate limit key: {key}")
+
+
+# ---------- Default limit ----------
+class RateLimitMiddleware:
+    """Counts every HTTP request against `limit` per client IP.
+
+    Plain ASGI (no BaseHTTPMiddleware) to keep the per-request cost low.
+    Route limits set their own X-RateLimit-* headers, which take precedence.
+    """
+
+    def __init__(self, app, limit: str):
+        self.app = app
+        self.limit = RateLimit.parse(limit)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        result = await limiter.hit("default", client_ip(scope), self.limit)
+        headers = [(name.lower().encode(), value.encode()) for name, value in result.headers().items()]
+        if not result.allowed:
+            body = json.dumps({"detail": RateLimitException.DETAIL}).encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": [(b"content-type", b"application/json"), *headers],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                present = {name.lower() for name, _ in message.get("headers", [])}
+                if b"x-ratelimit-limit" not in present:
+                    message["headers"] = [*message.get("headers", []), *headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+def register_rate_limiter(app: FastAPI):
+    if limiter.enabled:
+        app.add_middleware(RateLimitMiddleware, limit=settings.RATE_LIMIT_DEFAULT)
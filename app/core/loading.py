@@ -0,0 +1,20 @@
+# Eager-loading strategy per response schema.
+#
+# Each response schema declares the relationships it serializes. List
+# endpoints load them with selectinload (one extra `IN (...)` query per
+# relationship, whatever the page size); single-row endpoints use joinedload
+# (one query in total). Lazy loads are not possible on an AsyncSession, so a
+# relationship missing here fails loudly instead of turning into N+1 queries.
+from sqlalchemy.orm import joinedload, selectinload
+from app import models, schemas
+
+RESPONSE_RELATIONSHIPS = {
+    schemas.FoodResponse: (),
+    schemas.MealResponse: (models.Meal.foods,),
+    schemas.UserResponse: (models.User.roles,),
+}
+
+
+def load_options(schema, many: bool = True):
+    loader = selectinload if many else joinedload
+    return [loader(relationship) for relationship in RESPONSE_RELATIONSHIPS[schema]]
@@ -0,0 +1,212 @@
+# Prometheus metrics, aggregated across uvicorn workers.
+#
+# With PROMETHEUS_MULTIPROC_DIR set, prometheus_client keeps every value in
+# an mmap'd file per worker and GET /metrics merges the files of all
+# workers, so whichever worker answers the scrape reports the whole server.
+# The directory must be emptied before the server starts (stale files of
+# dead workers would be counted), e.g. `rm -rf $DIR && mkdir $DIR` in the
+# start script. Unset, metrics cover the answering process only.
+#
+# Hot path: MetricsMiddleware times each request and counts it by status,
+# and each route's ASGI app is wrapped to track requests in flight. Label
+# children are resolved once and reused. Everything else (DB pool, response
+# cache, rate limiter, bcrypt pool) already keeps its own counters; a
+# background task copies them into Prometheus every METRICS_SYNC_SECONDS,
+# and the answering worker copies its own again when scraped.
+#
+# Useful queries:
+#   histogram_quantile(0.99, sum by (le, route) (rate(http_request_duration_seconds_bucket[5m])))
+#   sum(rate(cache_lookups_total{result!="miss"}[5m])) / sum(rate(cache_lookups_total[5m]))
+import asyncio
+import os
+import time
+from fastapi import FastAPI, Response
+from app.core.config import settings
+
+# prometheus_client picks its storage when imported
+if settings.PROMETHEUS_MULTIPROC_DIR:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.PROMETHEUS_MULTIPROC_DIR)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event  # noqa: E402
+from app.core import hashing  # noqa: E402
+from app.core.cache import response_cache  # noqa: E402
+from app.core.limiter import limiter  # noqa: E402
+from app.database import ENGINES  # noqa: E402
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+UNMATCHED = "unmatched"  # requests answered before routing (404, rate limited)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to answer a request, by route template",
+    ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter("http_requests_total", "Requests answered", ["method", "route", "status"])
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being handled", ["method", "route"], multiprocess_mode="livesum"
+)
+
+DB_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool", ["engine"])
+DB_CONNECTS = Counter("db_pool_connections_opened_total", "New DBAPI connections", ["engine"])
+DB_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections in use", ["engine"], multiprocess_mode="livesum"
+)
+DB_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections open beyond pool_size", ["engine"], multiprocess_mode="livesum"
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured pool size", ["engine"], multiprocess_mode="livesum")
+
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Response cache lookups", ["result"])
+CACHE_COALESCED = Counter("cache_coalesced_total", "Misses that waited on a build already running")
+CACHE_REFRESHES = Counter("cache_refreshes_total", "Response cache builds")
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rejected with 429")
+HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth", "bcrypt jobs running or waiting", multiprocess_mode="livesum"
+)
+
+
+# ---------- Requests ----------
+class MetricsMiddleware:
+    """Latency and status of every HTTP request, labelled by route template."""
+
+    def __init__(self, app):
+        self.app = app
+        self.children: dict = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500  # unless a response starts
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else UNMATCHED, status)
+            children = self.children.get(key)
+            if children is None:
+                children = self.children[key] = (
+                    REQUEST_DURATION.labels(key[0], key[1]),
+                    REQUESTS.labels(key[0], key[1], str(status)),
+                )
+            children[0].observe(time.perf_counter() - started)
+            children[1].inc()
+
+
+class _InFlight:
+    __slots__ = ("app", "gauges")
+
+    def __init__(self, app, path: str, methods):
+        self.app = app
+        self.gauges = {method: IN_FLIGHT.labels(method, path) for method in methods}
+
+    async def __call__(self, scope, receive, send):
+        gauge = self.gauges.get(scope.get("method"))
+        if gauge is None:
+            return await self.app(scope, receive, send)
+        gauge.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gauge.dec()
+
+
+# ---------- Component stats ----------
+def _watch_pool(name: str, sync_engine):
+    checkouts, connects = DB_CHECKOUTS.labels(name), DB_CONNECTS.labels(name)
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checkouts.inc()
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        connects.inc()
+
+
+for _name, _engine in ENGINES.items():
+    _watch_pool(_name, _engine)
+
+_reported: dict = {}  # counter -> cumulative value already added
+
+
+def _report(counter, total: int):
+    delta = total - _reported.get(counter, 0)
+    if delta > 0:
+        counter.inc(delta)
+        _reported[counter] = total
+
+
+def sync_stats():
+    """Copy this process's component counters into Prometheus."""
+    for name, sync_engine in ENGINES.items():
+        pool = sync_engine.pool
+        # Pools without a fixed size (NullPool, StaticPool) lack these
+        if hasattr(pool, "checkedout"):
+            DB_CHECKED_OUT.labels(name).set(pool.checkedout())
+            DB_OVERFLOW.labels(name).set(max(0, pool.overflow()))
+            DB_POOL_SIZE.labels(name).set(pool.size())
+
+    _report(CACHE_LOOKUPS.labels("hit"), response_cache.hits)
+    _report(CACHE_LOOKUPS.labels("stale"), response_cache.stale_hits)
+    _report(CACHE_LOOKUPS.labels("miss"), response_cache.misses)
+    _report(CACHE_COALESCED, response_cache.coalesced)
+    _report(CACHE_REFRESHES, response_cache.refreshes)
+    _report(RATE_LIMIT_REJECTIONS, limiter.rejected)
+    HASH_QUEUE_DEPTH.set(hashing.queue_depth())
+
+
+async def _sync_forever():
+    while True:
+        sync_stats()
+        await asyncio.sleep(settings.METRICS_SYNC_SECONDS)
+
+
+def start_stats_sync() -> asyncio.Task:
+    return asyncio.ensure_future(_sync_forever())
+
+
+def shutdown():
+    if MULTIPROCESS:
+        # Drops this worker's "live" gauges from the aggregate
+        multiprocess.mark_process_dead(os.getpid())
+
+
+# ---------- Exposition ----------
+def render() -> Response:
+    sync_stats()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def register_metrics(app: FastAPI):
+    """Instrument the routes registered so far and add the middleware."""
+    for route in app.router.routes:
+        methods = getattr(route, "methods", None)
+        if methods:
+            route.app = _InFlight(route.app, route.path, methods)
+    app.add_middleware(MetricsMiddleware)
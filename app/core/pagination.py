@@ -0,0 +1,134 @@
+# Keyset (cursor) pagination.
+#
+# A cursor holds the sort key of the row to continue from and the direction,
+# base64-encoded so clients treat it as opaque. Each page is a single
+# `WHERE (cols) > :key ORDER BY cols LIMIT n` range scan, so page 10,000
+# costs the same as page 1 (unlike OFFSET, which reads and discards rows).
+import base64
+import json
+from datetime import date, datetime
+from fastapi import Response
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.exceptions import InvalidCursorException
+
+NEXT = "next"
+PREV = "prev"
+
+
+class Page:
+    __slots__ = ("items", "next_cursor", "prev_cursor")
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def _to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _from_json(value, column):
+    python_type = column.type.python_type
+    if python_type in (datetime, date) and isinstance(value, str):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(key, direction: str) -> str:
+    raw = json.dumps({"k": [_to_json(v) for v in key], "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns) -> tuple[list, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        key = [_from_json(v, c) for v, c in zip(data["k"], columns, strict=True)]
+        direction = data["d"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursorException()
+
+    if direction not in (NEXT, PREV):
+        raise InvalidCursorException()
+    return key, direction
+
+
+def _row_key(item, columns):
+    return [getattr(item, column.key) for column in columns]
+
+
+def _after(columns, key):
+    if len(columns) == 1:
+        return columns[0] > key[0]
+    return tuple_(*columns) > tuple_(*key)
+
+
+def _before(columns, key):
+    if len(columns) == 1:
+        return columns[0] < key[0]
+    return tuple_(*columns) < tuple_(*key)
+
+
+def _keyset_range(query, columns, limit: int, cursor: str | None):
+    direction = NEXT
+    key = None
+    if cursor:
+        key, direction = decode_cursor(cursor, columns)
+
+    if direction == NEXT:
+        if key is not None:
+            query = query.where(_after(columns, key))
+        query = query.order_by(*(c.asc() for c in columns))
+    else:
+        query = query.where(_before(columns, key)).order_by(*(c.desc() for c in columns))
+
+    # One extra row tells us whether there is another page without a COUNT
+    return query.limit(limit + 1), key, direction
+
+
+def keyset_range(query, columns, limit: int, cursor: str | None = None):
+    """The rows keyset_paginate() reads for this page (including the look-ahead row)."""
+    return _keyset_range(query, columns, limit, cursor)[0]
+
+
+async def keyset_paginate(
+    db: AsyncSession, query, columns, limit: int, cursor: str | None = None
+) -> Page:
+    """Fetch one page of `query` ordered by `columns` (a unique sort key)."""
+    query, key, direction = _keyset_range(query, columns, limit, cursor)
+    rows = (await db.scalars(query)).all()
+    has_more = len(rows) > limit
+    items = list(rows[:limit])
+
+    if direction == PREV:
+        items.reverse()
+
+    if not items:
+        return Page(items)
+
+    first, last = _row_key(items[0], columns), _row_key(items[-1], columns)
+    if direction == NEXT:
+        next_cursor = encode_cursor(last, NEXT) if has_more else None
+        prev_cursor = encode_cursor(first, PREV) if key is not None else None
+    else:
+        next_cursor = encode_cursor(last, NEXT)
+        prev_cursor = encode_cursor(first, PREV) if has_more else None
+
+    return Page(items, next_cursor, prev_cursor)
+
+
+def cursor_headers(page: Page) -> dict:
+    headers = {}
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    if page.prev_cursor:
+        headers["X-Prev-Cursor"] = page.prev_cursor
+    return headers
+
+
+def set_cursor_headers(response: Response, page: Page):
+    response.headers.update(cursor_headers(page))
@@ -0,0 +1,92 @@
+# In-process RBAC index.
+#
+# role name -> permission bitmask is built once from the role/permission tables;
+# user id -> role names is cached in an LRU with a TTL. A permission check is
+# then a dict lookup and a bitwise AND, with no queries on the hot path.
+#
+# Invalidation is local to the process: other workers pick up role changes
+# when their entries expire (RBAC_CACHE_TTL_SECONDS).
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app import models
+from app.core.config import settings
+from app.core.const.permissions import PERMISSION_BITS
+from app.core.lru import LRUCache
+
+
+class RBACIndex:
+    def __init__(self, maxsize: int, ttl: float):
+        self.role_masks: dict[str, int] = {}
+        self.user_roles = LRUCache(maxsize, ttl)
+        self.loaded = False
+
+    # ---------- Building ----------
+    @staticmethod
+    def _role_permissions_query():
+        return (
+            select(models.Role.name, models.Permission.name)
+            .select_from(models.Role)
+            .outerjoin(models.role_permission_association)
+            .outerjoin(models.Permission)
+        )
+
+    def _build(self, rows):
+        masks: dict[str, int] = {}
+        for role_name, permission_name in rows:
+            masks[role_name] = masks.get(role_name, 0) | PERMISSION_BITS.get(
+                permission_name, 0
+            )
+        self.role_masks = masks
+        self.loaded = True
+
+    def load(self, db: Session):
+        self._build(db.execute(self._role_permissions_query()).all())
+
+    async def aload(self, db: AsyncSession):
+        self._build((await db.execute(self._role_permissions_query())).all())
+
+    # ---------- Lookups ----------
+    async def roles_for(self, db: AsyncSession, user_id: int) -> frozenset | None:
+        """Role names of a user, or None if the user doesn't exist."""
+        if not self.loaded:
+            await self.aload(db)
+
+        roles = self.user_roles.get(user_id)
+        if roles is not None:
+            return roles
+
+        rows = (
+            await db.execute(
+                select(models.User.id, models.Role.name)
+                .select_from(models.User)
+                .outerjoin(models.user_role_association)
+                .outerjoin(models.Role)
+                .where(models.User.id == user_id)
+            )
+        ).all()
+        if not rows:
+            return None
+
+        roles = frozenset(name for _, name in rows if name is not None)
+        self.user_roles.set(user_id, roles)
+        return roles
+
+    def mask_for(self, roles) -> int:
+        mask = 0
+        for role_name in roles:
+            mask |= self.role_masks.get(role_name, 0)
+        return mask
+
+    # ---------- Invalidation ----------
+    def invalidate_user(self, user_id: int):
+        self.user_roles.pop(user_id)
+
+    def invalidate_all(self):
+        """Roles or permissions changed: rebuild everything on next use."""
+        self.role_masks = {}
+        self.user_roles.clear()
+        self.loaded = False
+
+
+rbac_index = RBACIndex(settings.RBAC_CACHE_SIZE, settings.RBAC_CACHE_TTL_SECONDS)
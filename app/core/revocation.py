@@ -0,0 +1,44 @@
+# Per-user token versions for claims-mode JWTs.
+# Tokens carry the version they were issued with; bumping the version (e.g.
+# when an admin changes a user's roles) invalidates every token issued before.
+from app.core.config import settings
+
+
+class InMemoryTokenVersionStore:
+    """Process-local store. Fine for a single worker and for tests."""
+
+    def __init__(self):
+        self._versions: dict[int, int] = {}
+
+    async def get(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    async def bump(self, user_id: int) -> int:
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        return self._versions[user_id]
+
+
+class RedisTokenVersionStore:
+    """Shared store, so a bump is seen by every worker and host."""
+
+    def __init__(self, redis, prefix: str = "token-version"):
+        self.redis = redis
+        self.prefix = prefix
+
+    async def get(self, user_id: int) -> int:
+        value = await self.redis.get(f"{self.prefix}:{user_id}")
+        return int(value) if value is not None else 0
+
+    async def bump(self, user_id: int) -> int:
+        return await self.redis.incr(f"{self.prefix}:{user_id}")
+
+
+def _build_store():
+    if settings.TOKEN_VERSION_BACKEND == "redis":
+        from redis import asyncio as aioredis
+
+        return RedisTokenVersionStore(aioredis.from_url(settings.REDIS_URL))
+    return InMemoryTokenVersionStore()
+
+
+token_versions = _build_store()
@@ -1,35 +1,48 @@
 from datetime import datetime, timedelta, timezone
-from http.client import HTTPException
 from fastapi import Depends
-from jose import jwt
-from passlib.context import CryptContext
 from app.core import auth
 from app.core.config import settings
+from app.core.const.permissions import permissions_to_mask
+from app.core.hashing import (
+    get_password_hash,
+    get_password_hash_async,
+    verify_password,
+    verify_password_async,
+)
 from app.exceptions import AccessException
 from app.models import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-
-def create_access_token(data: dict, expires_delta: timedelta | None = None):
+def create_access_token(
+    data: dict,
+    expires_delta: timedelta | None = None,
+    user: User | None = None,
+    token_version: int = 0,
+):
     to_encode = data.copy()
+    # Claims mode: embed what the guards need so they can skip the DB.
+    # `user` must have roles and their permissions loaded.
+    if user is not None and settings.AUTH_TOKEN_MODE == "claims":
+        to_encode.update(
+            {
+                "roles": [role.name for role in user.roles],
+                "perms": permissions_to_mask(
+                    p.name for role in user.roles for p in role.permissions
+                ),
+                "ver": token_version,
+            }
+        )
     expire = datetime.now(timezone.utc) + (
         expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     to_encode.update({"exp": expire})
+    from jose import jwt  # imported on first use, see auth.decode_token
+
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 
 def require_permission(permission_name: str):
-    def wrapper(user: User = Depends(auth.get_current_user)):
+    async def wrapper(user: User = Depends(auth.get_current_principal)):
         if not user.has_permission(permission_name):
             raise AccessException(detail=f"User has no access to this resource")
         return user
@@ -38,7 +51,7 @@ def require_permission(permission_name: str):
 
 
 def require_role(role_name: str):
-    def wrapper(user: User = Depends(auth.get_current_user)):
+    async def wrapper(user: User = Depends(auth.get_current_principal)):
         if not user.has_role(role_name):
             raise AccessException(detail=f"User has no access to this resource")
         return user
@@ -4,6 +4,11 @@ from app.core import security
 from sqlalchemy.orm import Session
 
 
+ADMIN_USERNAME = "admin"
+ADMIN_EMAIL = "admin@system.local"
+ADMIN_PASSWORD = "ChangeMe123!"
+
+
 class MissingAdminRoleException(Exception):
     """Raised when the admin role has not been seeded yet."""
     pass
@@ -18,12 +23,12 @@ def seed_admin(db: Session):
             "Please run `seed_roles_and_permissions(db)` before seeding the admin user."
         )
 
-    admin_user = db.query(User).filter_by(email="admin@system.local").first()
+    admin_user = db.query(User).filter_by(email=ADMIN_EMAIL).first()
     if not admin_user:
         admin_user = User(
-            username="admin",
-            email="admin@system.local",
-            hashed_password=security.get_password_hash("ChangeMe123!"),
+            username=ADMIN_USERNAME,
+            email=ADMIN_EMAIL,
+            hashed_password=security.get_password_hash(ADMIN_PASSWORD),
             roles=[admin_role],
         )
         db.add(admin_user)
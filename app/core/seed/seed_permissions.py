@@ -1,5 +1,6 @@
 from app.core.const.permissions import PERMISSIONS
 from app.models import Permission
+from app.core.rbac import rbac_index
 from sqlalchemy.orm import Session
 
 
@@ -12,3 +13,4 @@ def seed_permissions(db: Session):
             db.add(Permission(name=perm_name))
 
     db.commit()
+    rbac_index.invalidate_all()
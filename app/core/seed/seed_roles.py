@@ -1,25 +1,27 @@
 from app.core.const.base_roles import BASE_ROLES
 from app.models import Role, Permission
+from app.core.rbac import rbac_index
 from sqlalchemy.orm import Session
 
+# Base roles created at startup, in this order
+SEEDED_ROLES = (BASE_ROLES.ADMIN, BASE_ROLES.SPECIALIST)
+
+
+def grants(role_name: str, permission_name: str) -> bool:
+    """Whether a newly created base role is given the permission."""
+    if role_name == BASE_ROLES.ADMIN:
+        return True
+    return permission_name.startswith("meal.") or permission_name.startswith("food.")
+
 
 def seed_roles(db: Session):
 
     # Create base roles and assign permissions
-    admin = db.query(Role).filter_by(name=BASE_ROLES.ADMIN).first()
-    if not admin:
-        admin = Role(name=BASE_ROLES.ADMIN)
-        admin.permissions = db.query(Permission).all()
-        db.add(admin)
-
-    specialist = db.query(Role).filter_by(name=BASE_ROLES.SPECIALIST).first()
-    if not specialist:
-        specialist = Role(name=BASE_ROLES.SPECIALIST)
-        specialist.permissions = [
-            p
-            for p in db.query(Permission).all()
-            if p.name.startswith("meal.") or p.name.startswith("food.")
-        ]
-        db.add(specialist)
+    for role_name in SEEDED_ROLES:
+        if not db.query(Role).filter_by(name=role_name).first():
+            role = Role(name=role_name)
+            role.permissions = [p for p in db.query(Permission).all() if grants(role_name, p.name)]
+            db.add(role)
 
     db.commit()
+    rbac_index.invalidate_all()
@@ -0,0 +1,282 @@
+# Synthetic dataset generator for scale testing.
+#
+#   python -m app.core.seed.synthetic --foods 1000000 --users 100000 --meals 50000000
+#
+# Rows are generated with NumPy in chunks of --chunk meals and written with
+# one executemany per table per chunk, each chunk in its own transaction.
+# On SQLite the load also:
+# - turns off foreign key checks and fsyncs for the connection doing it;
+# - drops the secondary indexes of the meal and meal_food_association tables
+#   and rebuilds them once at the end (much faster than maintaining them row
+#   by row);
+# - inserts association rows in primary key order, so the B-tree only grows
+#   at its right edge;
+# - indexes new food names for search with one INSERT ... SELECT instead of
+#   the per-row trigger (as food_search.bulk_indexing does).
+# Elsewhere it falls back to SQLAlchemy Core bulk inserts. New foods are
+# stamped with one bump of the "food" table version, as API writes are, so
+# running workers' catalog snapshots pick them up on their next refresh.
+#
+# Shape of the data:
+# - food popularity is Zipfian (--zipf, 0 = uniform) over a random ranking,
+#   so the most used foods are not simply the lowest ids;
+# - user activity is log-normal (--user-skew, 0 = every user alike);
+# - meals cluster around breakfast, lunch, snack and dinner times, and days
+#   have gamma-distributed volume (--burstiness: lower = burstier);
+# - each meal has 1 + Poisson(--foods-per-meal - 1) distinct foods.
+#
+# The same --seed and arguments produce the same rows. New rows get ids above
+# the current maximum, so the generator can add to an existing database.
+# Daily nutrition rollups are rebuilt at the end (--skip-rollups to skip).
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import numpy as np
+from sqlalchemy import func, insert, select
+from app import models
+from app.core.const.base_roles import BASE_ROLES
+from app.core.etag import bump_table_version_sync
+from app.core.hashing import get_password_hash
+from app.database import Base, engine
+from app.services import nutrition_rollups
+
+# (mean hour, standard deviation in hours, share of meals, name)
+MEAL_TIMES = (
+    (8.0, 1.0, 0.25, "Breakfast"),
+    (13.0, 1.0, 0.35, "Lunch"),
+    (16.5, 1.5, 0.10, "Snack"),
+    (19.5, 1.2, 0.30, "Dinner"),
+)
+DEFAULT_PASSWORD = "synthetic-password"
+
+
+class Generator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+
+    # ---------- Distributions ----------
+    def zipf_sampler(self, ids: np.ndarray, exponent: float):
+        """Draws ids with P(k-th most popular) proportional to 1 / k**exponent."""
+        ranking = self.rng.permutation(ids)
+        cdf = np.cumsum(1.0 / np.arange(1, len(ids) + 1) ** exponent)
+        cdf /= cdf[-1]
+        return lambda size: ranking[np.searchsorted(cdf, self.rng.random(size), side="right")]
+
+    def user_sampler(self, ids: np.ndarray):
+        weights = self.rng.lognormal(0.0, self.args.user_skew, len(ids))
+        return lambda size: self.rng.choice(ids, size=size, p=weights / weights.sum())
+
+    def timestamps(self, size: int) -> tuple[list[str], np.ndarray]:
+        """Bursty timestamps in SQLAlchemy's SQLite format, and their meal slot."""
+        days = self.rng.gamma(self.args.burstiness, size=self.args.days)
+        day = self.rng.choice(self.args.days, size=size, p=days / days.sum())
+
+        slot = self.rng.choice(len(MEAL_TIMES), size=size, p=[share for _, _, share, _ in MEAL_TIMES])
+        means = np.array([mean for mean, _, _, _ in MEAL_TIMES])[slot]
+        deviations = np.array([sd for _, sd, _, _ in MEAL_TIMES])[slot]
+        hours = np.clip(self.rng.normal(means, deviations), 0, 24 - 1e-6)
+
+        micros = (day * 86_400 + hours * 3600) * 1_000_000
+        stamps = np.datetime64(self.args.start, "us") + micros.astype("timedelta64[us]")
+        text = np.datetime_as_string(stamps, unit="us")
+        return [value.replace("T", " ") for value in text.tolist()], slot
+
+    # ---------- Rows ----------
+    def foods(self, first_id: int, count: int) -> list[tuple]:
+        ids = range(first_id, first_id + count)
+        protein = self.rng.gamma(2.0, 5.0, count).round(1)
+        fat = self.rng.gamma(1.5, 6.0, count).round(1)
+        carbohydrates = self.rng.gamma(1.5, 15.0, count).round(1)
+        calories = (4 * protein + 9 * fat + 4 * carbohydrates).round(0)
+        return list(
+            zip(
+                ids,
+                (f"synthetic food {i}" for i in ids),
+                calories.tolist(),
+                protein.tolist(),
+                fat.tolist(),
+                carbohydrates.tolist(),
+            )
+        )
+
+    def users(self, first_id: int, count: int, hashed_password: str) -> list[tuple]:
+        return [
+            (i, f"user{i}", f"user{i}@synthetic.local", hashed_password)
+            for i in range(first_id, first_id + count)
+        ]
+
+    def meals(self, first_id: int, count: int, pick_users, pick_foods) -> tuple[list[tuple], list[tuple]]:
+        ids = np.arange(first_id, first_id + count, dtype=np.int64)
+        stamps, slot = self.timestamps(count)
+        names = np.array([name for _, _, _, name in MEAL_TIMES], dtype=object)[slot]
+        meals = list(zip(ids.tolist(), pick_users(count).tolist(), names.tolist(), stamps))
+
+        per_meal = 1 + self.rng.poisson(self.args.foods_per_meal - 1, count)
+        meal_ids = np.repeat(ids, per_meal)
+        food_ids = pick_foods(len(meal_ids)).astype(np.int64)
+        # Drop repeated foods within a meal; sorting by the key gives PK order
+        stride = int(food_ids.max()) + 1
+        keys = np.unique(meal_ids * stride + food_ids)
+        associations = list(zip((keys // stride).tolist(), (keys % stride).tolist()))
+        return meals, associations
+
+
+# ---------- Writing ----------
+def _insert(connection, table, columns: tuple[str, ...], rows: list[tuple]):
+    if not rows:
+        return
+    if connection.dialect.name == "sqlite":
+        # Plain executemany: no per-row parameter processing
+        connection.exec_driver_sql(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows,
+        )
+    else:
+        connection.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+def _next_id(connection, model) -> int:
+    return connection.scalar(select(func.coalesce(func.max(model.id), 0))) + 1
+
+
+def _ids(connection, model) -> np.ndarray:
+    return np.fromiter(connection.scalars(select(model.id).order_by(model.id)), dtype=np.int64)
+
+
+def _report(label: str, rows: int, started: float):
+    elapsed = time.perf_counter() - started
+    print(f"{label}: {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f}/s)", flush=True)
+
+
+def generate(args):
+    generator = Generator(args)
+    sqlite = engine.dialect.name == "sqlite"
+    meal_table = models.Meal.__table__
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as connection:
+        if sqlite:
+            # Per connection; foreign keys can only be toggled outside a transaction
+            for pragma in ("foreign_keys=OFF", "synchronous=OFF", "cache_size=-262144", "temp_store=MEMORY"):
+                connection.exec_driver_sql(f"PRAGMA {pragma}")
+            connection.commit()
+
+        # Foods
+        started = time.perf_counter()
+        with connection.begin():
+            first_food = _next_id(connection, models.Food)
+            revision = bump_table_version_sync(connection, "food") if args.foods else 0
+            if sqlite:
+                connection.exec_driver_sql("DROP TRIGGER IF EXISTS food_search_ai")
+            for offset in range(0, args.foods, args.chunk):
+                count = min(args.chunk, args.foods - offset)
+                _insert(
+                    connection,
+                    models.Food.__table__,
+                    ("id", "name", "calories", "protein", "fat", "carbohydrates", "revision"),
+                    [(*row, revision) for row in generator.foods(first_food + offset, count)],
+                )
+            if sqlite:
+                for index in ("food_fts", "food_trigram"):
+                    connection.exec_driver_sql(
+                        f"INSERT INTO {index}(rowid, name) SELECT id, name FROM food WHERE id >= ?",
+                        (first_food,),
+                    )
+                connection.exec_driver_sql(models.FOOD_SEARCH_INSERT_TRIGGER)
+        _report("foods", args.foods, started)
+
+        # Users (one bcrypt hash for all of them)
+        started = time.perf_counter()
+        with connection.begin():
+            first_user = _next_id(connection, models.User)
+            hashed = get_password_hash(args.password)
+            user_role = connection.scalar(select(models.Role.id).where(models.Role.name == BASE_ROLES.USER))
+            for offset in range(0, args.users, args.chunk):
+                count = min(args.chunk, args.users - offset)
+                rows = generator.users(first_user + offset, count, hashed)
+                _insert(connection, models.User.__table__, ("id", "username", "email", "hashed_password"), rows)
+                if user_role is not None:
+                    _insert(
+                        connection,
+                        models.user_role_association,
+                        ("user_id", "role_id"),
+                        [(row[0], user_role) for row in rows],
+                    )
+        _report("users", args.users, started)
+
+        if not args.meals:
+            return
+        food_ids, user_ids = _ids(connection, models.Food), _ids(connection, models.User)
+        connection.commit()
+        if not len(food_ids) or not len(user_ids):
+            raise SystemExit("Meals need at least one food and one user")
+        pick_foods = generator.zipf_sampler(food_ids, args.zipf)
+        pick_users = generator.user_sampler(user_ids)
+
+        # Meals and their foods
+        started = time.perf_counter()
+        associations = 0
+        secondary = [*meal_table.indexes, *models.meal_food_association.indexes] if sqlite else []
+        with connection.begin():
+            for index in secondary:
+                index.drop(connection, checkfirst=True)
+        first_meal = _next_id(connection, models.Meal)
+        connection.commit()
+        # Generate the next chunk in a thread while this one is written:
+        # sqlite3 releases the GIL while stepping statements
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            chunks = [(first_meal + offset, min(args.chunk, args.meals - offset)) for offset in range(0, args.meals, args.chunk)]
+            pending = pool.submit(generator.meals, *chunks[0], pick_users, pick_foods)
+            for position in range(len(chunks)):
+                meals, links = pending.result()
+                if position + 1 < len(chunks):
+                    pending = pool.submit(generator.meals, *chunks[position + 1], pick_users, pick_foods)
+                with connection.begin():
+                    _insert(connection, meal_table, ("id", "user_id", "name", "timestamp"), meals)
+                    _insert(connection, models.meal_food_association, ("meal_id", "food_id"), links)
+                associations += len(links)
+                print(f"  {meals[-1][0] - first_meal + 1:,} meals, {associations:,} meal foods", flush=True)
+        _report("meals", args.meals, started)
+        _report("meal foods", associations, started)
+
+        started = time.perf_counter()
+        with connection.begin():
+            for index in secondary:
+                index.create(connection, checkfirst=True)
+        _report("meal indexes", args.meals, started)
+
+        if not args.skip_rollups:
+            started = time.perf_counter()
+            with connection.begin():
+                nutrition_rollups.rebuild(connection)
+            _report("daily nutrition rebuilt from meals", args.meals, started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a large synthetic dataset")
+    parser.add_argument("--foods", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--meals", type=int, default=50_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--zipf", type=float, default=1.0, help="food popularity exponent (0 = uniform)")
+    parser.add_argument("--user-skew", type=float, default=1.0, help="log-normal sigma of user activity")
+    parser.add_argument("--burstiness", type=float, default=0.5, help="gamma shape of daily volume")
+    parser.add_argument("--foods-per-meal", type=float, default=2.0, help="mean, at least 1")
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2023, 1, 1))
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--chunk", type=int, default=250_000, help="rows per transaction")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--skip-rollups", action="store_true")
+    args = parser.parse_args()
+    if args.foods_per_meal < 1:
+        parser.error("--foods-per-meal must be at least 1")
+
+    started = time.perf_counter()
+    generate(args)
+    print(f"done in {time.perf_counter() - started:.1f}s at {datetime.now():%H:%M:%S}")
+
+
+if __name__ == "__main__":
+    main()
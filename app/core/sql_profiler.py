@@ -0,0 +1,163 @@
+# Opt-in per-request SQL profiler.
+#
+# While enabled, cursor execute listeners on every engine time each
+# statement and add it to the current request's QueryStats (a contextvar
+# set by SQLProfilerMiddleware). Each response then carries
+#   Server-Timing: db;dur=12.4;desc="6 queries"
+# statements slower than SQL_SLOW_QUERY_MS are logged, and a statement
+# fingerprint seen SQL_N_PLUS_ONE_THRESHOLD times or more in one request is
+# logged as a likely N+1 with the endpoint that ran it.
+#
+# Fingerprints are statements with literals and IN-list lengths erased, so
+# "WHERE id IN (?, ?)" and "WHERE id IN (?, ?, ?)" count as the same query.
+#
+# Switch it with SQL_PROFILER_ENABLED at startup or PUT /sql-profiler at
+# runtime. Disabled, the listeners are removed and the middleware is a
+# single attribute check. Runtime switches apply to the worker answering
+# the request; with several workers, send the request to each or set the
+# setting and restart.
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+from app.core.config import settings
+from app.database import ENGINES
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_POSITIONAL = re.compile(r"\$\d+|%\(\w+\)s|%s|:\w+")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    statement = _POSITIONAL.sub("?", statement)
+    statement = _LITERALS.sub("?", statement)
+    statement = _LISTS.sub("(...)", statement)
+    return _SPACE.sub(" ", statement).strip()
+
+
+class QueryStats:
+    __slots__ = ("scope", "count", "seconds", "fingerprints")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints: Counter = Counter()
+
+    @property
+    def endpoint(self) -> str:
+        # The router adds the route and endpoint to the scope once matched
+        route, endpoint = self.scope.get("route"), self.scope.get("endpoint")
+        path = route.path if route is not None else self.scope["path"]
+        name = f" ({endpoint.__module__}.{endpoint.__name__})" if endpoint is not None else ""
+        return f"{self.scope['method']} {path}{name}"
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries"'
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(fp, count) for fp, count in self.fingerprints.most_common() if count >= threshold]
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("sql_profiler_stats", default=None)
+
+
+class SQLProfiler:
+    def __init__(self, engines):
+        self.engines = engines
+        self.enabled = False
+        self.slow_query_ms = settings.SQL_SLOW_QUERY_MS
+        self.n_plus_one_threshold = settings.SQL_N_PLUS_ONE_THRESHOLD
+        self._fingerprints: dict[str, str] = {}  # statement -> fingerprint
+
+    def enable(self):
+        if not self.enabled:
+            for target in self.engines:
+                event.listen(target, "before_cursor_execute", self._before)
+                event.listen(target, "after_cursor_execute", self._after)
+            self.enabled = True
+
+    def disable(self):
+        if self.enabled:
+            for target in self.engines:
+                event.remove(target, "before_cursor_execute", self._before)
+                event.remove(target, "after_cursor_execute", self._after)
+            self.enabled = False
+
+    def state(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "slow_query_ms": self.slow_query_ms,
+            "n_plus_one_threshold": self.n_plus_one_threshold,
+        }
+
+    def _fingerprint(self, statement: str) -> str:
+        # Statements come from a small set of compiled queries: normalize once
+        found = self._fingerprints.get(statement)
+        if found is None:
+            if len(self._fingerprints) >= 10_000:
+                self._fingerprints.clear()
+            found = self._fingerprints[statement] = fingerprint(statement)
+        return found
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sql_profiler_started", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("sql_profiler_started")
+        if not started:
+            return  # enabled while this statement was running
+        elapsed = time.perf_counter() - started.pop()
+
+        stats = _current.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+            stats.fingerprints[self._fingerprint(statement)] += 1
+        if elapsed * 1000 >= self.slow_query_ms:
+            logger.warning(
+                "Slow query (%.1f ms) in %s: %s",
+                elapsed * 1000,
+                stats.endpoint if stats is not None else "background task",
+                self._fingerprint(statement),
+            )
+
+    def finish(self, stats: QueryStats):
+        for fp, count in stats.repeated(self.n_plus_one_threshold):
+            logger.warning("Possible N+1 in %s: %d x %s", stats.endpoint, count, fp)
+
+
+sql_profiler = SQLProfiler(list(ENGINES.values()))
+if settings.SQL_PROFILER_ENABLED:
+    sql_profiler.enable()
+
+
+class SQLProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not sql_profiler.enabled:
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats(scope)
+        token = _current.set(stats)
+
+        async def send_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", stats.server_timing().encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timing)
+        finally:
+            _current.reset(token)
+            sql_profiler.finish(stats)
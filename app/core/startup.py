@@ -0,0 +1,199 @@
+# Startup pipeline: bring the database to the current schema and seed data.
+#
+# Every worker runs prepare_database() from the lifespan. On an up-to-date
+# database that costs two queries and no writes:
+# - schema: the schema_version row against models.SCHEMA_VERSION (instead of
+#   create_all, which checks every table on every boot);
+# - seed data: one UNION ALL query for the base permissions, the base roles
+#   and the admin user.
+# Otherwise the worker takes the startup lock, checks both again (another
+# worker may have done the work while it waited) and does what is missing
+# in one transaction. The lock is pg_advisory_xact_lock on Postgres and the
+# database's own write lock (BEGIN IMMEDIATE) on SQLite, so workers booting
+# together wait for the first one instead of racing on unique constraints.
+#
+# Migrating creates missing tables, adds missing columns (new columns need a
+# server default when NOT NULL) and their indexes, creates the food search
+# indexes on a food table that predates them, and fills a new daily_nutrition
+# table from the meals. There is no downgrade: a database newer than the code
+# is an error.
+from contextlib import contextmanager
+from sqlalchemy import exc, insert, inspect, literal, select, union_all
+from sqlalchemy.schema import CreateColumn
+from app import models
+from app.core.const.permissions import PERMISSIONS
+from app.core.rbac import rbac_index
+from app.core.seed.seed_admin import ADMIN_EMAIL, ADMIN_PASSWORD, ADMIN_USERNAME
+from app.core.seed.seed_roles import SEEDED_ROLES, grants
+from app.database import Base, engine
+
+STARTUP_LOCK_ID = 0x6E7574726974696F  # any fixed bigint, shared by every worker
+
+
+class SchemaTooNewException(Exception):
+    """Raised when the database was migrated by a newer version of the app."""
+    pass
+
+
+# ---------- Checks ----------
+def schema_version(connection) -> int | None:
+    """Version recorded in the database, or None before the first migration."""
+    if not inspect(connection).has_table(models.SchemaVersion.__tablename__):
+        return None
+    version = connection.scalar(select(models.SchemaVersion.version))
+    if version is not None and version > models.SCHEMA_VERSION:
+        raise SchemaTooNewException(
+            f"Database schema version {version} is newer than this code ({models.SCHEMA_VERSION})"
+        )
+    return version
+
+
+def missing_seed(connection) -> tuple[list[str], list[str], bool]:
+    """Base permissions and roles that don't exist, and whether the admin is missing."""
+    rows = connection.execute(
+        union_all(
+            select(literal("permission"), models.Permission.name),
+            select(literal("role"), models.Role.name).where(models.Role.name.in_(SEEDED_ROLES)),
+            select(literal("user"), models.User.email).where(models.User.email == ADMIN_EMAIL),
+        )
+    ).all()
+    found = {(kind, name) for kind, name in rows}
+    return (
+        [name for name in PERMISSIONS.ALL if ("permission", name) not in found],
+        [name for name in SEEDED_ROLES if ("role", name) not in found],
+        ("user", ADMIN_EMAIL) not in found,
+    )
+
+
+def _up_to_date(connection) -> bool:
+    # One query for the common case; schema_version() looks closer if it fails
+    try:
+        if connection.scalar(select(models.SchemaVersion.version)) != models.SCHEMA_VERSION:
+            return False
+        permissions, roles, admin = missing_seed(connection)
+        return not (permissions or roles or admin)
+    except (exc.OperationalError, exc.ProgrammingError):
+        return False  # no schema_version table yet
+    finally:
+        connection.rollback()
+
+
+# ---------- Migration ----------
+def _add_column(connection, table, column):
+    spec = CreateColumn(column).compile(dialect=connection.dialect)
+    preparer = connection.dialect.identifier_preparer
+    connection.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {spec}")
+
+
+def migrate(connection, version: int | None):
+    existing = set(inspect(connection).get_table_names())
+    Base.metadata.create_all(bind=connection)
+
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                _add_column(connection, table, column)
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+    dialect = connection.dialect.name
+    if "food" in existing:
+        # Search DDL only runs when create_all creates the food table
+        for statement in models.FOOD_SEARCH_DDL.get(dialect, []):
+            connection.exec_driver_sql(statement)
+        if dialect == "sqlite" and "food_fts" not in existing:
+            for index in ("food_fts", "food_trigram"):
+                connection.exec_driver_sql(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+    if "meal" in existing and "daily_nutrition" not in existing:
+        from app.services import nutrition_rollups
+
+        nutrition_rollups.rebuild(connection)
+
+    table = models.SchemaVersion.__table__
+    if version is None:
+        connection.execute(insert(table).values(id=1, version=models.SCHEMA_VERSION))
+    else:
+        connection.execute(table.update().values(version=models.SCHEMA_VERSION))
+
+
+# ---------- Seed data ----------
+def seed(connection) -> bool:
+    """Create the missing base permissions, roles and admin user; True if any was."""
+    permissions, roles, admin = missing_seed(connection)
+    if permissions:
+        connection.execute(insert(models.Permission), [{"name": name} for name in permissions])
+
+    if roles:
+        all_permissions = connection.execute(select(models.Permission.id, models.Permission.name)).all()
+        for role_name in roles:
+            role_id = connection.execute(
+                insert(models.Role).values(name=role_name)
+            ).inserted_primary_key[0]
+            links = [
+                {"role_id": role_id, "permission_id": permission_id}
+                for permission_id, name in all_permissions
+                if grants(role_name, name)
+            ]
+            if links:
+                connection.execute(insert(models.role_permission_association), links)
+
+    if admin:
+        # Only hashed when the admin is created
+        from app.core.hashing import get_password_hash
+
+        admin_role = connection.scalar(select(models.Role.id).where(models.Role.name == SEEDED_ROLES[0]))
+        user_id = connection.execute(
+            insert(models.User).values(
+                username=ADMIN_USERNAME,
+                email=ADMIN_EMAIL,
+                hashed_password=get_password_hash(ADMIN_PASSWORD),
+            )
+        ).inserted_primary_key[0]
+        connection.execute(
+            insert(models.user_role_association).values(user_id=user_id, role_id=admin_role)
+        )
+
+    return bool(permissions or roles or admin)
+
+
+# ---------- Pipeline ----------
+@contextmanager
+def _exclusive():
+    """A connection in a transaction that holds the startup lock."""
+    with engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect == "sqlite":
+            # pysqlite would open a deferred transaction; take the write lock up front
+            connection.execution_options(isolation_level="AUTOCOMMIT")
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.exec_driver_sql("ROLLBACK")
+                raise
+            connection.exec_driver_sql("COMMIT")
+            return
+
+        with connection.begin():
+            if dialect == "postgresql":
+                connection.exec_driver_sql(f"SELECT pg_advisory_xact_lock({STARTUP_LOCK_ID})")
+            yield connection
+
+
+def prepare_database():
+    with engine.connect() as connection:
+        if _up_to_date(connection):
+            return
+
+    with _exclusive() as connection:
+        version = schema_version(connection)
+        if version != models.SCHEMA_VERSION:
+            migrate(connection, version)
+        changed = seed(connection)
+
+    if changed:
+        rbac_index.invalidate_all()
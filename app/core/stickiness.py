@@ -0,0 +1,68 @@
+# Read-your-writes for replica routing.
+# After a user's mutating request, their reads go to the primary for
+# READ_YOUR_WRITES_SECONDS, so replica lag never hides what they just wrote.
+# Callers are identified by the token subject; anonymous reads always use a
+# replica.
+from fastapi import Request
+from app.core.config import settings
+from app.core.lru import LRUCache
+
+
+def token_subject(request: Request) -> str | None:
+    """The bearer token's subject, without verifying the token.
+
+    Only used to pick a database: a forged subject can at most send its
+    requests to the primary. The auth dependencies still verify the token.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    from jose import JWTError, jwt  # imported on first use, see auth.decode_token
+
+    try:
+        subject = jwt.get_unverified_claims(token).get("sub")
+    except JWTError:
+        return None
+    return str(subject) if subject is not None else None
+
+
+class InMemoryStickinessStore:
+    """Process-local store. Enough with one worker; with several, a read
+    may land on a worker that did not see the write."""
+
+    def __init__(self, window: float, maxsize: int = 100_000):
+        self.window = window
+        self._until = LRUCache(maxsize, ttl=window)
+
+    async def mark(self, subject: str):
+        self._until.set(subject, True)
+
+    async def is_sticky(self, subject: str) -> bool:
+        return self._until.get(subject, False)
+
+
+class RedisStickinessStore:
+    """Shared store, so every worker and host honours the window."""
+
+    def __init__(self, redis, window: float, prefix: str = "sticky"):
+        self.redis = redis
+        self.window_ms = max(1, int(window * 1000))
+        self.prefix = prefix
+
+    async def mark(self, subject: str):
+        await self.redis.set(f"{self.prefix}:{subject}", 1, px=self.window_ms)
+
+    async def is_sticky(self, subject: str) -> bool:
+        return bool(await self.redis.exists(f"{self.prefix}:{subject}"))
+
+
+def _build_store():
+    window = settings.READ_YOUR_WRITES_SECONDS
+    if settings.READ_YOUR_WRITES_BACKEND == "redis":
+        from redis import asyncio as aioredis
+
+        return RedisStickinessStore(aioredis.from_url(settings.REDIS_URL), window)
+    return InMemoryStickinessStore(window)
+
+
+recent_writers = _build_store()
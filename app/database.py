@@ -1,7 +1,19 @@
+from contextlib import asynccontextmanager
+from fastapi import Request
 from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.stickiness import recent_writers, token_subject
+
+
+# Async drivers used by the request path, keyed by the sync driver in the URL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
 
 
 def get_database_url():
@@ -10,23 +22,259 @@ def get_database_url():
     return settings.DATABASE_URL
 
 
+def get_async_database_url(url: str | None = None):
+    url = url or get_database_url()
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+def _connect_args(url: str):
+    if url.startswith("sqlite"):
+        return {"check_same_thread": False}
+    return {}
+
+
+# ---------- Engine profiles ----------
+# DATABASE_PROFILE picks how engines are tuned:
+# - "default": driver defaults (SQLite: rollback journal, where readers and
+#   the writer block each other).
+# - "production": for SQLite, WAL (readers never block the writer or each
+#   other), synchronous=NORMAL (durable at checkpoints, safe with WAL),
+#   memory-mapped reads, a larger page cache and a busy timeout; plus a
+#   sized reader pool and a single writer connection (see write_engine).
+#   Other databases only get the pool sizes.
+def _is_memory(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":"))
+
+
+def _sqlite_pragmas() -> list[str]:
+    pragmas = ["foreign_keys=ON"]
+    if settings.DATABASE_PROFILE == "production":
+        pragmas += [
+            "journal_mode=WAL",
+            "synchronous=NORMAL",
+            f"mmap_size={settings.SQLITE_MMAP_SIZE}",
+            f"cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",  # negative: KiB, not pages
+            f"busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+            "temp_store=MEMORY",
+        ]
+    return pragmas
+
+
+def _engine_options(url: str, **pool) -> dict:
+    options = {"connect_args": _connect_args(url)}
+    if settings.DATABASE_PROFILE == "production" and not _is_memory(url):
+        options.update(
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        )
+        options.update(pool)
+    return options
+
+
+def _uses_single_writer(url: str) -> bool:
+    return settings.DATABASE_PROFILE == "production" and url.startswith("sqlite") and not _is_memory(url)
+
+
 Base = declarative_base()
 
-engine = create_engine(get_database_url(), connect_args={"check_same_thread": False})
+# Sync engine: seeders, scripts and anything running outside the event loop
+engine = create_engine(get_database_url(), **_engine_options(get_database_url()))
+
+# Async engine: every request handler
+async_engine = create_async_engine(
+    get_async_database_url(), **_engine_options(get_database_url())
+)
+
+# Write engine: SQLite allows one writer at a time, and concurrent writers
+# fail with "database is locked" once busy_timeout runs out (immediately if
+# a read transaction has to upgrade to a write). With one connection, the
+# pool is the write queue: writes wait their turn in FIFO order, for at
+# most DATABASE_WRITE_TIMEOUT_SECONDS, and never contend for the lock
+# within a worker. Elsewhere writes share async_engine.
+if _uses_single_writer(get_database_url()):
+    write_engine = create_async_engine(
+        get_async_database_url(),
+        **_engine_options(
+            get_database_url(),
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=settings.DATABASE_WRITE_TIMEOUT_SECONDS,
+        ),
+    )
+
+    @event.listens_for(write_engine.sync_engine, "connect")
+    def _manual_transactions(dbapi_connection, connection_record):
+        # Let SQLAlchemy issue BEGIN itself (see below)
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(write_engine.sync_engine, "begin")
+    def _begin_immediate(connection):
+        # Take the write lock up front: a deferred transaction that reads
+        # first cannot wait for a lock upgrade when another worker writes
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+else:
+    write_engine = async_engine
+
+
+# ---------- Read replicas ----------
+# With DATABASE_REPLICA_URLS set, get_db hands GET/HEAD requests a session on
+# one of the replicas; everything else, and reads by a user who wrote within
+# READ_YOUR_WRITES_SECONDS, uses the primary. Replica connections refuse
+# writes (query_only on SQLite, read-only transactions on Postgres). Several
+# SQLite files, or a second local Postgres, stand in for replicas locally.
+READ_METHODS = frozenset({"GET", "HEAD"})
+
+
+def _replica_urls() -> list[str]:
+    return [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+
+
+def _replica_engine(url: str):
+    options = _engine_options(url)
+    if url.startswith("postgresql"):
+        options["connect_args"] = {"server_settings": {"default_transaction_read_only": "on"}}
+    replica = create_async_engine(get_async_database_url(url), **options)
+
+    if url.startswith("sqlite"):
+        @event.listens_for(replica.sync_engine, "connect")
+        def _read_only(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in [*_sqlite_pragmas(), "query_only=ON"]:
+                cursor.execute(f"PRAGMA {pragma}")
+            cursor.close()
+
+    return replica
+
 
+class ReplicaRouter:
+    """Spreads read sessions over the replicas.
 
-# Enable foreign keys for SQLite
+    "round_robin" takes them in turn; "least_connections" takes the one with
+    the fewest sessions open in this worker.
+    """
+
+    def __init__(self, engines, strategy: str = "round_robin"):
+        self.engines = engines
+        self.strategy = strategy
+        self.sessionmakers = [
+            async_sessionmaker(bind=replica, autoflush=False, expire_on_commit=False)
+            for replica in engines
+        ]
+        self.active = [0] * len(engines)
+        self._next = 0
+
+    def pick(self) -> int:
+        if self.strategy == "least_connections":
+            return min(range(len(self.active)), key=self.active.__getitem__)
+        index = self._next
+        self._next = (index + 1) % len(self.engines)
+        return index
+
+    @asynccontextmanager
+    async def session(self):
+        index = self.pick()
+        self.active[index] += 1
+        try:
+            async with self.sessionmakers[index]() as db:
+                yield db
+        finally:
+            self.active[index] -= 1
+
+
+replica_engines = [_replica_engine(url) for url in _replica_urls()]
+replica_router = (
+    ReplicaRouter(replica_engines, settings.DATABASE_REPLICA_STRATEGY) if replica_engines else None
+)
+
+ENGINES = {"sync": engine, "async": async_engine.sync_engine}
+if write_engine is not async_engine:
+    ENGINES["write"] = write_engine.sync_engine
+for _index, _replica in enumerate(replica_engines, start=1):
+    ENGINES[f"replica{_index}"] = _replica.sync_engine
+
+
+# SQLite pragmas (foreign keys, and the profile's tuning) for every connection
 @event.listens_for(engine, "connect")
-def enable_foreign_keys(dbapi_connection, connection_record):
+@event.listens_for(async_engine.sync_engine, "connect")
+def configure_sqlite(dbapi_connection, connection_record):
+    if engine.dialect.name != "sqlite":
+        return
     cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
+    for pragma in _sqlite_pragmas():
+        cursor.execute(f"PRAGMA {pragma}")
     cursor.close()
 
 
+if write_engine is not async_engine:
+    event.listen(write_engine.sync_engine, "connect", configure_sqlite)
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# expire_on_commit=False: attributes can't be lazily refreshed once we are back
+# on the event loop, so objects keep their state after commit.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+WriteSessionLocal = async_sessionmaker(
+    bind=write_engine, autoflush=False, expire_on_commit=False
+)
+
+
+async def _reads_from_replica(request: Request) -> bool:
+    subject = token_subject(request)
+    if request.method not in READ_METHODS:
+        if subject is not None:
+            await recent_writers.mark(subject)  # read-your-writes window
+        return False
+    return subject is None or not await recent_writers.is_sticky(subject)
+
+
+async def reads_from_replica(request: Request) -> bool:
+    """Whether `request` reads from a replica (see get_db)."""
+    return replica_router is not None and await _reads_from_replica(request)
+
+
+async def get_db(request: Request):
+    async with read_session(await reads_from_replica(request)) as db:
+        yield db
+
+
+@asynccontextmanager
+async def read_session(replica: bool = False):
+    """A replica's session when `replica` (and there are replicas), else the
+    primary's. For reads outside a request's own session (cache builds)."""
+    if replica and replica_router is not None:
+        async with replica_router.session() as db:
+            yield db
+    else:
+        async with AsyncSessionLocal() as db:
+            yield db
+
+
+async def _get_write_db(request: Request):
+    if replica_router is not None:
+        await _reads_from_replica(request)  # starts the caller's primary window
+    async with WriteSessionLocal() as db:
+        yield db
+
+
+# Session for handlers that write. Without a separate writer this is get_db
+# itself, so a handler and its dependencies (the principal lookup) share one
+# session per request instead of holding two pooled connections at once.
+get_write_db = _get_write_db if write_engine is not async_engine else get_db
+
+
+async def dispose_engines():
+    await async_engine.dispose()
+    if write_engine is not async_engine:
+        await write_engine.dispose()
+    for replica in replica_engines:
+        await replica.dispose()
+
 
-def get_db():
+def get_sync_db():
     # The name “Local” doesn’t mean local development — it means thread-local (safe to use inside requests).
     db = SessionLocal()
     try:
@@ -23,22 +23,54 @@ class InvalidLoginException(HTTPException):
         )
 
 class AccessException(HTTPException):
-    def __init__(self):
+    def __init__(self, detail: str = "Not authorized"):
         super().__init__(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized",
+            detail=detail,
         )
 
 class NotFoundException(HTTPException):
-    def __init__(self):
+    def __init__(self, detail: str = "Entity not found"):
         super().__init__(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Entity not found",
+            detail=detail,
         )
 
 class RateLimitException(HTTPException):
-    def __init__(self):
+    DETAIL = "Rate limit exceeded. Try again later."
+
+    def __init__(self, headers: dict | None = None):
         super().__init__(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Rate limit exceeded. Try again later.",
-        )
\ No newline at end of file
+            detail=self.DETAIL,
+            headers=headers,
+        )
+
+class ServiceUnavailableException(HTTPException):
+    def __init__(self, detail: str = "Server is busy. Try again later."):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": "1"},
+        )
+
+class InvalidCursorException(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+        )
+
+class UnsupportedMediaTypeException(HTTPException):
+    def __init__(self, detail: str = "Unsupported media type"):
+        super().__init__(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=detail,
+        )
+
+class PayloadTooLargeException(HTTPException):
+    def __init__(self, detail: str = "Request too large"):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=detail,
+        )
@@ -1,28 +1,31 @@
 from fastapi import FastAPI, APIRouter
 from fastapi.concurrency import asynccontextmanager
-from app.core.seed.seed_permissions import seed_permissions
-from app.core.seed.seed_roles import seed_roles
-from app.core.seed.seed_admin import seed_admin
-from app.database import Base, SessionLocal, engine
-from app.routers import foods, meals, auth, home
+from app.database import dispose_engines, engine
+from app.routers import foods, meals, auth, home, users
 from app.core.limiter import register_rate_limiter
+from app.core.sql_profiler import SQLProfilerMiddleware
+from app.core import hashing, metrics
+from app.core.cache import init_cache
+from app.core.rbac import rbac_index
+from app.core.startup import prepare_database
 
-# Create DB tables
-Base.metadata.create_all(bind=engine)
 
-
-# TODO: improve implementation
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    db = SessionLocal()
     try:
-        seed_permissions(db)
-        seed_roles(db)
-        seed_admin(db)
+        # Schema and seed data: checked with two queries, fixed under a lock
+        prepare_database()
+        with engine.connect() as connection:
+            rbac_index.load(connection)
+        await init_cache()
+        stats_sync = metrics.start_stats_sync()
         yield
+        stats_sync.cancel()
 
     finally:
-        db.close()
+        await dispose_engines()
+        hashing.shutdown_pool()
+        metrics.shutdown()
 
 
 app = FastAPI(
@@ -31,8 +34,6 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-app = FastAPI(title="Nutrition API", version="0.1.0")
-
 # TODO: move to .env?
 API_PREFIX = "/api/v0"
 api_router = APIRouter(prefix=API_PREFIX)
@@ -41,9 +42,16 @@ api_router = APIRouter(prefix=API_PREFIX)
 api_router.include_router(foods.router, prefix="/foods", tags=["foods"])
 api_router.include_router(meals.router, prefix="/meals", tags=["meals"])
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
+api_router.include_router(users.router)
 
 app.include_router(api_router)
 app.include_router(home.router, tags=["home"])
 
-# SlowAPI middleware for ratelimiting and exception handler
+# Default per-IP rate limit (route limits are dependencies, see app/core/limiter.py)
 register_rate_limiter(app)
+
+# Server-Timing and N+1 warnings while the SQL profiler is on
+app.add_middleware(SQLProfilerMiddleware)
+
+# Outermost, so latency includes every other middleware
+metrics.register_metrics(app)
@@ -1,13 +1,55 @@
 # The models.py file defines the database structure using SQLAlchemy ORM.
 # Each class represents a table in the database, and each attribute (column) represents a field in that table.
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Table
+from datetime import datetime, timezone
+from sqlalchemy import (
+    DDL,
+    Column,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    TypeDecorator,
+    event,
+)
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from app.database import Base  # use the same registry of database.py
 from sqlalchemy.sql import func
 from typing import List
 
 
+# Bump on every change to the tables below. Startup compares it with the
+# schema_version row and only then migrates (see app/core/startup.py).
+SCHEMA_VERSION = 4
+
+# Grams of a food in a meal unless stated; food macros are per 100 g
+DEFAULT_QUANTITY = 100.0
+
+
+class UTCDateTime(TypeDecorator):
+    """DateTime written in UTC; naive values are taken as UTC already.
+
+    SQLite stores no offset, so 23:30-05:00 would otherwise be kept as 23:30
+    and read back as a UTC time on another day.
+    """
+
+    impl = DateTime
+    cache_ok = True
+
+    @property
+    def python_type(self):
+        return datetime  # read by keyset cursors (app/core/pagination.py)
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value
+
+
 # ------------------------
 # Association Tables
 # ------------------------
@@ -20,6 +62,10 @@ meal_food_association = Table(
     # PK avoids duplicates and makes joins faster
     Column("meal_id", Integer, ForeignKey("meal.id"), primary_key=True),
     Column("food_id", Integer, ForeignKey("food.id"), primary_key=True),
+    # Portion in grams
+    Column("quantity", Float, nullable=False, default=DEFAULT_QUANTITY, server_default="100"),
+    # Meals containing a food (rollup shifts on food edits); the PK leads with meal_id
+    Index("ix_meal_food_association_food_id", "food_id"),
 )
 
 
@@ -119,25 +165,143 @@ class Food(Base):
     protein: float = Column(Float, nullable=False)
     fat: float = Column(Float, nullable=False)
     carbohydrates: float = Column(Float, nullable=False)
+    # Bumped on every change; feeds the ETag (app/core/etag.py)
+    version: int = Column(Integer, nullable=False, default=1, server_default="1")
+    # "food" table version of the last write, so catalog snapshots
+    # (app/services/food_catalog.py) only reread what changed; also in the
+    # ETag, as a reused id restarts `version` at 1
+    revision: int = Column(Integer, nullable=False, default=0, server_default="0", index=True)
 
     def __repr__(self):
         return f"<Food(name={self.name}, calories={self.calories})>"
 
 
+class FoodTombstone(Base):
+    """A deleted food, with the "food" table version of its deletion.
+
+    Lets catalog snapshots drop deleted foods without rereading the table.
+    """
+
+    __tablename__ = "food_tombstone"
+
+    food_id: int = Column(Integer, primary_key=True)  # no foreign key: the food is gone
+    revision: int = Column(Integer, nullable=False, index=True)
+
+
+# Full-text search over food names (queried by app/services/food_search.py).
+# Triggers keep the indexes in sync with every write to `food`, whether it
+# comes from the ORM, a bulk insert or raw SQL.
+# (Large imports swap the insert trigger for one INSERT ... SELECT, see
+# food_search.bulk_indexing.)
+FOOD_SEARCH_INSERT_TRIGGER = (
+    "CREATE TRIGGER IF NOT EXISTS food_search_ai AFTER INSERT ON food BEGIN "
+    "INSERT INTO food_fts(rowid, name) VALUES (new.id, new.name); "
+    "INSERT INTO food_trigram(rowid, name) VALUES (new.id, new.name); END"
+)
+FOOD_SEARCH_DDL = {
+    "sqlite": [
+        # Word index (prefix matching, bm25 ranking) and trigram index (typos)
+        "CREATE VIRTUAL TABLE IF NOT EXISTS food_fts USING fts5("
+        "name, content='food', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS food_trigram USING fts5("
+        "name, content='food', content_rowid='id', tokenize='trigram')",
+        FOOD_SEARCH_INSERT_TRIGGER,
+        "CREATE TRIGGER IF NOT EXISTS food_search_ad AFTER DELETE ON food BEGIN "
+        "INSERT INTO food_fts(food_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+        "INSERT INTO food_trigram(food_trigram, rowid, name) VALUES ('delete', old.id, old.name); END",
+        "CREATE TRIGGER IF NOT EXISTS food_search_au AFTER UPDATE OF name ON food BEGIN "
+        "INSERT INTO food_fts(food_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+        "INSERT INTO food_trigram(food_trigram, rowid, name) VALUES ('delete', old.id, old.name); "
+        "INSERT INTO food_fts(rowid, name) VALUES (new.id, new.name); "
+        "INSERT INTO food_trigram(rowid, name) VALUES (new.id, new.name); END",
+    ],
+    "postgresql": [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "ALTER TABLE food ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', name)) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_food_search_vector ON food USING gin (search_vector)",
+        "CREATE INDEX IF NOT EXISTS ix_food_name_trgm ON food USING gin (name gin_trgm_ops)",
+    ],
+}
+
+for _dialect, _statements in FOOD_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(
+            Food.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect)
+        )
+
+
 class Meal(Base):
     __tablename__ = "meal"
+    __table_args__ = (
+        # Keyset pagination of a user's history: WHERE user_id = ? AND (timestamp, id) > (?, ?)
+        Index("ix_meal_user_timestamp_id", "user_id", "timestamp", "id"),
+    )
 
     # --- Basic columns ---
     id: int = Column(Integer, primary_key=True, index=True)
     user_id: int = Column(Integer, ForeignKey("user.id"), nullable=False)
     name: str = Column(String(100), nullable=False)
+    # Set in Python on insert so every row stores the same datetime format
+    # (keyset cursors compare it); the DB default covers raw SQL inserts.
     timestamp: DateTime = Column(
-        DateTime(timezone=True), server_default=func.now()
-    )  # generate datetime at the DB level
+        UTCDateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+    )
+    # The owner's meal counter (etag.user_meals_counter) at the last change,
+    # food list included; feeds the ETag
+    version: int = Column(Integer, nullable=False, default=1, server_default="1")
 
     # --- Object references (linked models) ---
     user: Mapped["User"] = relationship("User", back_populates="meals")
     foods: Mapped[List["Food"]] = relationship("Food", secondary=meal_food_association)
+    # Responses also carry `quantities` and `totals`, set by
+    # app/services/nutrition_engine.annotate()
 
     def __repr__(self):
         return f"<Meal(name={self.name}, user_id={self.user_id}, timestamp={self.timestamp})>"
+
+
+class DailyNutrition(Base):
+    """Per-user, per-day macro totals, kept up to date by the meal endpoints.
+
+    See app/services/nutrition_rollups.py. The primary key doubles as the index
+    for summary range scans: WHERE user_id = ? AND date BETWEEN ? AND ?
+    """
+
+    __tablename__ = "daily_nutrition"
+
+    user_id: int = Column(Integer, ForeignKey("user.id"), primary_key=True)
+    date = Column(Date, primary_key=True)  # UTC day of the meals
+    calories: float = Column(Float, nullable=False, default=0)
+    protein: float = Column(Float, nullable=False, default=0)
+    fat: float = Column(Float, nullable=False, default=0)
+    carbohydrates: float = Column(Float, nullable=False, default=0)
+    meal_count: int = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyNutrition(user_id={self.user_id}, date={self.date}, calories={self.calories})>"
+
+
+class TableVersion(Base):
+    """Counter bumped on every write to a table (by name).
+
+    Lets a response embedding rows of another table (meals embed foods) tell
+    in one primary-key lookup whether any of those rows changed.
+    """
+
+    __tablename__ = "table_version"
+
+    name: str = Column(String, primary_key=True)
+    version: int = Column(Integer, nullable=False, default=0)
+
+
+class SchemaVersion(Base):
+    """The SCHEMA_VERSION the database was last migrated to (a single row)."""
+
+    __tablename__ = "schema_version"
+
+    id: int = Column(Integer, primary_key=True)  # always 1
+    version: int = Column(Integer, nullable=False)
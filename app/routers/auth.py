@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from app import models, schemas
 from app.core.const.base_roles import BASE_ROLES
-from app.database import get_db
+from app.database import get_db, get_write_db
 from app.core import security, auth
+from app.core.config import settings
+from app.core.limiter import rate_limit
+from app.core.revocation import token_versions
 from app.exceptions import (
     UserAlreadyExistsException,
     InvalidLoginException,
@@ -14,20 +19,23 @@ router = APIRouter()
 
 
 # ---------------- Register ----------------
-@router.post("/register", response_model=schemas.UserResponse)
-# TODO: add limit 5/min
-def register(
+@router.post(
+    "/register",
+    response_model=schemas.UserResponse,
+    dependencies=[Depends(rate_limit(settings.RATE_LIMIT_AUTH))],
+)
+async def register(
     request: Request,
     new_user: schemas.UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     user: models.User = Depends(security.require_role(BASE_ROLES.ADMIN)),
 ):
-    if db.query(models.User).filter(models.User.email == new_user.email).first():
+    if await db.scalar(select(models.User).filter(models.User.email == new_user.email)):
         raise UserAlreadyExistsException()
 
-    hashed_pw = security.get_password_hash(new_user.password)
+    hashed_pw = await security.get_password_hash_async(new_user.password)
 
-    default_role = db.query(models.Role).filter_by(name=BASE_ROLES.USER).first()
+    default_role = await db.scalar(select(models.Role).filter_by(name=BASE_ROLES.USER))
     if not default_role:
         # If not seeded yet, raise a controlled error
         raise Exception("Default USER role not found. Run role seeding first.")
@@ -40,28 +48,37 @@ def register(
     )
 
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user, ["id", "roles"])
 
     return db_user
 
 
 # ---------------- Login ----------------
-@router.post("/login")
-# TODO: add limit 5/min
+@router.post("/login", dependencies=[Depends(rate_limit(settings.RATE_LIMIT_AUTH))])
 async def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = (
-        db.query(models.User).filter(models.User.username == form_data.username).first()
-    )
+    query = select(models.User).filter(models.User.username == form_data.username)
+    if settings.AUTH_TOKEN_MODE == "claims":
+        # The token embeds roles and permissions, load them with the user
+        query = query.options(
+            selectinload(models.User.roles).selectinload(models.Role.permissions)
+        )
+    user = await db.scalar(query)
 
-    if not user or not security.verify_password(form_data.password, user.password_hash):
+    if not user or not await security.verify_password_async(
+        form_data.password, user.hashed_password
+    ):
         raise InvalidLoginException()
 
-    access_token = security.create_access_token(data={"sub": str(user.id)})
+    access_token = security.create_access_token(
+        data={"sub": str(user.id)},
+        user=user,
+        token_version=await token_versions.get(user.id),
+    )
 
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -71,5 +88,5 @@ async def login(
 # FastAPI’s full dependency resolution chain (including nested deps like Session),
 # along with yield cleanup, async handling, and overrides.
 @router.get("/me", response_model=schemas.UserResponse)
-def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
+async def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
     return current_user
@@ -1,121 +1,322 @@
-from fastapi import APIRouter, Depends, status, Query
-from sqlalchemy.orm import Session
+import zlib
+from fastapi import APIRouter, Depends, Request, status, Query
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app import models, schemas
 from app.core.const.base_roles import BASE_ROLES
+from app.core.cache import FOOD_MACROS, FOODS_LIST, CachePolicy, food_tag, response_cache
+from app.core.etag import (
+    bump_table_version,
+    is_fresh,
+    not_modified,
+    range_etag,
+    row_etag,
+    table_version_column,
+    weak_etag,
+)
+from app.core.pagination import cursor_headers, keyset_paginate, keyset_range
 from app.core.security import require_role
-from app.database import get_db
-from app.exceptions import NotFoundException
+from app.database import get_db, get_write_db
+from app.exceptions import InvalidCursorException, NotFoundException, UnsupportedMediaTypeException
+from app.services import nutrition_rollups as rollups
+from app.services.food_catalog import food_catalog, record_deletion
+from app.services.food_neighbors import food_neighbors
+from app.services.food_import import format_for, import_foods
+from app.services.food_search import search_foods
 
 router = APIRouter()
+_food_list = TypeAdapter(List[schemas.FoodResponse])
+# The catalog is the same for every caller
+FOODS_CACHE = CachePolicy("foods")
+
+_MACRO = "(calories|protein|fat|carbohydrates)"
+# A macro or a ratio of two, descending with a leading "-": "-protein/calories"
+SORT_PATTERN = f"^-?{_MACRO}(/{_MACRO})?$"
+
+
+def nutrient_ranges(
+    min_calories: float = Query(None),
+    max_calories: float = Query(None),
+    min_protein: float = Query(None),
+    max_protein: float = Query(None),
+    min_fat: float = Query(None),
+    max_fat: float = Query(None),
+    min_carbohydrates: float = Query(None),
+    max_carbohydrates: float = Query(None),
+) -> dict[str, tuple]:
+    """Inclusive (low, high) bounds per macro, for the macros given a bound."""
+    bounds = {
+        "calories": (min_calories, max_calories),
+        "protein": (min_protein, max_protein),
+        "fat": (min_fat, max_fat),
+        "carbohydrates": (min_carbohydrates, max_carbohydrates),
+    }
+    return {macro: bound for macro, bound in bounds.items() if bound != (None, None)}
 
 
 # ---------- GET all foods (with pagination) ----------
+# Cursor pagination by default (see X-Next-Cursor / X-Prev-Cursor headers);
+# page/skip fall back to offset pagination. If-None-Match is answered from
+# the page's version aggregate (one query) without loading the foods.
+# Nutrient ranges (min_protein=20&max_calories=300) and sort (-protein,
+# protein/calories) are served from the in-memory catalog snapshot and
+# paginate by page/skip only.
 @router.get("/", response_model=List[schemas.FoodResponse])
-def get_foods(
+async def get_foods(
+    request: Request,
+    cursor: str = Query(None),
     page: int = Query(None, ge=1),
     skip: int = Query(None, ge=0),
-    limit: int = Query(10, le=100),  # limit capped at 100 for safety
-    db: Session = Depends(get_db),
+    limit: int = Query(10, ge=1, le=100),  # limit capped at 100 for safety
+    sort: str = Query(None, pattern=SORT_PATTERN),
+    ranges: dict = Depends(nutrient_ranges),
+    db: AsyncSession = Depends(get_db),
 ):
-    # Prioritize page if both provided
-    if page is not None:
-        skip = (page - 1) * limit
-    elif skip is None:
-        skip = 0
+    if ranges or sort:
+        if cursor is not None:
+            raise InvalidCursorException()
+        offset = (page - 1) * limit if page is not None else skip or 0
+        return await _filtered_foods(request, db, ranges, sort, offset, limit)
+
+    query = select(models.Food)
+    offset = None
+    if cursor is None and (page is not None or skip is not None):
+        # Prioritize page if both provided
+        offset = (page - 1) * limit if page is not None else skip
+        page_range = query.order_by(models.Food.id.asc()).offset(offset).limit(limit)
+    else:
+        page_range = keyset_range(query, [models.Food.id], limit, cursor)
+
+    if "if-none-match" in request.headers:
+        etag = await range_etag(db, "foods", page_range, models.Food, table_version_column("food"))
+        if is_fresh(request, etag):
+            return not_modified(etag)
+
+    async def build(db: AsyncSession):
+        etag = await range_etag(db, "foods", page_range, models.Food, table_version_column("food"))
+        if offset is not None:
+            foods = await db.scalars(page_range)
+            return _encode(foods.all()), {"ETag": etag}
+
+        result = await keyset_paginate(db, query, [models.Food.id], limit, cursor)
+        return _encode(result.items), {"ETag": etag, **cursor_headers(result)}
+
+    key = f"list:{cursor}:{page}:{skip}:{limit}"
+    return await response_cache.fetch(FOODS_CACHE, key, [FOODS_LIST], build, request=request)
+
+
+def _encode(foods) -> bytes:
+    return _food_list.dump_json(_food_list.validate_python(foods, from_attributes=True))
+
 
-    foods = db.query(models.Food).offset(skip).limit(limit).all()
-    return foods
+async def _filtered_foods(
+    request: Request, db: AsyncSession, ranges: dict, sort: str | None, offset: int, limit: int
+):
+    key = f"filter:{sorted(ranges.items())}:{sort}:{offset}:{limit}"
+
+    def etag() -> str:
+        # Any food write moves the snapshot's version
+        return weak_etag("foods", food_catalog.version, zlib.crc32(key.encode()))
+
+    if "if-none-match" in request.headers:
+        await food_catalog.refresh(db)
+        if is_fresh(request, etag()):
+            return not_modified(etag())
+
+    async def build(db: AsyncSession):
+        await food_catalog.refresh(db)
+        foods = await _foods_in_order(db, food_catalog.search(ranges, sort, offset, limit))
+        return _encode(foods), {"ETag": etag()}
+
+    return await response_cache.fetch(FOODS_CACHE, key, [FOODS_LIST], build, request=request)
+
+
+async def _foods_in_order(db: AsyncSession, ids: list[int]) -> list[models.Food]:
+    foods = {
+        food.id: food
+        for food in await db.scalars(select(models.Food).where(models.Food.id.in_(ids)))
+    }
+    return [foods[food_id] for food_id in ids if food_id in foods]
+
+
+# ---------- SEARCH foods by name ----------
+# Declared before /{food_id} so "search" isn't parsed as an id
+@router.get("/search", response_model=List[schemas.FoodResponse])
+async def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    return await search_foods(db, q, limit)
+
+
+# ---------- RECOMMEND foods for macro targets ----------
+# Foods whose macros per 100 g are nearest to the given ones (e.g. what is
+# left of today's targets), from the k-NN index over the catalog snapshot.
+# Declared before /{food_id} so "recommend" isn't parsed as an id.
+@router.get("/recommend", response_model=List[schemas.FoodResponse])
+async def recommend(
+    calories: float = Query(..., ge=0),
+    protein: float = Query(..., ge=0),
+    fat: float = Query(..., ge=0),
+    carbohydrates: float = Query(..., ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    user: models.User = Depends(require_role(BASE_ROLES.SPECIALIST)),
+):
+    await food_catalog.refresh(db)
+    await food_neighbors.prepare()
+    ids = food_neighbors.nearest((calories, protein, fat, carbohydrates), limit)
+    return await _foods_in_order(db, ids)
+
+
+# ---------- SIMILAR foods ----------
+# Nearest foods by macros per 100 g, closest first, the food itself excluded.
+@router.get("/{food_id}/similar", response_model=List[schemas.FoodResponse])
+async def similar_foods(
+    food_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    user: models.User = Depends(require_role(BASE_ROLES.SPECIALIST)),
+):
+    await food_catalog.refresh(db)
+    macros = food_catalog.macros(food_id)
+    if macros is None:
+        raise NotFoundException()
+    await food_neighbors.prepare()
+    return await _foods_in_order(db, food_neighbors.nearest(macros, limit, exclude=food_id))
 
 
 # ---------- GET food by ID ----------
 @router.get("/{food_id}", response_model=schemas.FoodResponse)
-def get_food(food_id: int, db: Session = Depends(get_db)):
+async def get_food(food_id: int, request: Request, db: AsyncSession = Depends(get_db)):
 
-    food = db.query(models.Food).filter(models.Food.id == food_id).first()
-    if not food:
-        raise NotFoundException()
+    if "if-none-match" in request.headers:
+        etag = await row_etag(db, "food", models.Food, food_id, models.Food.revision)
+        if etag is not None and is_fresh(request, etag):
+            return not_modified(etag)
 
-    return food
+    async def build(db: AsyncSession):
+        food = await db.get(models.Food, food_id)
+        if not food:
+            raise NotFoundException()  # not cached
+        body = schemas.FoodResponse.model_validate(food).model_dump_json().encode()
+        return body, {"ETag": weak_etag("food", food.id, food.version, food.revision)}
+
+    return await response_cache.fetch(
+        FOODS_CACHE, str(food_id), [food_tag(food_id)], build, request=request
+    )
 
 
 # ---------- CREATE new food ----------
 @router.post("/", response_model=schemas.FoodResponse)
-def create_food(
+async def create_food(
     food: schemas.FoodCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     user: models.User = Depends(require_role(BASE_ROLES.SPECIALIST)),
 ):
     db_food = models.Food(**food.model_dump())
+    db_food.revision = await bump_table_version(db, "food")
 
     db.add(db_food)
-    db.commit()
-    db.refresh(db_food)
+    await db.commit()
+    await db.refresh(db_food)
+    await response_cache.invalidate(FOODS_LIST)
 
     return db_food
 
 
+# ---------- BULK import foods ----------
+# Body is a raw CSV (header row: name,calories,protein,fat,carbohydrates) or
+# NDJSON stream, typed by Content-Type or ?format=. Streamed, never buffered.
+@router.post("/bulk", response_model=schemas.FoodImportReport)
+async def bulk_import_foods(
+    request: Request,
+    format: str = Query(None, pattern="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_write_db),
+    user: models.User = Depends(require_role(BASE_ROLES.SPECIALIST)),
+):
+    fmt = format or format_for(request.headers.get("content-type"))
+    if fmt is None:
+        raise UnsupportedMediaTypeException(
+            detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson"
+        )
+
+    return await import_foods(db, request.stream(), fmt)
+
+
 # ---------- UPDATE food ----------
 @router.put("/{food_id}", response_model=schemas.FoodResponse)
-def update_food(
+async def update_food(
     food_id: int,
     updated_food: schemas.FoodUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     user: models.User = Depends(require_role(BASE_ROLES.SPECIALIST)),
 ):
-    db_food = (
-        db.query(models.Food)
-        .order_by(models.Food.id.asc())
-        .filter(models.Food.id == food_id)
-        .first()
-    )
+    db_food = await db.get(models.Food, food_id)
 
     if not db_food:
         raise NotFoundException()
 
+    old_macros = rollups.food_totals([db_food])
+    # Before the changes below, which would be flushed by this statement
+    db_food.revision = await bump_table_version(db, "food")
     for key, value in updated_food.model_dump().items():
         setattr(db_food, key, value)
+    db_food.version = models.Food.version + 1  # in SQL, so concurrent bumps add up
 
-    db.commit()
-    db.refresh(db_food)
+    # Meals already logged with this food now add up differently
+    await rollups.change_food(db, food_id, old_macros, rollups.food_totals([db_food]))
+    await db.commit()
+    await db.refresh(db_food)
+    await response_cache.invalidate(food_tag(food_id), FOODS_LIST, FOOD_MACROS)
 
     return db_food
 
 
 # ---------- PARTIAL UPDATE food ----------
 @router.patch("/{food_id}", response_model=schemas.FoodResponse)
-def partial_update_food(
+async def partial_update_food(
     food_id: int,
     partial_food: schemas.FoodPartialUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     user: models.User = Depends(require_role(BASE_ROLES.SPECIALIST)),
 ):
-    db_food = db.query(models.Food).filter(models.Food.id == food_id).first()
+    db_food = await db.get(models.Food, food_id)
     if not db_food:
         raise NotFoundException()
 
+    old_macros = rollups.food_totals([db_food])
+    db_food.revision = await bump_table_version(db, "food")
     # Only update provided fields (exclude_unset=True)
     for key, value in partial_food.model_dump(exclude_unset=True).items():
         setattr(db_food, key, value)
+    db_food.version = models.Food.version + 1
 
-    db.commit()
-    db.refresh(db_food)
+    await rollups.change_food(db, food_id, old_macros, rollups.food_totals([db_food]))
+    await db.commit()
+    await db.refresh(db_food)
+    await response_cache.invalidate(food_tag(food_id), FOODS_LIST, FOOD_MACROS)
     return db_food
 
 
 # ---------- DELETE food ----------
 @router.delete("/{food_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_food(
+async def delete_food(
     food_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     user: models.User = Depends(require_role(BASE_ROLES.SPECIALIST)),
 ):
-    food = db.query(models.Food).filter(models.Food.id == food_id).first()
+    food = await db.get(models.Food, food_id)
 
     if not food:
         raise NotFoundException()
 
-    db.delete(food)
-    db.commit()
+    await db.delete(food)
+    await record_deletion(db, food_id, await bump_table_version(db, "food"))
+    await db.commit()
+    await response_cache.invalidate(food_tag(food_id), FOODS_LIST)
 
     return
@@ -1,4 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from app import models, schemas
+from app.core import metrics
+from app.core.cache import response_cache
+from app.core.const.base_roles import BASE_ROLES
+from app.core.security import require_role
+from app.core.sql_profiler import sql_profiler
 
 router = APIRouter()
 
@@ -9,3 +15,31 @@ def home():
 @router.get("/health", tags=["monitoring"])
 def health():
     return {"status": "ok"}
+
+@router.get("/health/cache", tags=["monitoring"])
+def cache_stats():
+    return response_cache.stats()
+
+@router.get("/metrics", tags=["monitoring"], include_in_schema=False)
+def prometheus_metrics():
+    return metrics.render()
+
+@router.get("/sql-profiler", tags=["monitoring"], response_model=schemas.SQLProfilerState)
+def get_sql_profiler(admin_user: models.User = Depends(require_role(BASE_ROLES.ADMIN))):
+    return sql_profiler.state()
+
+# Applies to the worker answering the request
+@router.put("/sql-profiler", tags=["monitoring"], response_model=schemas.SQLProfilerState)
+def update_sql_profiler(
+    update: schemas.SQLProfilerUpdate,
+    admin_user: models.User = Depends(require_role(BASE_ROLES.ADMIN)),
+):
+    if update.slow_query_ms is not None:
+        sql_profiler.slow_query_ms = update.slow_query_ms
+    if update.n_plus_one_threshold is not None:
+        sql_profiler.n_plus_one_threshold = update.n_plus_one_threshold
+    if update.enabled:
+        sql_profiler.enable()
+    elif update.enabled is not None:
+        sql_profiler.disable()
+    return sql_profiler.state()
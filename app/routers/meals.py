@@ -1,128 +1,317 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from datetime import date, datetime, timezone
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app import models, schemas
-from app.database import get_db
+from app.database import get_db, get_write_db
 from app.core import auth
-from app.exceptions import NotFoundException
+from app.core.cache import FOOD_MACROS, CachePolicy, response_cache, user_meals_tag
+from app.core.config import settings
+from app.core.etag import (
+    bump_table_version,
+    is_fresh,
+    not_modified,
+    range_etag,
+    row_etag,
+    table_version_column,
+    user_meals_counter,
+)
+from app.core.loading import load_options
+from app.core.pagination import keyset_paginate, keyset_range, set_cursor_headers
+from app.exceptions import NotFoundException, PayloadTooLargeException
+from app.services import nutrition_rollups as rollups
+from app.services.meal_batch import create_meals
+from app.services.meal_export import MEDIA_TYPES, export_meals
+from app.services.nutrition_engine import annotate, portions
 
 router = APIRouter()
 
+MEAL_ORDER = [models.Meal.timestamp, models.Meal.id]
+
+_summaries = TypeAdapter(List[schemas.NutritionSummary])
+# Each user's own summaries; rebuilt on their meal writes and on food macro edits
+SUMMARY_CACHE = CachePolicy("meals-summary", scope="user")
+
+
+# ---------- Portions ----------
+async def _quantities(db: AsyncSession, meal_id: int) -> dict[int, float]:
+    return {food_id: grams for _, food_id, grams in await portions(db, [meal_id])}
+
+
+async def _store_quantities(db: AsyncSession, meal_id: int, quantities: dict | None):
+    """Set portions on links already added (the ORM writes them at the default)."""
+    if not quantities:
+        return
+    links = models.meal_food_association
+    await db.execute(
+        update(links)
+        .where(links.c.meal_id == meal_id, links.c.food_id == bindparam("food"))
+        .values(quantity=bindparam("grams")),
+        [{"food": food_id, "grams": grams} for food_id, grams in quantities.items()],
+    )
+
 
 # ---------- GET all meals ----------
+# Cursor pagination on (timestamp, id) by default (see X-Next-Cursor /
+# X-Prev-Cursor headers); page/skip fall back to offset pagination.
+# The page ETag is checked before any meal is loaded.
 @router.get("/", response_model=List[schemas.MealResponse])
-def get_meals(
+async def get_meals(
+    request: Request,
+    response: Response,
+    cursor: str = Query(None),
     page: int = Query(None, ge=1),
     skip: int = Query(None, ge=0),
-    limit: int = Query(10, le=100),  # limit capped at 100 for safety
-    db: Session = Depends(get_db),
-    user: models.User = Depends(auth.get_current_user),
+    limit: int = Query(10, ge=1, le=100),  # limit capped at 100 for safety
+    db: AsyncSession = Depends(get_db),
+    user: models.User = Depends(auth.get_current_principal),
 ):
-    # Prioritize page if both provided
-    if page is not None:
-        skip = (page - 1) * limit
-    elif skip is None:
-        skip = 0
-
-    meals = (
-        db.query(models.Meal)
-        .order_by(models.Meal.id.asc())
-        .offset(skip)
-        .limit(limit)
-        .filter(models.Meal.user_id == user.id)
-        .all()
+    query = select(models.Meal).filter(models.Meal.user_id == user.id)
+    offset_mode = cursor is None and (page is not None or skip is not None)
+    if offset_mode:
+        # Prioritize page if both provided
+        if page is not None:
+            skip = (page - 1) * limit
+        page_range = query.order_by(models.Meal.id.asc()).offset(skip).limit(limit)
+    else:
+        page_range = keyset_range(query, MEAL_ORDER, limit, cursor)
+
+    # Meals embed their foods, so any food write changes the page too
+    etag = await range_etag(
+        db,
+        "meals",
+        page_range,
+        models.Meal,
+        table_version_column(user_meals_counter(user.id)),
+        table_version_column("food"),
+    )
+    if is_fresh(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    options = load_options(schemas.MealResponse)
+    if offset_mode:
+        meals = await db.scalars(page_range.options(*options))
+        return await annotate(db, meals.all())
+
+    result = await keyset_paginate(db, query.options(*options), MEAL_ORDER, limit, cursor)
+    set_cursor_headers(response, result)
+    return await annotate(db, result.items)
+
+
+# ---------- GET nutrition summary ----------
+# Answered from the daily_nutrition rollup, never from raw meals.
+# Declared before /{meal_id} so "summary" isn't parsed as an id.
+@router.get("/summary", response_model=List[schemas.NutritionSummary])
+async def get_summary(
+    request: Request,
+    from_: date = Query(..., alias="from"),
+    to: date = Query(...),
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+    user: models.User = Depends(auth.get_current_principal),
+):
+    async def build(db: AsyncSession):
+        periods = await rollups.summary(db, user.id, from_, to, granularity)
+        return _summaries.dump_json(_summaries.validate_python(periods)), {}
+
+    return await response_cache.fetch(
+        SUMMARY_CACHE,
+        f"{from_}:{to}:{granularity}",
+        [user_meals_tag(user.id), FOOD_MACROS],
+        build,
+        principal=user,
+        request=request,
     )
 
-    return meals
+
+# ---------- EXPORT meal history ----------
+# Streams every meal of the user (foods included) from a server-side cursor.
+@router.get("/export")
+async def export(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    user: models.User = Depends(auth.get_current_principal),
+):
+    return StreamingResponse(
+        export_meals(user.id, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="meals.{format}"'},
+    )
 
 
 # ---------- GET single meal ----------
 @router.get("/{meal_id}", response_model=schemas.MealResponse)
-def get_meal(meal_id: int, db: Session = Depends(get_db)):
+async def get_meal(
+    meal_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)
+):
+    # Versions come from the owner's counter: the owner makes (id, version) unique
+    etag = await row_etag(
+        db, "meal", models.Meal, meal_id, models.Meal.user_id, table_version_column("food")
+    )
+    if etag is None:
+        raise NotFoundException()
+    if is_fresh(request, etag):
+        return not_modified(etag)
 
-    meal = db.query(models.Meal).filter(models.Meal.id == meal_id).first()
+    meal = await db.get(
+        models.Meal, meal_id, options=load_options(schemas.MealResponse, many=False)
+    )
     if not meal:
         raise NotFoundException()
 
+    response.headers["ETag"] = etag
+    await annotate(db, [meal])
     return meal
 
 
 # ---------- CREATE meal ----------
 @router.post("/", response_model=schemas.MealResponse)
-def create_meal(
+async def create_meal(
     meal_data: schemas.MealCreate,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    user: models.User = Depends(auth.get_current_principal),
 ):
     # Validate that all food IDs exist
-    foods = db.query(models.Food).filter(models.Food.id.in_(meal_data.food_ids)).all()
+    foods = (
+        await db.scalars(
+            select(models.Food).filter(models.Food.id.in_(meal_data.food_ids))
+        )
+    ).all()
     if len(foods) != len(meal_data.food_ids):
         # TODO: check proper message passing
         raise NotFoundException(detail="One or more food IDs not found")
 
     # Create the Meal
-    new_meal = models.Meal(name=meal_data.name, user_id=user.id)
+    new_meal = models.Meal(
+        name=meal_data.name,
+        user_id=user.id,
+        timestamp=meal_data.timestamp or datetime.now(timezone.utc),
+        version=await bump_table_version(db, user_meals_counter(user.id)),
+    )
     new_meal.foods = foods  # ORM auto-fills association table
 
     db.add(new_meal)
-    db.commit()
-    db.refresh(new_meal)
+    await db.flush()
+    await _store_quantities(db, new_meal.id, meal_data.quantities)
+    await rollups.add_meal(db, rollups.contribution(new_meal, meal_data.quantities))
+    await db.commit()
+    await db.refresh(new_meal, ["timestamp", "foods"])
+    await response_cache.invalidate(user_meals_tag(user.id))
 
+    await annotate(db, [new_meal])
     return new_meal
 
 
+# ---------- CREATE meals in batch ----------
+# For offline sync: one transaction and a fixed number of statements per
+# batch (see app/services/meal_batch.py). Meals with unknown foods are
+# reported by index and skipped; the others are created.
+@router.post("/batch", response_model=schemas.MealBatchReport)
+async def create_meal_batch(
+    batch: schemas.MealBatchCreate,
+    db: AsyncSession = Depends(get_write_db),
+    user: models.User = Depends(auth.get_current_principal),
+):
+    if len(batch.meals) > settings.MEAL_BATCH_MAX_SIZE:
+        raise PayloadTooLargeException(
+            detail=f"At most {settings.MEAL_BATCH_MAX_SIZE} meals per batch"
+        )
+    return await create_meals(db, user.id, batch.meals)
+
+
 # ---------- UPDATE food ----------
 @router.put("/{meal_id}", response_model=schemas.MealResponse)
-def update_meal(
+async def update_meal(
     meal_id: int,
     updated_meal: schemas.MealUpdate,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    user: models.User = Depends(auth.get_current_principal),
 ):
-    db_meal = db.query(models.Meal).filter(models.Meal.id == meal_id).first()
+    db_meal = await db.get(
+        models.Meal, meal_id, options=load_options(schemas.MealResponse, many=False)
+    )
 
     if not db_meal:
         raise NotFoundException()
 
+    quantities = await _quantities(db, meal_id)
+    before = rollups.contribution(db_meal, quantities)
+    db_meal.version = await bump_table_version(db, user_meals_counter(db_meal.user_id))
     for key, value in updated_meal.model_dump().items():
         setattr(db_meal, key, value)
 
-    db.commit()
-    db.refresh(db_meal)
+    await rollups.replace_meal(db, before, rollups.contribution(db_meal, quantities))
+    await db.commit()
+    await db.refresh(db_meal, ["timestamp", "version", "foods"])
+    await response_cache.invalidate(user_meals_tag(db_meal.user_id))
 
+    await annotate(db, [db_meal])
     return db_meal
 
 
 # ---------- PARTIAL UPDATE meal ----------
 @router.patch("/{meal_id}", response_model=schemas.MealResponse)
-def partial_update_meal(
+async def partial_update_meal(
     meal_id: int,
     partial_meal: schemas.MealPartialUpdate,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    user: models.User = Depends(auth.get_current_principal),
 ):
-    db_meal = db.query(models.Meal).filter(models.Meal.id == meal_id).first()
+    db_meal = await db.get(
+        models.Meal, meal_id, options=load_options(schemas.MealResponse, many=False)
+    )
 
     if not db_meal:
         raise NotFoundException()
 
+    quantities = await _quantities(db, meal_id)
+    before = rollups.contribution(db_meal, quantities)
     # Only update provided fields (exclude_unset=True)
-    for key, value in partial_meal.model_dump(exclude_unset=True).items():
+    changes = partial_meal.model_dump(exclude_unset=True)
+    food_ids = changes.pop("food_ids", None)
+    new_quantities = changes.pop("quantities", None) or {}
+    for key, value in changes.items():
         setattr(db_meal, key, value)
 
-    db.commit()
-    db.refresh(db_meal)
+    if food_ids is not None:
+        foods = (
+            await db.scalars(select(models.Food).filter(models.Food.id.in_(food_ids)))
+        ).all()
+        if not foods or len(foods) != len(set(food_ids)):
+            raise NotFoundException(detail="One or more food IDs not found")
+        db_meal.foods = foods
+        # Foods kept keep their portion; added ones start at the default
+        quantities = {food.id: quantities.get(food.id, models.DEFAULT_QUANTITY) for food in foods}
+    if not set(new_quantities) <= set(quantities):
+        raise NotFoundException(detail="One or more food IDs not in this meal")
+    quantities.update(new_quantities)
+    db_meal.version = await bump_table_version(db, user_meals_counter(db_meal.user_id))
+
+    await db.flush()  # link rows of added foods must exist before their portions
+    await _store_quantities(db, meal_id, new_quantities)
+    await rollups.replace_meal(db, before, rollups.contribution(db_meal, quantities))
+    await db.commit()
+    await db.refresh(db_meal, ["timestamp", "version", "foods"])
+    await response_cache.invalidate(user_meals_tag(db_meal.user_id))
+    await annotate(db, [db_meal])
     return db_meal
 
 
 # ---------- DELETE meal ----------
 @router.delete("/{meal_id}")
-def delete_meal(meal_id: int, db: Session = Depends(get_db)):
+async def delete_meal(meal_id: int, db: AsyncSession = Depends(get_write_db)):
 
-    meal = db.query(models.Meal).filter(models.Meal.id == meal_id).first()
+    meal = await db.get(
+        models.Meal, meal_id, options=load_options(schemas.MealResponse, many=False)
+    )
     if not meal:
         raise NotFoundException()
 
-    db.delete(meal)
-    db.commit()
+    await rollups.remove_meal(db, rollups.contribution(meal, await _quantities(db, meal_id)))
+    await bump_table_version(db, user_meals_counter(meal.user_id))
+    await db.delete(meal)
+    await db.commit()
+    await response_cache.invalidate(user_meals_tag(meal.user_id))
     return {"detail": "Meal deleted successfully"}
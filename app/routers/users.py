@@ -1,48 +1,60 @@
-from fastapi import APIRouter, Depends, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Response, status, Query
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app import models, schemas
-from app.core.security import require_role, get_password_hash
+from app.core.security import require_role, get_password_hash_async
+from app.core.cache import response_cache, user_meals_tag
 from app.core.const.base_roles import BASE_ROLES
-from app.database import get_db
+from app.core.loading import load_options
+from app.core.pagination import keyset_paginate, set_cursor_headers
+from app.core.rbac import rbac_index
+from app.core.revocation import token_versions
+from app.database import get_db, get_write_db
 from app.exceptions import NotFoundException, UserAlreadyExistsException
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
 
 # ---------- GET all users (with pagination) ----------
+# Cursor pagination by default (see X-Next-Cursor / X-Prev-Cursor headers);
+# page/skip fall back to offset pagination.
 @router.get("/", response_model=List[schemas.UserResponse])
-def get_users(
+async def get_users(
+    response: Response,
+    cursor: str = Query(None),
     page: int = Query(None, ge=1),
     skip: int = Query(None, ge=0),
-    limit: int = Query(10, le=100),
-    db: Session = Depends(get_db),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
     admin_user: models.User = Depends(require_role(BASE_ROLES.ADMIN)),
 ):
-    if page is not None:
-        skip = (page - 1) * limit
-    elif skip is None:
-        skip = 0
-
-    users = (
-        db.query(models.User)
-        .order_by(models.User.id.asc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    query = select(models.User).options(*load_options(schemas.UserResponse))
+
+    if cursor is None and (page is not None or skip is not None):
+        if page is not None:
+            skip = (page - 1) * limit
+
+        users = await db.scalars(
+            query.order_by(models.User.id.asc()).offset(skip).limit(limit)
+        )
+        return users.all()
 
-    return users
+    result = await keyset_paginate(db, query, [models.User.id], limit, cursor)
+    set_cursor_headers(response, result)
+    return result.items
 
 
 # ---------- GET user by ID ----------
 @router.get("/{user_id}", response_model=schemas.UserResponse)
-def get_user(
+async def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin_user: models.User = Depends(require_role(BASE_ROLES.ADMIN)),
 ):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(
+        models.User, user_id, options=load_options(schemas.UserResponse, many=False)
+    )
     if not db_user:
         raise NotFoundException()
 
@@ -53,17 +65,17 @@ def get_user(
 @router.post(
     "/", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED
 )
-def create_user(
+async def create_user(
     user_in: schemas.UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     admin_user: models.User = Depends(require_role(BASE_ROLES.ADMIN)),
 ):
     # Check duplicates
-    if db.query(models.User).filter(models.User.email == user_in.email).first():
+    if await db.scalar(select(models.User).filter(models.User.email == user_in.email)):
         raise UserAlreadyExistsException()
 
     # Hash password
-    hashed_pw = get_password_hash(user_in.password)
+    hashed_pw = await get_password_hash_async(user_in.password)
 
     new_user = models.User(
         username=user_in.username,
@@ -73,9 +85,15 @@ def create_user(
 
     # Assign roles if provided
     if user_in.role_ids:
-        roles = db.query(models.Role).filter(models.Role.id.in_(user_in.role_ids)).all()
+        roles = (
+            await db.scalars(
+                select(models.Role).filter(models.Role.id.in_(user_in.role_ids))
+            )
+        ).all()
     else:
-        default_role = db.query(models.Role).filter_by(name=BASE_ROLES.USER).first()
+        default_role = await db.scalar(
+            select(models.Role).filter_by(name=BASE_ROLES.USER)
+        )
         if not default_role:
             raise Exception("Default USER role not found. Run seed_roles().")
         roles = [default_role]
@@ -83,81 +101,103 @@ def create_user(
     new_user.roles = roles
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user, ["id", "roles"])
 
     return new_user
 
 
 # ---------- UPDATE user ----------
 @router.put("/{user_id}", response_model=schemas.UserResponse)
-def update_user(
+async def update_user(
     user_id: int,
     user_update: schemas.UserCreate,  # full update: must include password, etc.
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     admin_user: models.User = Depends(require_role(BASE_ROLES.ADMIN)),
 ):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(
+        models.User, user_id, options=load_options(schemas.UserResponse, many=False)
+    )
     if not db_user:
         raise NotFoundException()
 
     for key, value in user_update.model_dump().items():
         if key == "password":
-            setattr(db_user, "hashed_password", get_password_hash(value))
+            setattr(db_user, "hashed_password", await get_password_hash_async(value))
         elif hasattr(db_user, key):
             setattr(db_user, key, value)
 
     if user_update.role_ids is not None:
         new_roles = (
-            db.query(models.Role).filter(models.Role.id.in_(user_update.role_ids)).all()
-        )
+            await db.scalars(
+                select(models.Role).filter(models.Role.id.in_(user_update.role_ids))
+            )
+        ).all()
         db_user.roles = new_roles
 
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    if user_update.role_ids is not None:
+        # Claims-mode tokens and the RBAC index still hold the old roles
+        await token_versions.bump(user_id)
+        rbac_index.invalidate_user(user_id)
+    await db.refresh(db_user, ["roles"])
     return db_user
 
 
 # ---------- PARTIAL UPDATE user ----------
 @router.patch("/{user_id}", response_model=schemas.UserResponse)
-def partial_update_user(
+async def partial_update_user(
     user_id: int,
     user_update: schemas.UserBase,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     admin_user: models.User = Depends(require_role(BASE_ROLES.ADMIN)),
 ):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(
+        models.User, user_id, options=load_options(schemas.UserResponse, many=False)
+    )
     if not db_user:
         raise NotFoundException()
 
     for key, value in user_update.model_dump(exclude_unset=True).items():
         if key == "password":
-            setattr(db_user, "hashed_password", get_password_hash(value))
+            setattr(db_user, "hashed_password", await get_password_hash_async(value))
         elif hasattr(db_user, key):
             setattr(db_user, key, value)
 
     if user_update.role_ids is not None:
         new_roles = (
-            db.query(models.Role).filter(models.Role.id.in_(user_update.role_ids)).all()
-        )
+            await db.scalars(
+                select(models.Role).filter(models.Role.id.in_(user_update.role_ids))
+            )
+        ).all()
         db_user.roles = new_roles
 
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    if user_update.role_ids is not None:
+        # Claims-mode tokens and the RBAC index still hold the old roles
+        await token_versions.bump(user_id)
+        rbac_index.invalidate_user(user_id)
+    await db.refresh(db_user, ["roles"])
     return db_user
 
 
 # ---------- DELETE user ----------
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(
+async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     admin_user: models.User = Depends(require_role(BASE_ROLES.ADMIN)),
 ):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(models.User, user_id)
     if not db_user:
         raise NotFoundException()
 
-    db.delete(db_user)
-    db.commit()
+    await db.execute(
+        delete(models.DailyNutrition).where(models.DailyNutrition.user_id == user_id)
+    )
+    await db.delete(db_user)
+    await db.commit()
+    await token_versions.bump(user_id)
+    rbac_index.invalidate_user(user_id)
+    await response_cache.invalidate(user_meals_tag(user_id))
     return
@@ -4,9 +4,9 @@
 # Each class represents a data contract between the backend and external layers (like API requests/responses).
 # They ensure type validation, automatic data conversion, and serialization.
 
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, ConfigDict, PositiveFloat, field_validator, model_validator
+from typing import Dict, List, Optional
+from datetime import date, datetime
 
 
 # ---------- USER ----------
@@ -36,6 +36,12 @@ class UserResponse(UserBase):
     id: int
     roles: List[str]
 
+    @field_validator("roles", mode="before")
+    @classmethod
+    def role_names(cls, roles):
+        # ORM users carry Role objects, the API exposes their names
+        return [getattr(role, "name", role) for role in roles]
+
     class Config:
         from_attributes = True
 
@@ -45,7 +51,7 @@ class FoodBase(BaseModel):
     name: str
     calories: float
     protein: float
-    carbs: float
+    carbohydrates: float
     fat: float
 
 
@@ -58,11 +64,11 @@ class FoodUpdate(FoodBase):
 
 
 class FoodPartialUpdate(BaseModel):
-    name: Optional[str]
-    calories: Optional[float]
-    protein: Optional[float]
-    fat: Optional[float]
-    carbohydrates: Optional[float]
+    name: Optional[str] = None
+    calories: Optional[float] = None
+    protein: Optional[float] = None
+    fat: Optional[float] = None
+    carbohydrates: Optional[float] = None
 
 
 # TODO: check functioning and purpose of this
@@ -73,6 +79,19 @@ class FoodResponse(FoodBase):
         from_attributes = True
 
 
+class FoodImportError(BaseModel):
+    row: int  # 1-based data row (CSV header excluded)
+    errors: List[str]
+
+
+class FoodImportReport(BaseModel):
+    rows: int
+    imported: int
+    failed: int
+    errors: List[FoodImportError]
+    errors_truncated: bool  # more rows failed than FOOD_IMPORT_MAX_ERRORS
+
+
 # ---------- MEAL ----------
 # ---------- Base (shared) ----------
 class MealBase(BaseModel):
@@ -90,6 +109,33 @@ class MealCreate(MealBase):
     food_ids: List[int] = Field(
         ..., min_items=1, description="IDs of foods in this meal"
     )
+    quantities: Optional[Dict[int, PositiveFloat]] = Field(
+        None, description="Grams per food ID (100 g when omitted)"
+    )
+
+    @model_validator(mode="after")
+    def quantities_of_listed_foods(self):
+        if self.quantities and not set(self.quantities) <= set(self.food_ids):
+            raise ValueError("quantities must only name foods in food_ids")
+        return self
+
+
+# ---------- BATCH CREATE ----------
+class MealBatchCreate(BaseModel):
+    meals: List[MealCreate] = Field(..., min_length=1)
+
+
+class MealBatchResult(BaseModel):
+    index: int  # position in the request
+    id: Optional[int] = None  # None when the meal was not created
+    errors: List[str] = []
+
+
+class MealBatchReport(BaseModel):
+    meals: int
+    created: int
+    failed: int
+    results: List[MealBatchResult]  # in request order
 
 
 # ---------- UPDATE ----------
@@ -102,14 +148,48 @@ class MealPartialUpdate(BaseModel):
     name: Optional[str] = None
     timestamp: Optional[datetime] = None
     food_ids: Optional[List[int]] = None
+    # Grams per food ID; without food_ids, for foods already in the meal
+    quantities: Optional[Dict[int, PositiveFloat]] = None
 
 
 # ---------- RESPONSE ----------
+class NutritionTotals(BaseModel):
+    calories: float
+    protein: float
+    fat: float
+    carbohydrates: float
+
+
 class MealResponse(BaseModel):
     id: int
     name: str
     timestamp: datetime
     user_id: int
     foods: List["FoodResponse"]
+    quantities: Dict[int, float]  # grams per food ID
+    totals: NutritionTotals  # for the portions above
 
     model_config = ConfigDict(from_attributes=True)
+
+
+# ---------- NUTRITION SUMMARY ----------
+class NutritionSummary(BaseModel):
+    period_start: date
+    calories: float
+    protein: float
+    fat: float
+    carbohydrates: float
+    meal_count: int
+
+
+# ---------- SQL PROFILER ----------
+class SQLProfilerState(BaseModel):
+    enabled: bool
+    slow_query_ms: float
+    n_plus_one_threshold: int
+
+
+class SQLProfilerUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    slow_query_ms: Optional[float] = Field(None, ge=0)
+    n_plus_one_threshold: Optional[int] = Field(None, ge=2)
@@ -0,0 +1,289 @@
+# Columnar, read-optimized snapshot of the food catalog.
+#
+# Each worker keeps the food table's macros as NumPy arrays indexed by food id
+# (FoodColumns) and, per macro, the food ids ordered by that macro
+# (SortedColumn). Nutrient range filters and sorts on GET /foods run against
+# it instead of SQL, so no float column needs a database index:
+# - a range on one macro is two binary searches in its sorted column, which
+#   also tells how selective it is;
+# - selective filters start from the narrowest range's candidates, the
+#   other ranges being vectorized masks over those candidates only, and the
+#   first offset + limit results are picked with np.argpartition, so only
+#   those are sorted;
+# - broad filters instead walk the result order (ids, or the sorted column
+#   of the sort macro) in growing blocks and stop at offset + limit matches.
+# The nutrition engine (app/services/nutrition_engine.py) reads the same
+# columns.
+#
+# Refresh is incremental. Every food write stamps its row with the new "food"
+# table version (food.revision) and deletions leave a food_tombstone row, so a
+# snapshot at version V only reads rows and tombstones with a revision above V
+# (both indexed). Sorted columns are rebuilt on the first query after a
+# change. A row count that disagrees with the snapshot afterwards (rows
+# written around the API, e.g. by app/core/seed/synthetic.py) means a full
+# reload. Subscribers (the k-NN index, app/services/food_neighbors.py) are
+# told about each change or reload.
+import asyncio
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.services.nutrition_rollups import MACROS
+
+LOAD_BATCH = 50_000  # rows per fetch when loading the whole table
+
+
+class FoodColumns:
+    """Macro arrays indexed by food id; `present` marks the ids that exist."""
+
+    __slots__ = ("present", "count", "calories", "protein", "fat", "carbohydrates")
+
+    def __init__(self, size: int = 0):
+        self.present = np.zeros(size, dtype=bool)
+        self.count = 0
+        for macro in MACROS:
+            setattr(self, macro, np.zeros(size))
+
+    def _reserve(self, size: int):
+        if size <= len(self.present):
+            return
+        size = max(size, 2 * len(self.present))  # amortized growth for inserts
+        for name in ("present", *MACROS):
+            old = getattr(self, name)
+            grown = np.zeros(size, dtype=old.dtype)
+            grown[: len(old)] = old
+            setattr(self, name, grown)
+
+    def put(self, rows):
+        """Insert or overwrite foods from (id, *MACROS) rows."""
+        # Plain tuples: NumPy reads Row objects element by element
+        table = np.array([tuple(row) for row in rows], dtype=float).reshape(-1, 1 + len(MACROS))
+        if not len(table):
+            return
+        ids = table[:, 0].astype(np.intp)
+        self._reserve(int(ids.max()) + 1)
+        self.count += len(ids) - int(self.present[ids].sum())
+        self.present[ids] = True
+        for column, macro in enumerate(MACROS, start=1):
+            getattr(self, macro)[ids] = table[:, column]
+
+    def remove(self, ids):
+        ids = np.asarray(ids, dtype=np.intp)
+        ids = ids[ids < len(self.present)]
+        self.count -= int(self.present[ids].sum())
+        self.present[ids] = False
+        for macro in MACROS:
+            getattr(self, macro)[ids] = 0
+
+
+class SortedColumn:
+    """Present food ids ordered by one macro (ties by id), for range lookups."""
+
+    __slots__ = ("ids", "values")
+
+    def __init__(self, values: np.ndarray, present: np.ndarray):
+        ids = np.flatnonzero(present)
+        self.ids = ids[np.argsort(values[ids], kind="stable")]
+        self.values = values[self.ids]
+
+    def span(self, low: float | None, high: float | None) -> slice:
+        start = 0 if low is None else int(np.searchsorted(self.values, low, side="left"))
+        stop = len(self.values) if high is None else int(np.searchsorted(self.values, high, side="right"))
+        return slice(start, max(start, stop))
+
+
+def parse_sort(sort: str) -> tuple[str, str | None, bool]:
+    """"-protein/calories" -> ("protein", "calories", descending=True)."""
+    descending = sort.startswith("-")
+    macro, _, divisor = sort.lstrip("-").partition("/")
+    return macro, divisor or None, descending
+
+
+def _top(ids: np.ndarray, keys: np.ndarray, ties: np.ndarray, k: int) -> np.ndarray:
+    """The ids of the k smallest (key, tie) pairs, in that order."""
+    if k < len(ids):
+        part = np.argpartition(keys, k - 1)
+        # Equal keys may straddle the cut: keep them all and let the sort decide,
+        # so consecutive pages agree on the order
+        threshold = keys[part[k - 1]]
+        rest = part[k:]
+        chosen = np.concatenate([part[:k], rest[keys[rest] == threshold]])
+        ids, keys, ties = ids[chosen], keys[chosen], ties[chosen]
+    return ids[np.lexsort((ties, keys))[:k]]
+
+
+def _macro_rows():
+    return select(models.Food.id, *(getattr(models.Food, m) for m in MACROS))
+
+
+class FoodCatalog:
+    __slots__ = ("columns", "version", "_sorted", "_lock", "_subscribers")
+
+    def __init__(self):
+        self.columns = FoodColumns()
+        self.version = None  # "food" table version of the snapshot
+        self._sorted: dict[str, SortedColumn] = {}
+        self._lock = asyncio.Lock()
+        self._subscribers = []
+
+    def subscribe(self, subscriber):
+        """Call subscriber.changed(columns, removed_ids, changed_ids) after each
+        incremental refresh and subscriber.reloaded(columns) after a full one."""
+        self._subscribers.append(subscriber)
+
+    # ---------- Refresh ----------
+    async def refresh(self, db: AsyncSession, full: bool = False):
+        """Bring the snapshot up to the current "food" table version."""
+        version = await db.scalar(
+            select(models.TableVersion.version).where(models.TableVersion.name == "food")
+        ) or 0
+        # A lagging replica may be behind the snapshot: never go back
+        if self.version is not None and version <= self.version and not full:
+            return
+        async with self._lock:
+            if self.version is not None and version <= self.version and not full:
+                return  # refreshed while this request waited
+            if self.version is None or full or not await self._apply(db, self.version):
+                await self._load(db)
+                for subscriber in self._subscribers:
+                    subscriber.reloaded(self.columns)
+            self.version = version
+            self._sorted = {}
+
+    async def _load(self, db: AsyncSession):
+        # Core rows in batches: no ORM row processing, no list of every row
+        connection = await db.connection()
+        result = await connection.stream(_macro_rows().execution_options(yield_per=LOAD_BATCH))
+        columns = FoodColumns()
+        async for rows in result.partitions():
+            columns.put(rows)
+        self.columns = columns
+
+    async def _apply(self, db: AsyncSession, since: int) -> bool:
+        """Apply writes after `since`; False when the row count disagrees."""
+        deleted = await db.scalars(
+            select(models.FoodTombstone.food_id).where(models.FoodTombstone.revision > since)
+        )
+        changed = await db.execute(_macro_rows().where(models.Food.revision > since))
+        deleted, changed = deleted.all(), changed.all()
+        count = await db.scalar(select(func.count()).select_from(models.Food))
+        # Tombstones first: a deleted id may have been reused since
+        self.columns.remove(deleted)
+        self.columns.put(changed)
+        self._sorted = {}
+        if count != self.columns.count:
+            return False
+        removed = np.array(deleted, dtype=np.intp)
+        changed = np.array([row[0] for row in changed], dtype=np.intp)
+        for subscriber in self._subscribers:
+            subscriber.changed(self.columns, removed, changed)
+        return True
+
+    def sorted(self, macro: str) -> SortedColumn:
+        column = self._sorted.get(macro)
+        if column is None:
+            column = self._sorted[macro] = SortedColumn(getattr(self.columns, macro), self.columns.present)
+        return column
+
+    # ---------- Queries ----------
+    def macros(self, food_id: int) -> tuple | None:
+        """A food's macros (MACROS order), or None if it doesn't exist."""
+        columns = self.columns
+        if not 0 <= food_id < len(columns.present) or not columns.present[food_id]:
+            return None
+        return tuple(float(getattr(columns, macro)[food_id]) for macro in MACROS)
+
+    def _within(self, ids: np.ndarray, ranges: dict[str, tuple]) -> np.ndarray:
+        keep = np.ones(len(ids), dtype=bool)
+        for name, (low, high) in ranges.items():
+            values = getattr(self.columns, name)[ids]
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+        return ids[keep]
+
+    def _first(self, ranges: dict[str, tuple], k: int, order: np.ndarray | None) -> np.ndarray:
+        """The first k foods within every range, reading `order` (or ids
+        ascending) in doubling blocks, so a broad filter stops early."""
+        columns = self.columns
+        size = len(columns.present) if order is None else len(order)
+        found, total, start, block = [], 0, 0, max(1024, 4 * k)
+        while start < size and total < k:
+            stop = min(start + block, size)
+            if order is None:
+                ids = np.flatnonzero(columns.present[start:stop]) + start
+            else:
+                ids = order[start:stop]
+            ids = self._within(ids, ranges)
+            found.append(ids)
+            total += len(ids)
+            start, block = stop, 2 * block
+        return np.concatenate(found)[:k] if found else np.empty(0, dtype=np.intp)
+
+    def search(
+        self, ranges: dict[str, tuple], sort: str | None, offset: int, limit: int
+    ) -> list[int]:
+        """Ids of foods within every (low, high) macro range, ordered by `sort`
+        (by id when None), from `offset`."""
+        columns = self.columns
+        k = offset + limit
+        macro, divisor, descending = parse_sort(sort) if sort else (None, None, False)
+        spans = {name: self.sorted(name).span(*bounds) for name, bounds in ranges.items()}
+        sizes = {name: span.stop - span.start for name, span in spans.items()}
+
+        if divisor is None:
+            # Walking the result order (ids, or the sort macro's sorted column)
+            # reads about k / selectivity foods; starting from the narrowest
+            # range reads that range. Selectivity assumes independent ranges.
+            selectivity = float(np.prod([size / max(columns.count, 1) for size in sizes.values()]))
+            narrowest = min(sizes.values(), default=columns.count)
+            if selectivity and k / selectivity < narrowest:
+                order = None
+                if macro is not None:
+                    order = self.sorted(macro).ids
+                    order = order[::-1] if descending else order
+                return self._first(ranges, k, order)[offset:].tolist()
+
+        if ranges:
+            driver = min(sizes, key=sizes.get)
+            ids = self._within(self.sorted(driver).ids[spans[driver]], {
+                name: bounds for name, bounds in ranges.items() if name != driver
+            })
+            ordered_by = driver  # masks keep the driver's order
+        else:
+            ids, ordered_by = np.flatnonzero(columns.present), "id"
+
+        if macro is None:
+            if ordered_by == "id":
+                return ids[offset:k].tolist()
+            return _top(ids, ids, ids, k)[offset:].tolist()
+        if divisor is None and ordered_by == macro:
+            # Already in order: no sort at all
+            return (ids[::-1] if descending else ids)[offset:k].tolist()
+
+        values = getattr(columns, macro)[ids]
+        if divisor is not None:
+            denominator = getattr(columns, divisor)[ids]
+            values = np.divide(values, denominator, out=np.full(len(ids), np.nan), where=denominator != 0)
+        # Descending is the exact reverse of ascending (ties by id included);
+        # undefined ratios come last either way
+        keys, ties = (-values, -ids) if descending else (values, ids)
+        keys[np.isnan(keys)] = np.inf
+        return _top(ids, keys, ties, k)[offset:].tolist()
+
+
+food_catalog = FoodCatalog()
+
+
+async def record_deletion(db: AsyncSession, food_id: int, revision: int):
+    """Leave a tombstone for a deleted food, in the caller's transaction."""
+    table = models.FoodTombstone.__table__
+    insert = (postgresql if db.bind.dialect.name == "postgresql" else sqlite).insert
+    statement = insert(table).values(food_id=food_id, revision=revision)
+    await db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.food_id], set_={"revision": statement.excluded.revision}
+        )
+    )
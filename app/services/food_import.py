@@ -0,0 +1,175 @@
+# Streaming bulk import of foods from CSV or NDJSON.
+#
+# The request body is read in network-sized chunks and parsed line by line,
+# so memory stays bounded by FOOD_IMPORT_CHUNK_SIZE rows whatever the file
+# size. Each chunk of valid rows is upserted on `name` with one executemany
+# INSERT ... ON CONFLICT DO UPDATE and committed on its own; rows that fail
+# validation are reported by number and never reach the database.
+import codecs
+import csv
+import json
+from typing import AsyncIterator
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, schemas
+from app.core.cache import FOOD_MACROS, FOODS_LIST, food_tag, response_cache
+from app.core.config import settings
+from app.core.etag import bump_table_version
+from app.services import nutrition_rollups as rollups
+from app.services.food_search import bulk_indexing
+
+FORMATS = ("csv", "ndjson")
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def format_for(content_type: str | None) -> str | None:
+    if not content_type:
+        return None
+    return CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+
+
+# ---------- Parsing ----------
+async def _line_batches(chunks: AsyncIterator[bytes]):
+    """Complete lines of each received chunk; a partial last line waits for the next."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        if lines:
+            yield lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield [pending]
+
+
+async def _ndjson_records(chunks):
+    number = 0
+    async for lines in _line_batches(chunks):
+        for line in lines:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                yield number, json.loads(line)
+            except ValueError as exc:
+                yield number, f"Invalid JSON: {exc}"
+
+
+async def _csv_records(chunks):
+    header = None
+    number = 0
+    record = ""  # a quoted field may span several lines
+    async for lines in _line_batches(chunks):
+        complete = []
+        for line in lines:
+            record = f"{record}\n{line}" if record else line
+            if record.count('"') % 2 == 0:
+                if record.strip():
+                    complete.append(record)
+                record = ""
+
+        for values in csv.reader(complete):
+            if header is None:
+                header = [name.strip().lower() for name in values]
+                continue
+            number += 1
+            yield number, dict(zip(header, values))
+
+    if record:
+        number += 1
+        yield number, "Unterminated quoted field"
+
+
+# ---------- Writing ----------
+def _upsert(dialect_name: str):
+    insert = (postgresql if dialect_name == "postgresql" else sqlite).insert
+    # Core table, not the mapped class: skips the ORM bulk-persistence layer
+    table = models.Food.__table__
+    statement = insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={
+            **{macro: statement.excluded[macro] for macro in rollups.MACROS},
+            "version": table.c.version + 1,
+            "revision": statement.excluded.revision,
+        },
+    )
+
+
+async def _flush(db: AsyncSession, rows: dict[str, dict]):
+    # Existing foods whose macros change shift the rollups of meals using them
+    existing = await db.execute(
+        select(models.Food.id, models.Food.name, *(getattr(models.Food, m) for m in rollups.MACROS))
+        .where(models.Food.name.in_(list(rows)))
+    )
+    edits = {}
+    for food_id, name, *macros in existing:
+        old = dict(zip(rollups.MACROS, macros))
+        new = {macro: rows[name][macro] for macro in rollups.MACROS}
+        if old != new:
+            edits[food_id] = (old, new)
+    await rollups.change_foods(db, edits)
+    changed = [FOODS_LIST, *map(food_tag, edits)]
+    if edits:
+        changed.append(FOOD_MACROS)
+
+    revision = await bump_table_version(db, "food")
+    async with bulk_indexing(db):
+        await db.execute(
+            _upsert(db.bind.dialect.name),
+            [{**row, "revision": revision} for row in rows.values()],
+        )
+    await db.commit()
+    await response_cache.invalidate(*changed)
+
+
+def _error_messages(exc: Exception) -> list[str]:
+    if isinstance(exc, ValidationError):
+        return [
+            f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}"
+            for error in exc.errors()
+        ]
+    return [str(exc)]
+
+
+async def import_foods(db: AsyncSession, chunks: AsyncIterator[bytes], fmt: str) -> dict:
+    records = _csv_records(chunks) if fmt == "csv" else _ndjson_records(chunks)
+    chunk_size = settings.FOOD_IMPORT_CHUNK_SIZE
+    max_errors = settings.FOOD_IMPORT_MAX_ERRORS
+
+    report = {"rows": 0, "imported": 0, "failed": 0, "errors": [], "errors_truncated": False}
+    # Keyed by name: a name repeated within a chunk is upserted once, last row wins
+    valid: dict[str, dict] = {}
+
+    async for number, record in records:
+        report["rows"] += 1
+        try:
+            if isinstance(record, str):
+                raise ValueError(record)
+            food = schemas.FoodCreate.model_validate(record)
+        except (ValidationError, ValueError) as exc:
+            report["failed"] += 1
+            if len(report["errors"]) < max_errors:
+                report["errors"].append({"row": number, "errors": _error_messages(exc)})
+            else:
+                report["errors_truncated"] = True
+            continue
+
+        valid[food.name] = food.model_dump()
+        report["imported"] += 1
+        if len(valid) >= chunk_size:
+            await _flush(db, valid)
+            valid = {}
+
+    if valid:
+        await _flush(db, valid)
+    return report
@@ -0,0 +1,260 @@
+# Nearest-neighbour search over food macros, for GET /foods/{food_id}/similar
+# and GET /foods/recommend.
+#
+# Foods are points in macro space, each macro divided by its standard
+# deviation over the catalog so that a gram of fat and a kcal weigh alike.
+# A KD-tree (median splits on the widest dimension, leaves of
+# FOOD_NEIGHBORS_LEAF_SIZE points, a bounding box per node) answers a query
+# by visiting nodes nearest box first and stopping once no unvisited box can
+# hold a closer point: a few leaves are read instead of the whole catalog.
+#
+# The tree follows the catalog snapshot (app/services/food_catalog.py):
+# - deleted foods are tombstoned in place and skipped by queries;
+# - new foods go to a buffer that every query also scans by brute force;
+# - an edited food is both;
+# - a full reload of the snapshot compares it with the tree and does the same
+#   for every food that differs.
+# Once buffered foods and tombstones reach FOOD_NEIGHBORS_REBUILD_FRACTION of
+# the tree, or after a reload, a rebuild (with fresh scales) runs in a thread
+# behind the requests, which keep reading the old tree and buffer until the
+# new tree is swapped in with the changes made during the build replayed.
+import asyncio
+import heapq
+import logging
+import numpy as np
+from app.core.config import settings
+from app.services.food_catalog import FoodColumns, food_catalog
+from app.services.nutrition_rollups import MACROS
+
+logger = logging.getLogger(__name__)
+
+
+def _vectors(columns: FoodColumns, ids: np.ndarray) -> np.ndarray:
+    return np.stack([getattr(columns, macro)[ids] for macro in MACROS], axis=1)
+
+
+def _nearest(distances: np.ndarray, ids: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """The k smallest distances (ties by id), in order."""
+    if k < len(ids):
+        part = np.argpartition(distances, k - 1)
+        # Keep every tie of the k-th distance, so the lowest ids win
+        rest = part[k:]
+        part = np.concatenate([part[:k], rest[distances[rest] == distances[part[k - 1]]]])
+        distances, ids = distances[part], ids[part]
+    order = np.lexsort((ids, distances))[:k]
+    return distances[order], ids[order]
+
+
+class KDTree:
+    """Static KD-tree over points, with a tombstone per point."""
+
+    __slots__ = ("points", "ids", "alive", "dead", "start", "stop", "left", "right", "low", "high")
+
+    def __init__(self, points: np.ndarray, ids: np.ndarray, leaf_size: int):
+        self.points = points.copy()
+        self.ids = ids.copy()
+        self.alive = np.ones(len(ids), dtype=bool)
+        self.dead = 0
+        start, stop, left, right, low, high = [0], [len(ids)], [-1], [-1], [], []
+
+        # Nodes are created in order, so a node's bounds are appended when it
+        # is reached; children always come later
+        node = 0
+        while node < len(start):
+            block = self.points[start[node] : stop[node]]
+            lower, upper = (block.min(axis=0), block.max(axis=0)) if len(block) else (np.zeros(len(MACROS)),) * 2
+            low.append(lower)
+            high.append(upper)
+            spread = upper - lower
+            dimension = int(np.argmax(spread))
+            if len(block) > leaf_size and spread[dimension] > 0:
+                middle = len(block) // 2
+                order = np.argpartition(block[:, dimension], middle)
+                first, last = start[node], stop[node]
+                self.points[first:last] = np.take(block, order, axis=0)  # faster than fancy indexing rows
+                self.ids[first:last] = self.ids[first:last][order]
+                left[node], right[node] = len(start), len(start) + 1
+                for child_start, child_stop in ((first, first + middle), (first + middle, last)):
+                    start.append(child_start)
+                    stop.append(child_stop)
+                    left.append(-1)
+                    right.append(-1)
+            node += 1
+
+        self.start, self.stop = np.array(start), np.array(stop)
+        self.left, self.right = np.array(left), np.array(right)
+        self.low, self.high = np.stack(low), np.stack(high)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def remove(self, positions: np.ndarray):
+        self.dead += int(self.alive[positions].sum())
+        self.alive[positions] = False
+
+    def query(self, target: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Squared distances and ids of the k nearest live points."""
+        best_distances, best_ids = np.empty(0), np.empty(0, dtype=self.ids.dtype)
+        worst = np.inf  # k-th best distance so far
+        heap = [(0.0, 0)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > worst:
+                break  # every box left is farther than the k found
+            if self.left[node] < 0:
+                first, last = self.start[node], self.stop[node]
+                distances = ((self.points[first:last] - target) ** 2).sum(axis=1)
+                live = self.alive[first:last]
+                best_distances, best_ids = _nearest(
+                    np.concatenate([best_distances, distances[live]]),
+                    np.concatenate([best_ids, self.ids[first:last][live]]),
+                    k,
+                )
+                if len(best_ids) == k:
+                    worst = best_distances[-1]
+                continue
+            children = np.array([self.left[node], self.right[node]])
+            gaps = np.maximum(self.low[children] - target, 0) + np.maximum(target - self.high[children], 0)
+            for child, gap in zip(children.tolist(), (gaps**2).sum(axis=1).tolist()):
+                if gap <= worst:
+                    heapq.heappush(heap, (gap, child))
+        return best_distances, best_ids
+
+
+def _build(ids: np.ndarray, vectors: np.ndarray) -> tuple[KDTree, np.ndarray]:
+    """A tree over `vectors` scaled by their standard deviations, and the scales."""
+    scale = vectors.std(axis=0) if len(ids) else np.ones(len(MACROS))
+    scale = np.where(scale > 0, scale, 1.0)
+    return KDTree(vectors / scale, ids, settings.FOOD_NEIGHBORS_LEAF_SIZE), scale
+
+
+class FoodNeighbors:
+    """k-NN index over the catalog snapshot, subscribed to its changes."""
+
+    __slots__ = ("tree", "scale", "position", "buffer", "_buffered", "due", "_rebuilding", "_touched")
+
+    def __init__(self):
+        self.tree: KDTree | None = None
+        self.scale = np.ones(len(MACROS))
+        self.position = np.empty(0, dtype=np.intp)  # tree position by food id, -1 if none
+        self.buffer: dict[int, np.ndarray] = {}  # food id -> macros, added since the build
+        self._buffered = None  # the buffer as (ids, scaled vectors), built on first use
+        self.due = True  # a rebuild is wanted
+        self._rebuilding: asyncio.Task | None = None
+        # Food ids changed since the running rebuild's snapshot, None after a reload
+        self._touched: list[np.ndarray] | None = []
+
+    # ---------- Catalog changes ----------
+    def reloaded(self, columns: FoodColumns):
+        self.due = True
+        self._touched = None
+        if self.tree is not None:
+            self._reconcile(columns)
+
+    def changed(self, columns: FoodColumns, removed: np.ndarray, changed: np.ndarray):
+        touched = np.concatenate([removed, changed]).astype(np.intp)
+        if self._rebuilding is not None and self._touched is not None:
+            self._touched.append(touched)
+        if self.tree is not None:
+            self._reconcile(columns, touched)
+
+    def _reconcile(self, columns: FoodColumns, ids: np.ndarray | None = None):
+        """Tombstone tree points that no longer match `columns` and buffer the
+        foods the tree lacks: only `ids` when given, else the whole catalog."""
+        tree, present = self.tree, columns.present
+        if ids is None:
+            # An unchanged food scales to the very same floats as its point
+            same = np.zeros(len(tree), dtype=bool)
+            inside = tree.ids < len(present)
+            same[inside] = present[tree.ids[inside]]
+            same[same] = (_vectors(columns, tree.ids[same]) / self.scale == tree.points[same]).all(axis=1)
+            tree.remove(np.flatnonzero(~same))
+            covered = np.zeros(len(present), dtype=bool)
+            covered[tree.ids[tree.alive]] = True
+            ids = np.flatnonzero(present & ~covered)
+            self.buffer = {}
+        else:
+            ids = np.unique(ids)
+            for food_id in ids.tolist():
+                self.buffer.pop(food_id, None)
+            positions = self.position[ids[ids < len(self.position)]]
+            tree.remove(positions[positions >= 0])
+            ids = ids[ids < len(present)]
+            ids = ids[present[ids]]  # changed or re-used, not only deleted
+        for food_id, vector in zip(ids.tolist(), _vectors(columns, ids)):
+            self.buffer[food_id] = vector
+        self._buffered = None
+        if len(self.buffer) + tree.dead > settings.FOOD_NEIGHBORS_REBUILD_FRACTION * max(len(tree), 1):
+            self.due = True
+
+    # ---------- Rebuild ----------
+    def _install(self, tree: KDTree, scale: np.ndarray, size: int):
+        self.tree, self.scale = tree, scale
+        self.position = np.full(size, -1, dtype=np.intp)
+        self.position[tree.ids] = np.arange(len(tree))
+        self.buffer = {}
+        self._buffered = None
+
+    def rebuild(self, columns: FoodColumns):
+        """Rebuild in place, blocking (benchmarks, scripts)."""
+        ids = np.flatnonzero(columns.present)
+        self._install(*_build(ids, _vectors(columns, ids)), len(columns.present))
+        self.due = False
+
+    async def prepare(self):
+        """Start a rebuild when one is due. Only the first build is waited
+        for; later ones run behind, queries reading the old tree meanwhile."""
+        if self.due and self._rebuilding is None:
+            self._rebuilding = asyncio.ensure_future(self._rebuild())
+            self._rebuilding.add_done_callback(self._finished)
+        if self.tree is None:
+            # shield: a client disconnecting must not cancel the build
+            await asyncio.shield(self._rebuilding)
+
+    async def _rebuild(self):
+        columns = food_catalog.columns
+        # Copies (fancy indexing): the snapshot may change while the thread builds
+        ids = np.flatnonzero(columns.present)
+        vectors = _vectors(columns, ids)
+        self.due, self._touched = False, []
+        tree, scale = await asyncio.to_thread(_build, ids, vectors)
+
+        # Replay what changed since the snapshot onto the new tree
+        touched, columns = self._touched, food_catalog.columns
+        self._install(tree, scale, len(columns.present))
+        if touched is None:
+            self._reconcile(columns)
+        elif touched:
+            self._reconcile(columns, np.concatenate(touched))
+
+    def _finished(self, task: asyncio.Task):
+        self._rebuilding = None
+        self._touched = []
+        if not task.cancelled() and task.exception() is not None:
+            self.due = True
+            logger.warning("k-NN index rebuild failed: %r", task.exception())
+
+    # ---------- Queries ----------
+    def nearest(self, macros, k: int, exclude: int | None = None) -> list[int]:
+        """Ids of the k foods closest to `macros` (MACROS order, per 100 g).
+        Needs a built tree (prepare() or rebuild())."""
+        target = np.asarray(macros, dtype=float) / self.scale
+        wanted = k + (exclude is not None)
+        distances, ids = self.tree.query(target, wanted)
+        if self.buffer:
+            if self._buffered is None:
+                self._buffered = (
+                    np.fromiter(self.buffer, dtype=np.intp, count=len(self.buffer)),
+                    np.stack(list(self.buffer.values())) / self.scale,
+                )
+            buffered, vectors = self._buffered
+            distances, ids = _nearest(
+                np.concatenate([distances, ((vectors - target) ** 2).sum(axis=1)]),
+                np.concatenate([ids, buffered]),
+                wanted,
+            )
+        return [food_id for food_id in ids.tolist() if food_id != exclude][:k]
+
+
+food_neighbors = FoodNeighbors()
+food_catalog.subscribe(food_neighbors)
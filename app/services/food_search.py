@@ -0,0 +1,163 @@
+# Food search backed by the full-text indexes declared in models.py:
+# FTS5 virtual tables on SQLite, a tsvector + pg_trgm index on Postgres.
+#
+# Queries first try a ranked prefix match on whole words ("chick bre" finds
+# "Chicken breast"). If nothing matches, they fall back to n-gram similarity,
+# which tolerates typos ("brocolli" finds "Broccoli").
+#
+# Matches are ranked inside the index query and only the best
+# SEARCH_RANK_WINDOW of them are joined back to `food`, so a very broad query
+# ("a") never loads more rows than a precise one and still returns the top
+# hits.
+#
+# Rebuild the SQLite indexes of an existing database with:
+#   python -m app.services.food_search rebuild
+import re
+from contextlib import asynccontextmanager
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.core.config import settings
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(q: str) -> list[str]:
+    return _WORD.findall(q.lower())
+
+
+def _fuzzy_query(tokens, n: int) -> str | None:
+    """Every token must share at least one n-gram: (g1 OR g2) AND (h1 OR h2)."""
+    groups = []
+    for token in tokens:
+        if len(token) < 3:
+            continue  # the trigram tokenizer can't match shorter strings
+        grams = [token[i : i + n] for i in range(len(token) - n + 1)] or [token]
+        groups.append("(" + " OR ".join(f'"{gram}"' for gram in dict.fromkeys(grams)) + ")")
+    return " AND ".join(groups) or None
+
+
+async def _fetch(db: AsyncSession, sql: str, **params) -> list[models.Food]:
+    foods = await db.scalars(select(models.Food).from_statement(text(sql)), params)
+    return foods.all()
+
+
+# ---------- SQLite (FTS5) ----------
+def _fts5_query(table: str) -> str:
+    return (
+        f"SELECT food.* FROM (SELECT rowid, rank FROM {table} "
+        f"WHERE {table} MATCH :q ORDER BY rank LIMIT :window) hits "
+        "JOIN food ON food.id = hits.rowid ORDER BY hits.rank LIMIT :limit"
+    )
+
+
+async def _search_sqlite(db: AsyncSession, tokens, limit: int):
+    window = settings.SEARCH_RANK_WINDOW
+    # Tokens are \w+ only, so quoting them is enough to keep FTS syntax out
+    prefix_query = " ".join(f'"{token}"*' for token in tokens)
+    foods = await _fetch(db, _fts5_query("food_fts"), q=prefix_query, window=window, limit=limit)
+    if foods:
+        return foods
+
+    # A typo breaks the n-grams around it but leaves the others intact. The
+    # trigram tokenizer matches any substring, so 4-grams ("broc") are tried
+    # first as they are far more selective; bm25 favours names sharing most.
+    for n in (4, 3):
+        fuzzy_query = _fuzzy_query(tokens, n)
+        if fuzzy_query is None:
+            return []
+        foods = await _fetch(
+            db, _fts5_query("food_trigram"), q=fuzzy_query, window=window, limit=limit
+        )
+        if foods:
+            return foods
+    return []
+
+
+# ---------- Postgres (tsvector + pg_trgm) ----------
+async def _search_postgresql(db: AsyncSession, q: str, tokens, limit: int):
+    window = settings.SEARCH_RANK_WINDOW
+    foods = await _fetch(
+        db,
+        "SELECT hits.* FROM (SELECT food.*, ts_rank(search_vector, query) AS score "
+        "FROM food, to_tsquery('simple', :q) query WHERE search_vector @@ query "
+        "ORDER BY score DESC LIMIT :window) hits ORDER BY hits.score DESC LIMIT :limit",
+        q=" & ".join(f"{token}:*" for token in tokens),
+        window=window,
+        limit=limit,
+    )
+    if foods:
+        return foods
+
+    return await _fetch(
+        db,
+        "SELECT hits.* FROM (SELECT food.*, similarity(name, :q) AS score "
+        "FROM food WHERE name % :q ORDER BY score DESC LIMIT :window) hits "
+        "ORDER BY hits.score DESC LIMIT :limit",
+        q=q,
+        window=window,
+        limit=limit,
+    )
+
+
+async def search_foods(db: AsyncSession, q: str, limit: int = 10) -> list[models.Food]:
+    tokens = _tokens(q)
+    if not tokens:
+        return []
+
+    if db.bind.dialect.name == "postgresql":
+        return await _search_postgresql(db, q, tokens, limit)
+    return await _search_sqlite(db, tokens, limit)
+
+
+@asynccontextmanager
+async def bulk_indexing(db: AsyncSession):
+    """Index foods inserted inside the block with one INSERT ... SELECT per FTS5
+    table instead of the per-row trigger, which is ~10x slower on large batches.
+
+    SQLite only (a no-op elsewhere). The trigger is dropped and recreated inside
+    the caller's transaction, so other connections never see it missing; the
+    caller must commit or roll back right after the block.
+    """
+    if db.bind.dialect.name != "sqlite":
+        yield
+        return
+
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    if not raw.driver_connection.in_transaction:
+        # pysqlite only opens a transaction before DML; DDL would autocommit
+        await connection.exec_driver_sql("BEGIN")
+    # Rowids are assigned as max(id) + 1 and SQLite has a single writer, so
+    # everything inserted in this transaction is above last_id
+    last_id = await db.scalar(select(func.coalesce(func.max(models.Food.id), 0)))
+    await connection.exec_driver_sql("DROP TRIGGER IF EXISTS food_search_ai")
+
+    yield
+
+    for table in ("food_fts", "food_trigram"):
+        await connection.exec_driver_sql(
+            f"INSERT INTO {table}(rowid, name) SELECT id, name FROM food WHERE id > ?",
+            (last_id,),
+        )
+    await connection.exec_driver_sql(models.FOOD_SEARCH_INSERT_TRIGGER)
+
+
+def rebuild_sqlite_index(connection):
+    """Create (if missing) and repopulate the FTS5 tables from `food`."""
+    for statement in models.FOOD_SEARCH_DDL["sqlite"]:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("INSERT INTO food_fts(food_fts) VALUES ('rebuild')")
+    connection.exec_driver_sql("INSERT INTO food_trigram(food_trigram) VALUES ('rebuild')")
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database import engine
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m app.services.food_search rebuild")
+    if engine.dialect.name != "sqlite":
+        sys.exit("Only the SQLite index needs rebuilding; Postgres keeps it in sync.")
+    with engine.begin() as connection:
+        rebuild_sqlite_index(connection)
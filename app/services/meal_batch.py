@@ -0,0 +1,103 @@
+# Batch meal logging (POST /meals/batch), for clients syncing offline logs.
+#
+# However many meals arrive, the database sees the same few statements in
+# one transaction:
+# - one query validates the union of their food ids (and reads the macros
+#   the rollups need);
+# - one upsert bumps the user's meal counter (the meals' ETag version);
+# - one executemany INSERT ... RETURNING adds the valid meals, ids coming
+#   back in request order;
+# - one executemany adds their meal_food_association rows;
+# - one upsert adds their totals to each (user, day) rollup.
+# Meals naming unknown or repeated foods are reported by position and
+# skipped; the rest of the batch is still created.
+from datetime import datetime, timezone
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, schemas
+from app.core.cache import response_cache, user_meals_tag
+from app.core.etag import bump_table_version, user_meals_counter
+from app.services import nutrition_rollups as rollups
+
+
+def _errors(meal: schemas.MealCreate, foods: dict) -> list[str]:
+    errors = []
+    unknown = sorted({food_id for food_id in meal.food_ids if food_id not in foods})
+    if unknown:
+        errors.append(f"Food IDs not found: {', '.join(map(str, unknown))}")
+    if len(set(meal.food_ids)) != len(meal.food_ids):
+        errors.append("Food IDs must not repeat")
+    return errors
+
+
+async def create_meals(
+    db: AsyncSession, user_id: int, meals: list[schemas.MealCreate]
+) -> schemas.MealBatchReport:
+    food_ids = {food_id for meal in meals for food_id in meal.food_ids}
+    foods = {
+        row.id: row
+        for row in await db.execute(
+            select(models.Food.id, *(getattr(models.Food, m) for m in rollups.MACROS)).where(
+                models.Food.id.in_(sorted(food_ids))
+            )
+        )
+    }
+
+    results = [
+        schemas.MealBatchResult(index=index, errors=_errors(meal, foods))
+        for index, meal in enumerate(meals)
+    ]
+    valid = [result.index for result in results if not result.errors]
+
+    if valid:
+        now = datetime.now(timezone.utc)
+        # One version for the whole batch: the meals have different ids
+        version = await bump_table_version(db, user_meals_counter(user_id))
+        rows = [
+            {
+                "user_id": user_id,
+                "name": meals[index].name,
+                "timestamp": meals[index].timestamp or now,
+                "version": version,
+            }
+            for index in valid
+        ]
+        ids = (
+            await db.scalars(
+                insert(models.Meal).returning(models.Meal.id, sort_by_parameter_order=True), rows
+            )
+        ).all()
+        await db.execute(
+            insert(models.meal_food_association),
+            [
+                {
+                    "meal_id": meal_id,
+                    "food_id": food_id,
+                    "quantity": (meals[index].quantities or {}).get(food_id, models.DEFAULT_QUANTITY),
+                }
+                for meal_id, index in zip(ids, valid)
+                for food_id in meals[index].food_ids
+            ],
+        )
+        await rollups.add_meals(
+            db,
+            [
+                rollups.MealContribution(
+                    user_id,
+                    rollups.meal_day(row["timestamp"]),
+                    rollups.food_totals(
+                        [foods[food_id] for food_id in meals[index].food_ids], meals[index].quantities
+                    ),
+                )
+                for row, index in zip(rows, valid)
+            ],
+        )
+        await db.commit()
+        await response_cache.invalidate(user_meals_tag(user_id))
+
+        for meal_id, index in zip(ids, valid):
+            results[index].id = meal_id
+
+    return schemas.MealBatchReport(
+        meals=len(meals), created=len(valid), failed=len(meals) - len(valid), results=results
+    )
@@ -0,0 +1,110 @@
+# Full export of a user's meal history as NDJSON (one meal per line, foods
+# and quantities nested as in MealResponse) or CSV (one line per meal/food
+# pair).
+#
+# Rows come from a server-side cursor over meal JOIN foods ordered by
+# (timestamp, id), fetched MEAL_EXPORT_BATCH_SIZE at a time and written out
+# before the next batch is read, so memory does not grow with history size.
+import csv
+import io
+import json
+from sqlalchemy import select
+from app import models
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+FOOD_FIELDS = ("id", "name", "calories", "protein", "carbohydrates", "fat")
+CSV_HEADER = (
+    "meal_id", "meal_name", "timestamp", "food_id", "food_name",
+    "calories", "protein", "carbohydrates", "fat", "quantity",
+)
+
+
+def _history_query(user_id: int):
+    food_columns = [getattr(models.Food, field) for field in FOOD_FIELDS]
+    return (
+        select(
+            models.Meal.id,
+            models.Meal.name,
+            models.Meal.timestamp,
+            *food_columns,
+            models.meal_food_association.c.quantity,
+        )
+        .select_from(models.Meal)
+        # Outer joins keep meals whose foods were all deleted
+        .outerjoin(
+            models.meal_food_association,
+            models.meal_food_association.c.meal_id == models.Meal.id,
+        )
+        .outerjoin(models.Food, models.Food.id == models.meal_food_association.c.food_id)
+        .where(models.Meal.user_id == user_id)
+        # Same index as keyset pagination: ix_meal_user_timestamp_id
+        .order_by(models.Meal.timestamp, models.Meal.id)
+    )
+
+
+def _meal_json(user_id: int, meal_id: int, name: str, timestamp, foods: list) -> str:
+    return json.dumps(
+        {
+            "id": meal_id,
+            "name": name,
+            "timestamp": timestamp.isoformat(),
+            "user_id": user_id,
+            "foods": [food for food, _ in foods],
+            "quantities": {food["id"]: quantity for food, quantity in foods},
+        }
+    )
+
+
+async def _batches(user_id: int):
+    # Own session: the response body is produced after the endpoint returns
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            _history_query(user_id).execution_options(
+                yield_per=settings.MEAL_EXPORT_BATCH_SIZE
+            )
+        )
+        async for rows in result.partitions():
+            yield rows
+
+
+async def export_ndjson(user_id: int):
+    current = None  # (id, name, timestamp) of the meal being assembled
+    foods: list[tuple] = []  # (food, quantity)
+    async for rows in _batches(user_id):
+        lines = []
+        for meal_id, name, timestamp, *food, quantity in rows:
+            if current is not None and current[0] != meal_id:
+                lines.append(_meal_json(user_id, *current, foods))
+                foods = []
+            current = (meal_id, name, timestamp)
+            if food[0] is not None:
+                foods.append((dict(zip(FOOD_FIELDS, food)), quantity))
+        if lines:
+            lines.append("")
+            yield "\n".join(lines)
+
+    if current is not None:
+        yield _meal_json(user_id, *current, foods) + "\n"
+
+
+async def export_csv(user_id: int):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    async for rows in _batches(user_id):
+        writer.writerows(
+            (meal_id, name, timestamp.isoformat(), *food)
+            for meal_id, name, timestamp, *food in rows
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()  # header of an empty history
+
+
+def export_meals(user_id: int, fmt: str):
+    return export_csv(user_id) if fmt == "csv" else export_ndjson(user_id)
@@ -0,0 +1,75 @@
+# Vectorized meal nutrition.
+#
+# The food catalog's macros are the columns of the per-process catalog
+# snapshot (app/services/food_catalog.py), one array per macro indexed by
+# food id, per 100 g. A set of meals is a sparse meals x foods matrix of
+# portions (grams / 100), kept in coordinate form: one (meal index, food id,
+# grams) triple per meal_food_association row. Their totals are the product
+# of the two, i.e. one gather and one np.bincount per macro, whatever the
+# number of meals: no Python loop over meals or foods.
+#
+# The snapshot is brought up to date first, which costs one primary-key
+# lookup when no food changed.
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.services.food_catalog import FoodColumns, food_catalog
+from app.services.nutrition_rollups import MACROS
+
+
+def portion_totals(
+    columns: FoodColumns, meal_index: np.ndarray, food_ids: np.ndarray, grams: np.ndarray, meals: int
+) -> np.ndarray:
+    """(meals, MACROS) totals of portions given as (meal index, food id, grams) triples."""
+    factors = grams / models.DEFAULT_QUANTITY
+    totals = np.empty((meals, len(MACROS)))
+    for column, macro in enumerate(MACROS):
+        weights = getattr(columns, macro)[food_ids] * factors
+        totals[:, column] = np.bincount(meal_index, weights=weights, minlength=meals)
+    return totals
+
+
+async def totals(
+    db: AsyncSession, meal_index: np.ndarray, food_ids: np.ndarray, grams: np.ndarray, meals: int
+) -> np.ndarray:
+    """(meals, MACROS) totals; food ids index the catalog columns directly."""
+    await food_catalog.refresh(db)
+    present = food_catalog.columns.present
+    # Columns are reserved ahead of the largest id, so ids within them may
+    # still be missing (and read as zero macros)
+    if len(food_ids) and (food_ids.max() >= len(present) or not present[food_ids].all()):
+        await food_catalog.refresh(db, full=True)  # foods written around the API
+    return portion_totals(food_catalog.columns, meal_index, food_ids, grams, meals)
+
+
+async def portions(db: AsyncSession, meal_ids: list[int]) -> list[tuple]:
+    """(meal_id, food_id, grams) of the meals' existing foods, in one query."""
+    links = models.meal_food_association.c
+    rows = await db.execute(
+        select(links.meal_id, links.food_id, links.quantity)
+        .join(models.Food, models.Food.id == links.food_id)  # skips deleted foods, as Meal.foods
+        .where(links.meal_id.in_(meal_ids))
+    )
+    return rows.all()
+
+
+async def annotate(db: AsyncSession, meals: list) -> list:
+    """Set `quantities` and `totals` on loaded meals for MealResponse."""
+    if not meals:
+        return meals
+    position = {meal.id: index for index, meal in enumerate(meals)}
+    rows = await portions(db, list(position))
+
+    meal_index = np.fromiter((position[row[0]] for row in rows), np.intp, len(rows))
+    food_ids = np.fromiter((row[1] for row in rows), np.intp, len(rows))
+    grams = np.fromiter((row[2] for row in rows), float, len(rows))
+    sums = await totals(db, meal_index, food_ids, grams, len(meals))
+
+    for meal in meals:
+        meal.quantities = {}
+    for meal_id, food_id, quantity in rows:
+        meals[position[meal_id]].quantities[food_id] = quantity
+    for meal, row in zip(meals, sums.round(3).tolist()):
+        meal.totals = dict(zip(MACROS, row))
+    return meals
@@ -0,0 +1,232 @@
+# Incrementally maintained per-user daily nutrition totals (daily_nutrition).
+#
+# Every meal write adds or subtracts the meal's macro totals on its
+# (user_id, UTC day) row with one upsert, so summaries read a handful of
+# pre-aggregated rows instead of every meal and its foods.
+#
+# Backfill or repair with:
+#   python -m app.services.nutrition_rollups rebuild [user_id]
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import Date, cast, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+
+MACROS = ("calories", "protein", "fat", "carbohydrates")
+GRANULARITIES = ("day", "week", "month")
+
+
+class MealContribution:
+    """What one meal adds to its day's rollup row."""
+
+    __slots__ = ("user_id", "day", "totals")
+
+    def __init__(self, user_id: int, day: date, totals: dict):
+        self.user_id = user_id
+        self.day = day
+        self.totals = totals
+
+
+def meal_day(timestamp: datetime) -> date:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date()
+
+
+def food_totals(foods, quantities: dict | None = None) -> dict:
+    """Macros of `foods`, each weighing quantities[food.id] grams (default 100 g)."""
+    factors = [
+        (quantities or {}).get(food.id, models.DEFAULT_QUANTITY) / models.DEFAULT_QUANTITY
+        for food in foods
+    ]
+    return {
+        macro: sum(getattr(food, macro) * factor for food, factor in zip(foods, factors))
+        for macro in MACROS
+    }
+
+
+def contribution(meal: models.Meal, quantities: dict | None = None) -> MealContribution:
+    """Snapshot of a meal's contribution. `meal.foods` must be loaded."""
+    return MealContribution(
+        meal.user_id, meal_day(meal.timestamp), food_totals(meal.foods, quantities)
+    )
+
+
+def _upsert(dialect_name: str):
+    return (postgresql if dialect_name == "postgresql" else sqlite).insert
+
+
+async def _increment(db: AsyncSession, rows: list[dict]):
+    """Add each row's totals to its (user_id, date) rollup, creating it if needed."""
+    if not rows:
+        return
+    table = models.DailyNutrition.__table__
+    statement = _upsert(db.bind.dialect.name)(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.date],
+        set_={
+            column: table.c[column] + statement.excluded[column]
+            for column in (*MACROS, "meal_count")
+        },
+    )
+    await db.execute(statement, rows)
+
+
+def _row(change: MealContribution, sign: int) -> dict:
+    row = {macro: sign * change.totals[macro] for macro in MACROS}
+    row.update(user_id=change.user_id, date=change.day, meal_count=sign)
+    return row
+
+
+async def add_meal(db: AsyncSession, change: MealContribution):
+    await _increment(db, [_row(change, 1)])
+
+
+async def add_meals(db: AsyncSession, changes: list[MealContribution]):
+    """Add many meals with one upsert row per (user_id, day)."""
+    rows: dict[tuple, dict] = {}
+    for change in changes:
+        row = rows.get((change.user_id, change.day))
+        if row is None:
+            rows[change.user_id, change.day] = _row(change, 1)
+            continue
+        row["meal_count"] += 1
+        for macro in MACROS:
+            row[macro] += change.totals[macro]
+    await _increment(db, list(rows.values()))
+
+
+async def remove_meal(db: AsyncSession, change: MealContribution):
+    await _increment(db, [_row(change, -1)])
+
+
+async def replace_meal(db: AsyncSession, before: MealContribution, after: MealContribution):
+    if (before.user_id, before.day, before.totals) == (after.user_id, after.day, after.totals):
+        return
+    await _increment(db, [_row(before, -1), _row(after, 1)])
+
+
+# ---------- Food macro changes ----------
+def _meal_date(dialect_name: str):
+    if dialect_name == "postgresql":
+        return cast(func.timezone("UTC", models.Meal.timestamp), Date)
+    return func.date(models.Meal.timestamp)
+
+
+async def change_food(db: AsyncSession, food_id: int, old: dict, new: dict):
+    """Shift every rollup containing a food whose macros were edited."""
+    await change_foods(db, {food_id: (old, new)})
+
+
+async def change_foods(db: AsyncSession, edits: dict[int, tuple[dict, dict]]):
+    """Shift rollups for many edited foods, {food_id: (old, new)}, with one usage
+    query and one upsert."""
+    deltas = {}
+    for food_id, (old, new) in edits.items():
+        delta = {macro: new[macro] - old[macro] for macro in MACROS}
+        if any(delta.values()):
+            deltas[food_id] = delta
+    if not deltas:
+        return
+
+    day = _meal_date(db.bind.dialect.name)
+    links = models.meal_food_association.c
+    usage = await db.execute(
+        select(models.Meal.user_id, day, links.food_id, func.sum(links.quantity))
+        .join(models.meal_food_association)
+        .where(links.food_id.in_(list(deltas)))
+        .group_by(models.Meal.user_id, day, links.food_id)
+    )
+    rows: dict[tuple, dict] = {}
+    for user_id, meal_date, food_id, grams in usage:
+        if isinstance(meal_date, str):
+            meal_date = date.fromisoformat(meal_date)
+        row = rows.get((user_id, meal_date))
+        if row is None:
+            row = rows[user_id, meal_date] = {m: 0.0 for m in MACROS}
+            row.update(user_id=user_id, date=meal_date, meal_count=0)
+        delta = deltas[food_id]
+        for macro in MACROS:
+            row[macro] += delta[macro] * grams / models.DEFAULT_QUANTITY
+    await _increment(db, list(rows.values()))
+
+
+# ---------- Reading ----------
+def _period_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+async def summary(
+    db: AsyncSession, user_id: int, start: date, end: date, granularity: str = "day"
+) -> list[dict]:
+    # Single range scan over the (user_id, date) primary key
+    rows = await db.scalars(
+        select(models.DailyNutrition)
+        .where(
+            models.DailyNutrition.user_id == user_id,
+            models.DailyNutrition.date.between(start, end),
+            models.DailyNutrition.meal_count > 0,  # days whose meals were all deleted
+        )
+        .order_by(models.DailyNutrition.date)
+    )
+
+    periods: dict[date, dict] = {}
+    for row in rows:
+        key = _period_start(row.date, granularity)
+        period = periods.setdefault(
+            key, {"period_start": key, "meal_count": 0, **{m: 0.0 for m in MACROS}}
+        )
+        period["meal_count"] += row.meal_count
+        for macro in MACROS:
+            period[macro] += getattr(row, macro)
+
+    # Increments and decrements leave float noise (11.399999999999999)
+    for period in periods.values():
+        for macro in MACROS:
+            period[macro] = round(period[macro], 3)
+    return list(periods.values())
+
+
+# ---------- Rebuild ----------
+def rebuild(connection, user_id: int | None = None):
+    """Recompute rollups from meals in one INSERT ... SELECT (sync connection)."""
+    table = models.DailyNutrition.__table__
+    day = _meal_date(connection.dialect.name)
+    factor = models.meal_food_association.c.quantity / models.DEFAULT_QUANTITY
+    totals = (
+        select(
+            models.Meal.user_id,
+            day.label("date"),
+            *(func.sum(getattr(models.Food, m) * factor).label(m) for m in MACROS),
+            func.count(func.distinct(models.Meal.id)).label("meal_count"),
+        )
+        .select_from(models.Meal)
+        .join(models.meal_food_association)
+        .join(models.Food)
+        .group_by(models.Meal.user_id, day)
+    )
+
+    clear = delete(table)
+    if user_id is not None:
+        totals = totals.where(models.Meal.user_id == user_id)
+        clear = clear.where(table.c.user_id == user_id)
+
+    connection.execute(clear)
+    connection.execute(
+        insert(table).from_select(["user_id", "date", *MACROS, "meal_count"], totals)
+    )
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database import engine
+
+    args = sys.argv[1:]
+    if not args or args[0] != "rebuild" or len(args) > 2:
+        sys.exit("usage: python -m app.services.nutrition_rollups rebuild [user_id]")
+    with engine.begin() as connection:
+        rebuild(connection, int(args[1]) if len(args) == 2 else None)
@@ -0,0 +1,2 @@
+# Benchmarks for the API's hot paths.
+# Each module is runnable on its own, e.g. `python -m benchmarks.async_vs_sync`.
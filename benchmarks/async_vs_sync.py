@@ -0,0 +1,78 @@
+# Requests/sec of the sync (threadpool) and async DB paths under concurrency.
+#
+#   python -m benchmarks.async_vs_sync --clients 500 --requests 20
+
+import argparse
+import asyncio
+
+from benchmarks.common import configure, drive, print_table, summarize
+
+
+def build_app():
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+    from app import models
+    from app.database import get_db, get_sync_db
+
+    app = FastAPI()
+
+    @app.get("/sync/foods")
+    def sync_foods(db: Session = Depends(get_sync_db)):
+        return [f.id for f in db.scalars(select(models.Food).limit(20))]
+
+    @app.get("/async/foods")
+    async def async_foods(db: AsyncSession = Depends(get_db)):
+        return [f.id for f in await db.scalars(select(models.Food).limit(20))]
+
+    return app
+
+
+def seed(foods: int):
+    from app import models
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add_all(
+            models.Food(
+                name=f"food-{i}", calories=100, protein=10, fat=5, carbohydrates=12
+            )
+            for i in range(foods)
+        )
+        db.commit()
+
+
+async def run(clients: int, requests: int):
+    import httpx
+    from app.database import async_engine
+
+    app = build_app()
+    transport = httpx.ASGITransport(app=app)
+    rows = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ("/sync/foods", "/async/foods"):
+            await client.get(path)  # warm up pools
+            latencies, elapsed = await drive(
+                lambda: client.get(path), clients, requests
+            )
+            rows.append(summarize(path, latencies, elapsed))
+    await async_engine.dispose()
+    print_table(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sync and async DB paths")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--foods", type=int, default=1000)
+    args = parser.parse_args()
+
+    configure()
+    seed(args.foods)
+    asyncio.run(run(args.clients, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Shared helpers for the benchmark scripts.
+# configure() must run before anything under `app` is imported: settings and
+# engines are created at import time.
+
+import asyncio
+import os
+import tempfile
+import time
+
+
+def configure(db_path: str | None = None, **overrides):
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="nutrition-bench-"), "bench.db")
+    url = f"sqlite:///{db_path}"
+    env = {
+        "SECRET_KEY": "bench-secret",
+        "ENVIRONMENT": "local",
+        "DEV_DATABASE_URL": url,
+        "DATABASE_URL": url,
+        "REDIS_URL": "redis://localhost:6379",
+        # Benchmarks measure the app, not the per-IP request quota
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    env.update({key: str(value) for key, value in overrides.items()})
+    os.environ.update(env)
+    return db_path
+
+
+def percentile(values, q: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name: str, latencies, elapsed: float):
+    count = len(latencies)
+    return {
+        "name": name,
+        "requests": count,
+        "seconds": round(elapsed, 3),
+        "rps": round(count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def drive(request, clients: int, requests_per_client: int):
+    """Run `clients` concurrent loops, each awaiting `request()` N times."""
+    return await drive_each([request] * clients, requests_per_client)
+
+
+async def drive_each(requests, requests_per_client: int):
+    """One concurrent loop per callable in `requests`, each awaiting it N times."""
+    latencies = []
+
+    async def client_loop(request):
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            await request()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(request) for request in requests))
+    return latencies, time.perf_counter() - started
+
+
+def print_table(rows):
+    for row in rows:
+        print(
+            f"{row['name']:<28} {row['requests']:>8} req  {row['rps']:>9} req/s  "
+            f"p50 {row['p50_ms']:>8} ms  p95 {row['p95_ms']:>8} ms  p99 {row['p99_ms']:>8} ms"
+        )
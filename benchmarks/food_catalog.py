@@ -0,0 +1,146 @@
+# Nutrient range filters and sorts: the columnar catalog snapshot against the
+# same query in SQL (dynamic WHERE + ORDER BY ... LIMIT, no index on the
+# macro columns), over --foods synthetic foods.
+#
+# Also times loading the snapshot and refreshing it incrementally after a
+# batch of food updates and deletions.
+#
+#   python -m benchmarks.food_catalog --foods 1000000
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import configure
+
+# (label, ranges, sort)
+QUERIES = (
+    ("protein >= 80 (selective)", {"protein": (80, None)}, None),
+    ("calories <= 300 (broad)", {"calories": (None, 300)}, None),
+    ("protein >= 20, calories < 300", {"protein": (20, None), "calories": (None, 300)}, None),
+    ("... sorted by -protein/calories", {"protein": (20, None), "calories": (None, 300)}, "-protein/calories"),
+    ("all, sorted by -protein", {}, "-protein"),
+    ("all, sorted by -protein/calories", {}, "-protein/calories"),
+)
+
+
+def sql_query(ranges: dict, sort: str | None, limit: int):
+    from sqlalchemy import select
+    from app import models
+    from app.services.food_catalog import parse_sort
+
+    query = select(models.Food)
+    for macro, (low, high) in ranges.items():
+        column = getattr(models.Food, macro)
+        if low is not None:
+            query = query.where(column >= low)
+        if high is not None:
+            query = query.where(column <= high)
+    if sort is None:
+        return query.order_by(models.Food.id).limit(limit)
+    macro, divisor, descending = parse_sort(sort)
+    key = getattr(models.Food, macro)
+    if divisor is not None:
+        key = key / getattr(models.Food, divisor)
+    return query.order_by(key.desc() if descending else key, models.Food.id).limit(limit)
+
+
+async def timed(function, repeat: int) -> float:
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await function()
+        runs.append(time.perf_counter() - started)
+    return statistics.median(runs)
+
+
+async def run(args):
+    from sqlalchemy import text
+    from app.core import hashing
+    from app.database import AsyncSessionLocal, dispose_engines
+    from app.services.food_catalog import food_catalog
+
+    try:
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await food_catalog.refresh(db)
+            print(f"snapshot of {food_catalog.columns.count:,} foods loaded in {time.perf_counter() - started:.2f}s\n")
+
+            print(f"{'query':<36} {'catalog us':>11} {'sql ms':>9}")
+            for label, ranges, sort in QUERIES:
+
+                async def catalog():
+                    food_catalog._sorted = {} if args.cold else food_catalog._sorted
+                    food_catalog.search(ranges, sort, 0, args.limit)
+
+                async def sql():
+                    (await db.scalars(sql_query(ranges, sort, args.limit))).all()
+
+                await catalog()  # builds the sorted columns it needs
+                print(
+                    f"{label:<36} {await timed(catalog, args.repeat) * 1e6:>11.0f} "
+                    f"{await timed(sql, max(1, args.repeat // 10)) * 1000:>9.1f}"
+                )
+
+            # Incremental refresh after a batch of writes, as the API stamps them
+            version = food_catalog.version + 1
+            await db.execute(
+                text("UPDATE food SET calories = calories + 1, revision = :v WHERE id % :n = 0"),
+                {"v": version, "n": max(1, args.foods // args.changes)},
+            )
+            await db.execute(
+                text(
+                    "INSERT INTO food_tombstone (food_id, revision) "
+                    "SELECT id, :v FROM food WHERE id % :n = 1 LIMIT :limit"
+                ),
+                {"v": version, "n": max(2, args.foods // args.changes), "limit": args.changes // 10},
+            )
+            await db.execute(text("DELETE FROM food WHERE id IN (SELECT food_id FROM food_tombstone)"))
+            await db.execute(text("UPDATE table_version SET version = :v WHERE name = 'food'"), {"v": version})
+            await db.commit()
+
+            started = time.perf_counter()
+            await food_catalog.refresh(db)
+            incremental = time.perf_counter() - started
+            started = time.perf_counter()
+            await food_catalog.refresh(db, full=True)
+            full = time.perf_counter() - started
+            print(
+                f"\nrefresh after ~{args.changes:,} updates and {args.changes // 10:,} deletions: "
+                f"incremental {incremental * 1000:.1f} ms, full reload {full * 1000:.1f} ms"
+            )
+    finally:
+        await dispose_engines()
+        hashing.shutdown_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare catalog snapshot queries with SQL")
+    parser.add_argument("--foods", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--changes", type=int, default=1000, help="foods updated before the refresh")
+    parser.add_argument("--cold", action="store_true", help="rebuild sorted columns on every query")
+    args = parser.parse_args()
+
+    configure()
+    from app.core.startup import prepare_database
+
+    prepare_database()
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "app.core.seed.synthetic", "--foods", str(args.foods), "--users", "0", "--meals", "0"],
+        env=os.environ.copy(),
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    print(f"seeded in {time.perf_counter() - started:.1f}s")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
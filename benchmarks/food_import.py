@@ -0,0 +1,150 @@
+# Throughput of POST /foods/bulk for CSV and NDJSON uploads.
+#
+#   python -m benchmarks.food_import --rows 200000
+
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import configure
+
+ROW_BATCH = 10_000
+FOODS_PER_MEAL = 4
+
+
+def rows(count: int, prefix: str, shift: int = 0):
+    for i in range(count):
+        yield {
+            "name": f"{prefix} food {i}",
+            "calories": 100 + i % 400 + shift,
+            "protein": i % 30,
+            "fat": i % 20,
+            "carbohydrates": i % 50,
+        }
+
+
+def csv_body(count: int, prefix: str, shift: int = 0):
+    yield b"name,calories,protein,fat,carbohydrates\n"
+    lines = []
+    for row in rows(count, prefix, shift):
+        lines.append("{name},{calories},{protein},{fat},{carbohydrates}\n".format(**row))
+        if len(lines) == ROW_BATCH:
+            yield "".join(lines).encode()
+            lines = []
+    yield "".join(lines).encode()
+
+
+def ndjson_body(count: int, prefix: str, shift: int = 0):
+    lines = []
+    for row in rows(count, prefix, shift):
+        lines.append(json.dumps(row) + "\n")
+        if len(lines) == ROW_BATCH:
+            yield "".join(lines).encode()
+            lines = []
+    yield "".join(lines).encode()
+
+
+async def stream(chunks):
+    # AsyncClient only accepts async request bodies
+    for chunk in chunks:
+        yield chunk
+
+
+def seed():
+    from sqlalchemy import insert
+    from app import models
+    from app.core.const.base_roles import BASE_ROLES
+    from app.core.seed.seed_permissions import seed_permissions
+    from app.core.seed.seed_roles import seed_roles
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        seed_permissions(db)
+        seed_roles(db)
+        specialist = db.query(models.Role).filter_by(name=BASE_ROLES.SPECIALIST).one()
+        db.execute(
+            insert(models.User),
+            [{"id": 1, "username": "bench", "email": "bench@local", "hashed_password": "x"}],
+        )
+        db.execute(insert(models.user_role_association), [{"user_id": 1, "role_id": specialist.id}])
+        db.commit()
+
+
+def log_meals(prefix: str):
+    """Put every imported food in a meal so macro changes have rollups to shift."""
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import func, insert, select
+    from app import models
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        food_ids = db.scalars(
+            select(models.Food.id).where(models.Food.name.like(f"{prefix} food %"))
+        ).all()
+        first_id = db.scalar(select(func.coalesce(func.max(models.Meal.id), 0))) + 1
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        meals, links = [], []
+        for n, offset in enumerate(range(0, len(food_ids), FOODS_PER_MEAL)):
+            meal_id = first_id + n
+            meals.append(
+                {"id": meal_id, "user_id": 1, "name": "bench", "timestamp": start + timedelta(hours=n)}
+            )
+            links.extend(
+                {"meal_id": meal_id, "food_id": food_id, "quantity": 150}
+                for food_id in food_ids[offset:offset + FOODS_PER_MEAL]
+            )
+        db.execute(insert(models.Meal), meals)
+        db.execute(insert(models.meal_food_association), links)
+        db.commit()
+
+
+async def run(count: int):
+    import httpx
+    from app.core.security import create_access_token
+    from app.database import dispose_engines
+    from app.main import app
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"{'format':<8} {'pass':<7} {'rows':>9} {'seconds':>8} {'rows/s':>10}")
+        for fmt, body, content_type in (
+            ("csv", csv_body, "text/csv"),
+            ("ndjson", ndjson_body, "application/x-ndjson"),
+        ):
+            # First pass inserts, second upserts identical rows, third changes every
+            # food's calories so each chunk shifts the rollups of meals using them
+            passes = (("insert", 0), ("upsert", 0), ("reprice", 1))
+            for label, shift in passes:
+                chunks = list(body(count, fmt, shift))  # generated outside the timing
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/v0/foods/bulk",
+                    content=stream(chunks),
+                    headers={**headers, "Content-Type": content_type},
+                )
+                elapsed = time.perf_counter() - started
+                assert response.status_code == 200, response.text
+                report = response.json()
+                assert report["imported"] == count, report
+                print(f"{fmt:<8} {label:<7} {count:>9} {elapsed:>8.2f} {count / elapsed:>10.0f}")
+                if label == "insert":
+                    log_meals(fmt)
+
+    await dispose_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming food import")
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    configure()
+    seed()
+    asyncio.run(run(args.rows))
+
+
+if __name__ == "__main__":
+    main()
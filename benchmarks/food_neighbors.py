@@ -0,0 +1,129 @@
+# k-NN over food macros: KD-tree query latency against a brute-force NumPy
+# scan of the whole catalog, at several catalog sizes.
+#
+# Foods come from the synthetic generator's macro distributions and are
+# loaded straight into the catalog snapshot (no database). For each size it
+# reports the tree build time, p50/p95 latency of "similar to a food" and
+# "nearest to macro targets" queries, the same after a batch of incremental
+# inserts and deletions, and checks the tree's answers against the scan. It
+# also times a background rebuild and the longest event-loop stall during it.
+#
+#   python -m benchmarks.food_neighbors --foods 100000 1000000 --queries 500
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import configure, percentile
+
+
+def brute_force(columns, scale, target, k: int, exclude=None):
+    import numpy as np
+    from app.services.nutrition_rollups import MACROS
+
+    ids = np.flatnonzero(columns.present)
+    vectors = np.stack([getattr(columns, macro)[ids] for macro in MACROS], axis=1) / scale
+    distances = ((vectors - np.asarray(target) / scale) ** 2).sum(axis=1)
+    part = np.argpartition(distances, k)[: k + 1]
+    part = part[np.lexsort((ids[part], distances[part]))]
+    return [food_id for food_id in ids[part].tolist() if food_id != exclude][:k]
+
+
+def latencies(function, arguments) -> list[float]:
+    timings = []
+    for argument in arguments:
+        started = time.perf_counter()
+        function(*argument)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def background_rebuild() -> tuple[float, float]:
+    """Seconds a due rebuild takes behind the event loop, and the longest stall."""
+    from app.services.food_neighbors import food_neighbors
+
+    food_neighbors.due = True
+    started = last = time.perf_counter()
+    stall = 0.0
+    await food_neighbors.prepare()
+    task = food_neighbors._rebuilding
+    while not task.done():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        stall, last = max(stall, now - last), now
+    return time.perf_counter() - started, stall
+
+
+def row(label: str, timings: list[float]) -> str:
+    return (
+        f"  {label:<34} p50 {percentile(timings, 50) * 1000:>8.3f} ms"
+        f"  p95 {percentile(timings, 95) * 1000:>8.3f} ms"
+    )
+
+
+def run(size: int, args):
+    import numpy as np
+    from app.core.seed.synthetic import Generator
+    from app.services.food_catalog import FoodColumns, food_catalog
+    from app.services.food_neighbors import food_neighbors
+
+    generator = Generator(SimpleNamespace(seed=args.seed))
+    columns = FoodColumns()
+    columns.put([(food_id, *macros) for food_id, _, *macros in generator.foods(1, size)])
+    food_catalog.columns = columns
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{size:,} foods")
+    started = time.perf_counter()
+    food_neighbors.rebuild(columns)
+    print(f"  {'KD-tree build':<34} {time.perf_counter() - started:>12.2f} s")
+    seconds, stall = asyncio.run(background_rebuild())
+    print(f"  {'KD-tree rebuild in the background':<34} {seconds:>12.2f} s  longest loop stall {stall * 1000:.1f} ms")
+
+    def queries():
+        food_ids = rng.choice(np.flatnonzero(columns.present), args.queries)
+        similar = [(food_catalog.macros(int(food_id)), args.k, int(food_id)) for food_id in food_ids]
+        _, *targets = generator.foods(0, args.queries + 1)
+        recommend = [(macros, args.k) for _, _, *macros in targets]
+        return similar, recommend
+
+    def measure(label: str):
+        similar, recommend = queries()
+        print(row(f"similar, KD-tree{label}", latencies(food_neighbors.nearest, similar)))
+        print(row(f"recommend, KD-tree{label}", latencies(food_neighbors.nearest, recommend)))
+        scan = lambda macros, k, exclude=None: brute_force(columns, food_neighbors.scale, macros, k, exclude)
+        print(row(f"recommend, brute force{label}", latencies(scan, recommend[: args.queries // 10 or 1])))
+        for arguments in similar[:50] + recommend[:50]:
+            assert food_neighbors.nearest(*arguments) == scan(*arguments), "KD-tree disagrees with the scan"
+
+    measure("")
+
+    # Incremental changes, as an incremental snapshot refresh delivers them
+    changes = max(1, int(size * args.changes))
+    removed = rng.choice(np.flatnonzero(columns.present), changes, replace=False)
+    added = np.arange(size + 1, size + changes + 1)
+    started = time.perf_counter()
+    columns.remove(removed)
+    columns.put([(food_id, *macros) for food_id, (_, _, *macros) in zip(added.tolist(), generator.foods(0, changes))])
+    food_neighbors.changed(columns, removed, added)
+    print(f"  {f'{changes:,} deletions + {changes:,} inserts':<34} {(time.perf_counter() - started) * 1000:>12.1f} ms")
+    measure(" (after)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure k-NN query latency over food macros")
+    parser.add_argument("--foods", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--changes", type=float, default=0.01, help="share of foods deleted and inserted")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    configure()
+    for size in args.foods:
+        run(size, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Latency of GET /foods/search over a large catalog (prefix, multi-word, typos).
+#
+#   python -m benchmarks.food_search --foods 1000000
+
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import configure, percentile
+
+BASES = (
+    "apple banana broccoli carrot chicken beef pork salmon tuna rice oats quinoa "
+    "lentils chickpeas spinach kale tomato potato yogurt cheese milk egg almond "
+    "walnut peanut avocado mango orange strawberry blueberry bread pasta tofu"
+).split()
+FORMS = "raw cooked boiled grilled roasted fried steamed dried canned frozen smoked".split()
+BRANDS = "acme farmfresh greenvalley sunny northstar bluecoast goldenfield".split()
+
+QUERIES = ("chick", "chicken grilled", "brocolli", "salmn smoked", "qui", "yogurt acme", "avocdo")
+
+
+def vocabulary(rng, size: int):
+    """Real food words plus pseudo-words, so term frequencies look like a catalog."""
+    syllables = "ba be bo ca ce co da de do fa fe ga go ka ke la le lo ma me mo na ne no pa pe ra re ro sa se ta te to va ve za".split()
+    words = {"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(size)}
+    return BASES + sorted(words)
+
+
+def seed(foods: int):
+    from sqlalchemy import insert
+    from app import models
+    from app.database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(7)
+    words = vocabulary(rng, 5_000)
+    with engine.begin() as conn:
+        batch = 50_000
+        for offset in range(0, foods, batch):
+            conn.execute(
+                insert(models.Food),
+                [
+                    {
+                        "name": f"{rng.choice(BRANDS)} {rng.choice(words)} {rng.choice(FORMS)} {i}",
+                        "calories": 100,
+                        "protein": 10,
+                        "fat": 5,
+                        "carbohydrates": 12,
+                    }
+                    for i in range(offset, min(offset + batch, foods))
+                ],
+            )
+
+
+async def run(repeat: int):
+    import httpx
+    from app.database import async_engine
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'query':<18} {'hits':>5} {'p50 ms':>8} {'p95 ms':>8}")
+        for q in QUERIES:
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = await client.get("/api/v0/foods/search", params={"q": q})
+                samples.append(time.perf_counter() - started)
+            hits = len(response.json())
+            print(
+                f"{q:<18} {hits:>5} {percentile(samples, 50) * 1000:>8.2f} "
+                f"{percentile(samples, 95) * 1000:>8.2f}"
+            )
+
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark food search")
+    parser.add_argument("--foods", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    configure()
+    seed(args.foods)
+    asyncio.run(run(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# p99 latency of /health while a burst of logins is hashing passwords.
+# Exits non-zero when that p99 is above --max-p99-ms, or when the storm was
+# over before the probes were (tests/test_login_storm.py runs it).
+#
+#   python -m benchmarks.login_storm --logins 200 --probes 200 --max-p99-ms 50
+
+import argparse
+import asyncio
+import sys
+
+from benchmarks.common import configure, drive, percentile, print_table, summarize
+
+USERNAME = "storm"
+PASSWORD = "storm-password"
+
+
+def seed():
+    from app import models
+    from app.core.hashing import get_password_hash
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(
+            models.User(
+                username=USERNAME,
+                email="storm@bench.local",
+                hashed_password=get_password_hash(PASSWORD),
+            )
+        )
+        db.commit()
+
+
+async def run(logins: int, concurrency: int, probes: int, max_p99_ms: float) -> bool:
+    import httpx
+    from app.core import hashing
+    from app.database import async_engine
+    from app.main import app
+
+    form = {"username": USERNAME, "password": PASSWORD}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def probe():
+            await client.get("/health")
+
+        async def login():
+            response = await client.post("/api/v0/auth/login", data=form)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        statuses = {}
+        idle, idle_elapsed = await drive(probe, 1, probes)
+
+        storm = asyncio.create_task(drive(login, concurrency, logins // concurrency))
+        await asyncio.sleep(0.05)  # let the storm saturate the pool first
+        busy, busy_elapsed = await drive(probe, 1, probes)
+        overlapped = not storm.done()
+        login_latencies, login_elapsed = await storm
+
+    await async_engine.dispose()
+    hashing.shutdown_pool()
+
+    print_table(
+        [
+            summarize("/health (idle)", idle, idle_elapsed),
+            summarize("/health (login storm)", busy, busy_elapsed),
+            summarize("/auth/login", login_latencies, login_elapsed),
+        ]
+    )
+    print("login status codes:", statuses)
+
+    p99_ms = percentile(busy, 99) * 1000
+    if not overlapped:
+        print("FAIL: the login storm ended before the probes; raise --logins")
+    elif p99_ms > max_p99_ms:
+        print(f"FAIL: /health p99 {p99_ms:.2f} ms during the storm, over {max_p99_ms} ms")
+    return overlapped and p99_ms <= max_p99_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure /health latency during a login storm")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--max-p99-ms", type=float, default=50.0, help="fail above this /health p99")
+    args = parser.parse_args()
+
+    configure()
+    seed()
+    sys.exit(0 if asyncio.run(run(args.logins, args.concurrency, args.probes, args.max_p99_ms)) else 1)
+
+
+if __name__ == "__main__":
+    main()
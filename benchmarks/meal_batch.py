@@ -0,0 +1,80 @@
+# Meal logging throughput: POST /meals/ once per meal against POST
+# /meals/batch at several batch sizes, for the same number of meals.
+#
+#   python -m benchmarks.meal_batch --meals 5000 --sizes 10 100 1000
+
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import configure, drive
+
+
+def meal(rng: random.Random, foods: int) -> dict:
+    food_ids = rng.sample(range(1, foods + 1), rng.randint(1, 4))
+    return {"id": 0, "user_id": 0, "name": "bench meal", "food_ids": food_ids}
+
+
+async def run(args):
+    import httpx
+    from app.core import hashing
+    from app.core.security import create_access_token
+    from app.database import dispose_engines
+    from app.main import app
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def single():
+                response = await client.post("/api/v0/meals/", json=meal(rng, args.foods), headers=headers)
+                assert response.status_code == 200, response.text
+
+            def batch_of(size: int):
+                async def request():
+                    body = {"meals": [meal(rng, args.foods) for _ in range(size)]}
+                    response = await client.post("/api/v0/meals/batch", json=body, headers=headers)
+                    assert response.status_code == 200 and response.json()["failed"] == 0, response.text
+
+                return request
+
+            runs = [("one meal per request", 1, single)]
+            runs += [(f"batch of {size}", size, batch_of(size)) for size in args.sizes]
+            print(f"{'':<24} {'requests':>9} {'meals/s':>10} {'p50 ms/request':>15}")
+            for name, size, request in runs:
+                per_client = max(1, args.meals // (size * args.clients))
+                latencies, elapsed = await drive(request, args.clients, per_client)
+                meals = len(latencies) * size
+                latencies.sort()
+                print(
+                    f"{name:<24} {len(latencies):>9} {meals / elapsed:>10.0f} "
+                    f"{latencies[len(latencies) // 2] * 1000:>15.1f}"
+                )
+    finally:
+        await dispose_engines()
+        hashing.shutdown_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single and batch meal logging")
+    parser.add_argument("--meals", type=int, default=5000, help="meals logged per run")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--foods", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    configure()
+    from benchmarks.suite import seed
+
+    started = time.perf_counter()
+    seed(args.foods, 1, 0, args.seed)
+    print(f"seeded in {time.perf_counter() - started:.1f}s")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
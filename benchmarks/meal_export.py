@@ -0,0 +1,129 @@
+# Server memory while GET /meals/export streams a large history.
+#
+# Runs the app under uvicorn in a subprocess (the in-process ASGI transport
+# buffers whole responses) and samples the server's RSS as the export is
+# read. A flat column means memory does not depend on history size.
+#
+#   python -m benchmarks.meal_export --meals 1000000
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import configure
+
+PORT = 8765
+FOODS = 1_000
+
+
+def seed(meals: int):
+    from sqlalchemy import insert
+    from app import models
+    from app.database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.User),
+            [{"id": 1, "username": "bench", "email": "bench@local", "hashed_password": "x"}],
+        )
+        conn.execute(
+            insert(models.Food),
+            [
+                {"id": i, "name": f"food {i}", "calories": 100, "protein": 10, "fat": 5, "carbohydrates": 12}
+                for i in range(1, FOODS + 1)
+            ],
+        )
+        batch = 50_000
+        for offset in range(0, meals, batch):
+            ids = range(offset + 1, min(offset + batch, meals) + 1)
+            conn.execute(
+                insert(models.Meal),
+                [
+                    {"id": i, "user_id": 1, "name": f"meal {i}", "timestamp": start + timedelta(minutes=i)}
+                    for i in ids
+                ],
+            )
+            # Two foods per meal
+            conn.execute(
+                insert(models.meal_food_association),
+                [{"meal_id": i, "food_id": f} for i in ids for f in {1 + i % FOODS, 1 + (i * 7 + 3) % FOODS}],
+            )
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def wait_until_up(client, url: str):
+    for _ in range(100):
+        try:
+            client.get(url)
+            return
+        except Exception:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run(meals: int, fmt: str):
+    import httpx
+    from app.core.security import create_access_token
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    try:
+        base = f"http://127.0.0.1:{PORT}"
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+        with httpx.Client(base_url=base, timeout=None) as client:
+            wait_until_up(client, "/")
+            idle = rss_mb(server.pid)
+            print(f"server RSS before export: {idle:.1f} MB")
+            print(f"{'meals':>10} {'MB sent':>9} {'RSS MB':>8}")
+
+            started = time.perf_counter()
+            exported = received = 0
+            report_every = max(1, meals // 10)
+            peak = idle
+            with client.stream("GET", "/api/v0/meals/export", params={"format": fmt}, headers=headers) as response:
+                assert response.status_code == 200, response.read()
+                for line in response.iter_lines():
+                    received += len(line) + 1
+                    exported += 1
+                    if exported % report_every == 0:
+                        rss = rss_mb(server.pid)
+                        peak = max(peak, rss)
+                        print(f"{exported:>10} {received / 2**20:>9.1f} {rss:>8.1f}")
+            elapsed = time.perf_counter() - started
+
+        print(
+            f"{exported} lines in {elapsed:.1f}s ({exported / elapsed:.0f}/s), "
+            f"peak RSS {peak:.1f} MB (+{peak - idle:.1f} MB over idle)"
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server memory during meal export")
+    parser.add_argument("--meals", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    args = parser.parse_args()
+
+    configure()
+    seed(args.meals)
+    run(args.meals, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Meal totals: the NumPy engine against the naive ORM loop, for the same
+# meals with random portions.
+#
+#   naive   load the meals with their foods (selectinload) and their
+#           portions, then add up food.macro * grams / 100 in Python
+#   engine  load the portions, then one gather and np.bincount per macro
+#           over the catalog snapshot's columns (app/services/nutrition_engine.py)
+#
+# Both load the same portion rows; "compute" is the time spent after the
+# queries. The catalog snapshot is loaded once, before timing.
+#
+#   python -m benchmarks.nutrition_engine --meals 1000 10000 50000 --foods 10000
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.common import configure
+
+
+async def naive(db, meal_ids):
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from app import models
+    from app.services.nutrition_engine import portions
+    from app.services.nutrition_rollups import MACROS
+
+    meals = (
+        await db.scalars(
+            select(models.Meal).where(models.Meal.id.in_(meal_ids)).options(selectinload(models.Meal.foods))
+        )
+    ).all()
+    grams = {(meal_id, food_id): quantity for meal_id, food_id, quantity in await portions(db, meal_ids)}
+    started = time.perf_counter()
+    totals = {}
+    for meal in meals:
+        totals[meal.id] = {
+            macro: sum(getattr(food, macro) * grams[meal.id, food.id] / 100 for food in meal.foods)
+            for macro in MACROS
+        }
+    return totals, time.perf_counter() - started
+
+
+async def engine(db, meal_ids):
+    import numpy as np
+    from app.services.nutrition_engine import portions, totals
+
+    rows = await portions(db, meal_ids)
+    started = time.perf_counter()
+    position = {meal_id: index for index, meal_id in enumerate(meal_ids)}
+    meal_index = np.fromiter((position[row[0]] for row in rows), np.intp, len(rows))
+    food_ids = np.fromiter((row[1] for row in rows), np.intp, len(rows))
+    grams = np.fromiter((row[2] for row in rows), float, len(rows))
+    sums = await totals(db, meal_index, food_ids, grams, len(meal_ids))
+    return sums, time.perf_counter() - started
+
+
+async def run(args):
+    import numpy as np
+    from app.core import hashing
+    from app.database import AsyncSessionLocal, dispose_engines
+    from app.services.food_catalog import food_catalog
+    from app.services.nutrition_rollups import MACROS
+
+    try:
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await food_catalog.refresh(db)
+            print(f"catalog snapshot loaded in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+            print(f"{'meals':>7} {'':<7} {'total ms':>9} {'compute ms':>11} {'meals/s':>11}")
+            for count in args.meals:
+                meal_ids = list(range(1, count + 1))
+                results = {}
+                for name, method in (("naive", naive), ("engine", engine)):
+                    runs = []
+                    for _ in range(args.repeat):
+                        db.expunge_all()  # naive must load its meals again
+                        started = time.perf_counter()
+                        totals, compute = await method(db, meal_ids)
+                        runs.append((time.perf_counter() - started, compute))
+                    results[name] = totals
+                    total = statistics.median(run[0] for run in runs)
+                    compute = statistics.median(run[1] for run in runs)
+                    print(f"{count:>7} {name:<7} {total * 1000:>9.1f} {compute * 1000:>11.2f} {count / total:>11.0f}")
+
+                expected = np.array([[results["naive"][i][m] for m in MACROS] for i in meal_ids])
+                assert np.allclose(expected, results["engine"]), "engine totals differ from the ORM loop"
+    finally:
+        await dispose_engines()
+        hashing.shutdown_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare meal totals: NumPy engine vs ORM loop")
+    parser.add_argument("--meals", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--foods", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    configure()
+    from sqlalchemy import text
+    from benchmarks.suite import seed
+    from app.database import engine
+
+    started = time.perf_counter()
+    seed(args.foods, 100, max(args.meals), args.seed)
+    with engine.begin() as connection:
+        # Portions between 10 g and 500 g instead of the 100 g default
+        connection.execute(text("UPDATE meal_food_association SET quantity = 10 + abs(random()) % 491"))
+    print(f"seeded in {time.perf_counter() - started:.1f}s")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Latency of GET /meals from page 1 to page 10,000: OFFSET vs keyset cursors.
+#
+#   python -m benchmarks.pagination --meals 1000000 --limit 100
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import configure, percentile
+
+PAGES = (1, 10, 100, 1_000, 10_000)
+
+
+def seed(meals: int):
+    from sqlalchemy import insert
+    from app import models
+    from app.database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.User),
+            [{"id": 1, "username": "bench", "email": "bench@local", "hashed_password": "x"}],
+        )
+        batch = 50_000
+        for offset in range(0, meals, batch):
+            conn.execute(
+                insert(models.Meal),
+                [
+                    {"user_id": 1, "name": f"meal {i}", "timestamp": start + timedelta(minutes=i)}
+                    for i in range(offset, min(offset + batch, meals))
+                ],
+            )
+
+
+def cursor_for_page(page: int, limit: int):
+    """Cursor a client would hold after walking to `page`."""
+    from sqlalchemy import select
+    from app import models
+    from app.core.pagination import NEXT, encode_cursor
+    from app.database import SessionLocal
+
+    if page == 1:
+        return None
+    with SessionLocal() as db:
+        row = db.execute(
+            select(models.Meal.timestamp, models.Meal.id)
+            .where(models.Meal.user_id == 1)
+            .order_by(models.Meal.timestamp, models.Meal.id)
+            .offset((page - 1) * limit - 1)
+            .limit(1)
+        ).one()
+    return encode_cursor(list(row), NEXT)
+
+
+async def run(limit: int, repeat: int):
+    import httpx
+    from app.core.security import create_access_token
+    from app.database import async_engine
+    from app.main import app
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def timed(params):
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = await client.get("/api/v0/meals/", params=params, headers=headers)
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+            return percentile(samples, 50) * 1000
+
+        await timed({"limit": limit})  # warm up
+        print(f"{'page':>8} {'offset p50 ms':>15} {'cursor p50 ms':>15}")
+        for page in PAGES:
+            offset_ms = await timed({"page": page, "limit": limit})
+            cursor = cursor_for_page(page, limit)
+            params = {"limit": limit} | ({"cursor": cursor} if cursor else {})
+            cursor_ms = await timed(params)
+            print(f"{page:>8} {offset_ms:>15.2f} {cursor_ms:>15.2f}")
+
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare offset and cursor pagination")
+    parser.add_argument("--meals", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    configure()
+    seed(args.meals)
+    asyncio.run(run(args.limit, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
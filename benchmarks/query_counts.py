@@ -0,0 +1,115 @@
+# Guard against N+1 queries: the number of SQL statements a list endpoint runs
+# must not depend on the page size. Exits non-zero when it does
+# (tests/test_query_counts.py runs it).
+#
+#   python -m benchmarks.query_counts
+
+import argparse
+import asyncio
+import sys
+
+from benchmarks.common import configure
+
+ENDPOINTS = ("/api/v0/foods/", "/api/v0/meals/", "/api/v0/users/")
+PAGE_SIZES = (1, 10, 100)
+
+
+def seed(rows: int):
+    from sqlalchemy import insert
+    from app import models
+    from app.core.const.base_roles import BASE_ROLES
+    from app.core.seed.seed_permissions import seed_permissions
+    from app.core.seed.seed_roles import seed_roles
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        seed_permissions(db)
+        seed_roles(db)
+        user_role = models.Role(name=BASE_ROLES.USER)
+        db.add(user_role)
+        db.commit()
+        admin_role = db.query(models.Role).filter_by(name=BASE_ROLES.ADMIN).one()
+        role_ids = (admin_role.id, user_role.id)
+
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.User),
+            [
+                {"id": i, "username": f"user{i}", "email": f"user{i}@local", "hashed_password": "x"}
+                for i in range(1, rows + 1)
+            ],
+        )
+        conn.execute(
+            insert(models.user_role_association),
+            # user 1 is the admin making the requests
+            [{"user_id": i, "role_id": role_ids[i > 1]} for i in range(1, rows + 1)],
+        )
+        conn.execute(
+            insert(models.Food),
+            [
+                {"id": i, "name": f"food{i}", "calories": 1, "protein": 1, "fat": 1, "carbohydrates": 1}
+                for i in range(1, rows + 1)
+            ],
+        )
+        conn.execute(
+            insert(models.Meal),
+            [{"id": i, "user_id": 1, "name": f"meal{i}"} for i in range(1, rows + 1)],
+        )
+        conn.execute(
+            insert(models.meal_food_association),
+            [
+                {"meal_id": i, "food_id": f}
+                for i in range(1, rows + 1)
+                for f in {1 + i % rows, 1 + (i * 7) % rows}
+            ],
+        )
+
+
+async def run() -> bool:
+    import httpx
+    from sqlalchemy import event
+    from app.core.security import create_access_token
+    from app.database import async_engine
+    from app.main import app
+
+    statements = []
+    event.listen(
+        async_engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+    ok = True
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://guard") as client:
+        for endpoint in ENDPOINTS:
+            await client.get(endpoint, headers=headers)  # warm the RBAC index
+            counts = {}
+            for size in PAGE_SIZES:
+                statements.clear()
+                response = await client.get(endpoint, params={"limit": size}, headers=headers)
+                assert response.status_code == 200, response.text
+                counts[size] = len(statements)
+
+            constant = len(set(counts.values())) == 1
+            ok &= constant
+            print(f"{'ok ' if constant else 'N+1'} {endpoint:<20} queries by page size: {counts}")
+
+    await async_engine.dispose()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check list endpoints for N+1 queries")
+    parser.add_argument("--rows", type=int, default=200)
+    args = parser.parse_args()
+
+    configure(CACHE_MAX_ENTRIES=0)  # count the handler's queries, not cache hits
+    seed(args.rows)
+    sys.exit(0 if asyncio.run(run()) else 1)
+
+
+if __name__ == "__main__":
+    main()
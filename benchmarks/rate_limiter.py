@@ -0,0 +1,125 @@
+# Cost of a rate limit check, per backend and per request.
+#
+# "check" times limiter.hit() alone over --keys distinct clients. "request"
+# calls a minimal FastAPI app directly through ASGI (no HTTP client) with
+# no limit, the default-limit middleware, and middleware plus a route
+# dependency; the difference to the bare app is what the limiter adds to a
+# request. The target is < 100 µs.
+#
+#   python -m benchmarks.rate_limiter --checks 100000
+#   python -m benchmarks.rate_limiter --redis-url redis://localhost:6379
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.common import configure
+
+LIMIT = "1000000/second"  # never rejects: every check takes the write path
+
+
+def backends(redis_url: str | None):
+    from app.core import limiter
+
+    shm_path = os.path.join(tempfile.mkdtemp(prefix="nutrition-bench-"), "rate-limit")
+    found = {
+        "memory": limiter.InMemoryRateLimitBackend(),
+        "shm": limiter.SharedMemoryRateLimitBackend(shm_path, 65_536),
+    }
+    if redis_url:
+        from redis import asyncio as aioredis
+
+        found["redis"] = limiter.RedisRateLimitBackend(aioredis.from_url(redis_url), prefix="bench-rate-limit")
+    return found
+
+
+async def time_checks(backend, checks: int, keys: int) -> float:
+    from app.core.limiter import RateLimit
+
+    limit = RateLimit.parse(LIMIT)
+    started = time.perf_counter()
+    for i in range(checks):
+        await backend.hit(f"ip:10.0.{i % keys // 256}.{i % 256}", limit)
+    return (time.perf_counter() - started) / checks
+
+
+def build_app(route_limit: bool, middleware: bool):
+    from fastapi import Depends, FastAPI
+    from app.core.limiter import RateLimitMiddleware, rate_limit
+
+    app = FastAPI()
+    dependencies = [Depends(rate_limit(LIMIT))] if route_limit else []
+
+    @app.get("/ping", dependencies=dependencies)
+    async def ping():
+        return {"ok": True}
+
+    if middleware:
+        app.add_middleware(RateLimitMiddleware, limit=LIMIT)
+    return app
+
+
+async def time_requests(app, requests: int, keys: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    def scope(i: int) -> dict:
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/ping",
+            "raw_path": b"/ping",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"bench")],
+            "client": (f"10.0.{i % keys // 256}.{i % 256}", 1234),
+            "server": ("bench", 80),
+        }
+
+    for i in range(200):  # warm up routing and dependency caches
+        await app(scope(i), receive, send)
+    started = time.perf_counter()
+    for i in range(requests):
+        await app(scope(i), receive, send)
+    return (time.perf_counter() - started) / requests
+
+
+async def run(checks: int, requests: int, keys: int, redis_url: str | None):
+    from app.core.limiter import limiter
+
+    print(f"{'backend':<8} {'check µs':>9} {'+middleware µs':>15} {'+route limit µs':>16}")
+    bare = await time_requests(build_app(route_limit=False, middleware=False), requests, keys)
+    for name, backend in backends(redis_url).items():
+        limiter.backend = backend
+        check = await time_checks(backend, checks, keys)
+        middleware = await time_requests(build_app(route_limit=False, middleware=True), requests, keys)
+        both = await time_requests(build_app(route_limit=True, middleware=True), requests, keys)
+        print(
+            f"{name:<8} {check * 1e6:>9.1f} {(middleware - bare) * 1e6:>15.1f} "
+            f"{(both - bare) * 1e6:>16.1f}"
+        )
+    print(f"bare request: {bare * 1e6:.1f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure rate limiter overhead")
+    parser.add_argument("--checks", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--keys", type=int, default=10_000, help="distinct client IPs")
+    parser.add_argument("--redis-url", help="also measure the Redis backend")
+    args = parser.parse_args()
+
+    configure(RATE_LIMIT_ENABLED="true")
+    asyncio.run(run(args.checks, args.requests, args.keys, args.redis_url))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Replica routing with local SQLite files standing in for replicas.
+#
+# Seeds a primary, copies it to --replicas files (the copies never receive
+# later writes, like replicas lagging forever), then:
+# - drives the suite's "history" mix under each strategy and reports the
+#   share of statements each engine ran;
+# - logs a meal and reads it back at once, per user, with and without the
+#   read-your-writes window. Without it the read lands on a replica that
+#   does not have the meal yet and answers 404.
+#
+#   python -m benchmarks.replica_routing --replicas 3
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+from benchmarks.common import configure, drive_each, print_table, summarize
+
+STRATEGIES = ("round_robin", "least_connections")
+
+
+async def read_your_writes(client, ctx, users: int) -> int:
+    """Meals found when read back right after being logged."""
+    found = 0
+    for user_id in range(1, users + 1):
+        body = {"id": 0, "user_id": 0, "name": "fresh meal", "food_ids": [1]}
+        created = await client.post("/api/v0/meals/", json=body, headers=ctx.headers(user_id))
+        assert created.status_code == 200, created.text
+        response = await client.get(f"/api/v0/meals/{created.json()['id']}", headers=ctx.headers(user_id))
+        found += response.status_code == 200
+    return found
+
+
+async def run(args):
+    import httpx
+    from sqlalchemy import event
+    from app import database
+    from app.core import hashing
+    from app.core.stickiness import InMemoryStickinessStore
+    from app.main import app
+    from benchmarks.suite import Context, history
+
+    statements: Counter = Counter()
+    for name, target in database.ENGINES.items():
+        event.listen(
+            target,
+            "before_cursor_execute",
+            lambda *_, name=name: statements.update((name,)),
+        )
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            rows = []
+            for strategy in STRATEGIES:
+                database.replica_router.strategy = strategy
+                ctx = Context(client, args.foods, args.users, args.seed)
+                statements.clear()
+                latencies, elapsed = await drive_each(
+                    [history(ctx) for _ in range(args.clients)], args.requests
+                )
+                rows.append(summarize(f"history ({strategy})", latencies, elapsed))
+                total = sum(statements.values()) or 1
+                shares = ", ".join(f"{name} {count / total:.0%}" for name, count in sorted(statements.items()))
+                print(f"{strategy}: statements by engine: {shares}; errors: "
+                      f"{sum(count for status, count in ctx.statuses.items() if status >= 400)}")
+            print_table(rows)
+
+            ctx = Context(client, args.foods, args.users, args.seed)
+            sticky = await read_your_writes(client, ctx, args.users)
+            database.recent_writers = InMemoryStickinessStore(window=0)
+            stale = await read_your_writes(client, ctx, args.users)
+            print(f"read back right after writing: {sticky}/{args.users} with the window, "
+                  f"{stale}/{args.users} without")
+    finally:
+        await database.dispose_engines()
+        hashing.shutdown_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route reads over local SQLite replicas")
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=50, help="per client")
+    parser.add_argument("--foods", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--meals", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="nutrition-bench-")
+    primary = os.path.join(directory, "primary.db")
+    replicas = [os.path.join(directory, f"replica{i}.db") for i in range(1, args.replicas + 1)]
+    # Count the handlers' queries, not response cache hits
+    configure(
+        primary,
+        DATABASE_REPLICA_URLS=",".join(f"sqlite:///{path}" for path in replicas),
+        CACHE_MAX_ENTRIES=0,
+    )
+
+    from benchmarks.suite import seed
+
+    seed(args.foods, args.users, args.meals, args.seed)
+    for path in replicas:
+        shutil.copyfile(primary, path)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
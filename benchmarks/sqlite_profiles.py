@@ -0,0 +1,59 @@
+# Mixed read/write throughput under each DATABASE_PROFILE.
+#
+# Runs the "mixed" load of benchmarks.suite (history reads with 20% meal
+# logging) once per profile, each against a fresh SQLite file, and prints
+# them side by side with the error responses seen ("database is locked"
+# surfaces as 500s). --mode http with several workers adds cross-process
+# lock contention to the in-process concurrency.
+#
+#   python -m benchmarks.sqlite_profiles --mode http --workers 4 --clients 50
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROFILES = ("default", "production")
+
+
+def run_profile(profile: str, args) -> dict:
+    output = os.path.join(tempfile.mkdtemp(prefix="nutrition-bench-"), "result.json")
+    command = [
+        sys.executable, "-m", "benchmarks.suite", "run",
+        "--mixes", "mixed",
+        "--mode", args.mode,
+        "--workers", str(args.workers),
+        "--clients", str(args.clients),
+        "--requests", str(args.requests),
+        "--meals", str(args.meals),
+        "--save", output,
+    ]
+    # A separate process per profile: engines are configured at import time
+    subprocess.run(command, env={**os.environ, "DATABASE_PROFILE": profile}, check=True)
+    with open(output) as file:
+        return json.load(file)["results"]["mixed"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SQLite engine profiles under mixed load")
+    parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=40, help="per client")
+    parser.add_argument("--meals", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = {profile: run_profile(profile, args) for profile in PROFILES}
+    print()
+    print(f"{'profile':<12} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for profile, row in rows.items():
+        print(
+            f"{profile:<12} {row['rps']:>9} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+            f"{row['p99_ms']:>9} {row['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
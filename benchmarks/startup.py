@@ -0,0 +1,90 @@
+# Cold start: time from launching uvicorn to the first byte of GET /health.
+#
+# Each boot is a new server process against either a fresh database (schema
+# created, roles and admin seeded) or one that a previous boot prepared, with
+# --workers processes starting together. Also reports how long importing
+# app.main takes on its own.
+#
+#   python -m benchmarks.startup --workers 1 4 --repeat 5
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import configure
+
+PORT = 8767
+
+
+def import_seconds() -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], env=os.environ.copy(), capture_output=True, check=True)
+    return float(output.stdout)
+
+
+def first_byte(timeout: float = 60.0) -> bool:
+    """Poll GET /health until a response starts; False if the port never answers."""
+    deadline = time.perf_counter() + timeout
+    request = f"GET /health HTTP/1.1\r\nHost: 127.0.0.1:{PORT}\r\nConnection: close\r\n\r\n".encode()
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", PORT), timeout=timeout) as connection:
+                connection.sendall(request)
+                if connection.recv(1):
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.005)
+    return False
+
+
+def boot(workers: int) -> float:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(PORT), "--workers", str(workers), "--log-level", "error",
+        ],
+        env=os.environ.copy(),
+    )
+    try:
+        if not first_byte():
+            raise RuntimeError("server did not answer")
+        return time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start to first byte")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="nutrition-bench-")
+    configure(os.path.join(directory, "startup.db"))
+    imports = [import_seconds() for _ in range(args.repeat)]
+    print(f"{'import app.main':<32} median {statistics.median(imports) * 1000:>8.1f} ms")
+
+    for workers in args.workers:
+        fresh, prepared = [], []
+        for attempt in range(args.repeat):
+            database = os.path.join(directory, f"w{workers}-{attempt}.db")
+            configure(database)
+            fresh.append(boot(workers))
+            prepared.append(boot(workers))
+        for name, times in (("fresh database", fresh), ("prepared database", prepared)):
+            print(
+                f"{name + f', {workers} worker(s)':<32} median {statistics.median(times) * 1000:>8.1f} ms"
+                f"  max {max(times) * 1000:>8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
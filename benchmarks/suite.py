@@ -0,0 +1,375 @@
+# Load mixes over the API's hot paths, with JSON baselines.
+#
+# Seeds a deterministic dataset, then drives each mix with --clients
+# concurrent clients and reports throughput and p50/p95/p99:
+#
+#   browse   GET /foods, walking a few pages by cursor, and GET /foods/{id}
+#   log      POST /meals with 1-4 random foods, as random users
+#   history  GET /meals, walking a few pages by cursor, as random users
+#   login    POST /auth/login storm (bcrypt bound)
+#   mixed    history reads with 20% meal logging writes interleaved
+#
+# --mode inprocess calls the app through httpx's ASGI transport (no network,
+# measures the app alone); --mode http starts uvicorn in a subprocess and
+# sends real HTTP requests from this process. --database-url points both at
+# another database (e.g. a disposable Postgres); the default is a fresh
+# SQLite file.
+#
+# --save writes the results as JSON. "compare" checks results against a
+# baseline and exits non-zero when a mix's p95 grew, or its throughput
+# fell, by more than --tolerance:
+#
+#   python -m benchmarks.suite run --save baseline.json
+#   python -m benchmarks.suite run --save current.json --baseline baseline.json
+#   python -m benchmarks.suite compare baseline.json current.json --tolerance 0.2
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import configure, drive_each, print_table, summarize
+
+PASSWORD = "bench-password"
+PORT = 8766
+MIXES = ("browse", "log", "history", "login")  # "mixed" runs on request
+MIXED_WRITE_SHARE = 0.2
+LOGIN_SHARE = 10  # login requests are 1/10th of the others: each costs a bcrypt hash
+
+
+# ---------- Dataset ----------
+def seed(foods: int, users: int, meals: int, seed_value: int):
+    from sqlalchemy import insert
+    from app import models
+    from app.core.hashing import get_password_hash
+    from app.core.seed.seed_admin import seed_admin
+    from app.core.seed.seed_permissions import seed_permissions
+    from app.core.seed.seed_roles import seed_roles
+    from app.database import Base, SessionLocal, engine
+    from app.services import nutrition_rollups
+
+    rng = random.Random(seed_value)
+    hashed = get_password_hash(PASSWORD)  # one bcrypt hash shared by every user
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    Base.metadata.create_all(bind=engine)
+    # Seed roles up front: http mode's workers would race to do it at startup
+    with SessionLocal() as db:
+        seed_permissions(db)
+        seed_roles(db)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.User),
+            [
+                {"id": i, "username": f"bench{i}", "email": f"bench{i}@local", "hashed_password": hashed}
+                for i in range(1, users + 1)
+            ],
+        )
+        conn.execute(
+            insert(models.Food),
+            [
+                {
+                    "id": i,
+                    "name": f"food {i}",
+                    "calories": rng.uniform(10, 900),
+                    "protein": rng.uniform(0, 40),
+                    "fat": rng.uniform(0, 60),
+                    "carbohydrates": rng.uniform(0, 90),
+                }
+                for i in range(1, foods + 1)
+            ],
+        )
+        batch = 50_000
+        for offset in range(0, meals, batch):
+            ids = range(offset + 1, min(offset + batch, meals) + 1)
+            conn.execute(
+                insert(models.Meal),
+                [
+                    {
+                        "id": i,
+                        "user_id": 1 + i % users,
+                        "name": f"meal {i}",
+                        "timestamp": start + timedelta(minutes=i * 7),
+                    }
+                    for i in ids
+                ],
+            )
+            conn.execute(
+                insert(models.meal_food_association),
+                [
+                    {"meal_id": i, "food_id": food_id}
+                    for i in ids
+                    for food_id in set(rng.randint(1, foods) for _ in range(rng.randint(1, 4)))
+                ],
+            )
+        nutrition_rollups.rebuild(conn)
+    with SessionLocal() as db:
+        seed_admin(db)  # after the users, which take ids from 1
+
+
+# ---------- Mixes ----------
+class Context:
+    """What the mixes pick from; every client gets its own seeded RNG."""
+
+    def __init__(self, client, foods: int, users: int, seed_value: int):
+        from app.core.security import create_access_token
+
+        self.client = client
+        self.foods = foods
+        self.users = users
+        self.seed_value = seed_value
+        self.tokens = {}
+        self.statuses: dict[int, int] = {}
+        self._create_token = create_access_token
+
+    def headers(self, user_id: int) -> dict:
+        token = self.tokens.get(user_id)
+        if token is None:
+            token = self.tokens[user_id] = self._create_token({"sub": str(user_id)})
+        return {"Authorization": f"Bearer {token}"}
+
+    def record(self, response):
+        self.statuses[response.status_code] = self.statuses.get(response.status_code, 0) + 1
+
+    def rng(self) -> random.Random:
+        self.seed_value += 1
+        return random.Random(self.seed_value)
+
+
+def browse(ctx: Context):
+    rng, state = ctx.rng(), {"cursor": None, "pages": 0}
+
+    async def request():
+        if rng.random() < 0.3:
+            ctx.record(await ctx.client.get(f"/api/v0/foods/{rng.randint(1, ctx.foods)}"))
+            return
+        params = {"limit": 20}
+        if state["cursor"]:
+            params["cursor"] = state["cursor"]
+        response = await ctx.client.get("/api/v0/foods/", params=params)
+        ctx.record(response)
+        state["pages"] += 1
+        # Browse up to five pages, then start over
+        state["cursor"] = response.headers.get("x-next-cursor") if state["pages"] % 5 else None
+
+    return request
+
+
+def log(ctx: Context):
+    rng = ctx.rng()
+
+    async def request():
+        foods = sorted({rng.randint(1, ctx.foods) for _ in range(rng.randint(1, 4))})
+        body = {"id": 0, "user_id": 0, "name": "bench meal", "food_ids": foods}
+        user_id = rng.randint(1, ctx.users)
+        ctx.record(await ctx.client.post("/api/v0/meals/", json=body, headers=ctx.headers(user_id)))
+
+    return request
+
+
+def history(ctx: Context):
+    rng, state = ctx.rng(), {"cursor": None, "user": 1, "pages": 0}
+
+    async def request():
+        if state["pages"] % 3 == 0:
+            state["user"], state["cursor"] = rng.randint(1, ctx.users), None
+        params = {"limit": 20}
+        if state["cursor"]:
+            params["cursor"] = state["cursor"]
+        response = await ctx.client.get("/api/v0/meals/", params=params, headers=ctx.headers(state["user"]))
+        ctx.record(response)
+        state["pages"] += 1
+        state["cursor"] = response.headers.get("x-next-cursor")
+
+    return request
+
+
+def login(ctx: Context):
+    rng = ctx.rng()
+
+    async def request():
+        form = {"username": f"bench{rng.randint(1, ctx.users)}", "password": PASSWORD}
+        ctx.record(await ctx.client.post("/api/v0/auth/login", data=form))
+
+    return request
+
+
+def mixed(ctx: Context):
+    rng, read, write = ctx.rng(), history(ctx), log(ctx)
+
+    async def request():
+        await (write if rng.random() < MIXED_WRITE_SHARE else read)()
+
+    return request
+
+
+MIX_FACTORIES = {"browse": browse, "log": log, "history": history, "login": login, "mixed": mixed}
+
+
+# ---------- Drivers ----------
+async def run_mixes(client, args) -> dict:
+    results = {}
+    for name in args.mixes:
+        ctx = Context(client, args.foods, args.users, args.seed)
+        requests = args.requests if name != "login" else max(1, args.requests // LOGIN_SHARE)
+        await drive_each([MIX_FACTORIES[name](ctx)], min(20, requests))  # warm up
+        ctx.statuses.clear()
+        # Each client has its own request function: own RNG, own cursor
+        clients = [MIX_FACTORIES[name](ctx) for _ in range(args.clients)]
+        latencies, elapsed = await drive_each(clients, requests)
+        row = summarize(name, latencies, elapsed)
+        row["errors"] = sum(count for status, count in ctx.statuses.items() if status >= 400)
+        row["statuses"] = {str(status): count for status, count in sorted(ctx.statuses.items())}
+        results[name] = row
+    return results
+
+
+async def run_inprocess(args) -> dict:
+    import httpx
+    from app.core import hashing
+    from app.database import dispose_engines
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_mixes(client, args)
+    finally:
+        await dispose_engines()
+        hashing.shutdown_pool()
+
+
+async def run_http(args) -> dict:
+    import httpx
+
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(PORT), "--workers", str(args.workers), "--log-level", "warning",
+        ],
+        env=os.environ.copy(),
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.clients)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=None) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/health")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("server did not start")
+            return await run_mixes(client, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+# ---------- Baselines ----------
+def compare(baseline: dict, current: dict, tolerance: float) -> bool:
+    """Print per-mix deltas; False if any mix regressed beyond `tolerance`."""
+    for field in ("mode", "workers", "clients", "dataset", "database"):
+        if baseline["meta"].get(field) != current["meta"].get(field):
+            print(f"warning: {field} differs from the baseline, numbers are not comparable")
+    ok = True
+    print(f"{'mix':<10} {'rps':>18} {'p95 ms':>20}")
+    for name, base in baseline["results"].items():
+        row = current["results"].get(name)
+        if row is None:
+            continue
+        slower = row["p95_ms"] > base["p95_ms"] * (1 + tolerance)
+        fewer = row["rps"] < base["rps"] * (1 - tolerance)
+        new_errors = row.get("errors", 0) > base.get("errors", 0)
+        verdict = "REGRESSED" if slower or fewer or new_errors else "ok"
+        ok = ok and verdict == "ok"
+        print(
+            f"{name:<10} {base['rps']:>8} -> {row['rps']:<8} {base['p95_ms']:>9} -> {row['p95_ms']:<9} {verdict}"
+        )
+    return ok
+
+
+def load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def run(args):
+    overrides = {}
+    if args.database_url:
+        overrides = {"DEV_DATABASE_URL": args.database_url, "DATABASE_URL": args.database_url}
+    configure(**overrides)
+    started = time.perf_counter()
+    seed(args.foods, args.users, args.meals, args.seed)
+    print(f"seeded in {time.perf_counter() - started:.1f}s")
+
+    runner = run_http if args.mode == "http" else run_inprocess
+    results = asyncio.run(runner(args))
+    print_table(results.values())
+    for row in results.values():
+        if row["errors"]:
+            print(f"{row['name']}: {row['errors']} error responses {row['statuses']}")
+
+    report = {
+        "meta": {
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "http" else None,
+            "clients": args.clients,
+            "requests_per_client": args.requests,
+            "dataset": {"foods": args.foods, "users": args.users, "meals": args.meals, "seed": args.seed},
+            "database": (args.database_url or "sqlite").split(":")[0],
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"saved {args.save}")
+    if args.baseline and not compare(load(args.baseline), report, args.tolerance):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API's hot paths")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed, drive the mixes, report")
+    run_parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+    run_parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (http mode)")
+    run_parser.add_argument("--mixes", type=lambda value: value.split(","), default=list(MIXES))
+    run_parser.add_argument("--clients", type=int, default=20)
+    run_parser.add_argument("--requests", type=int, default=50, help="per client and mix")
+    run_parser.add_argument("--foods", type=int, default=10_000)
+    run_parser.add_argument("--users", type=int, default=100)
+    run_parser.add_argument("--meals", type=int, default=100_000)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--database-url", help="sync SQLAlchemy URL of an empty database")
+    run_parser.add_argument("--save", help="write results as JSON")
+    run_parser.add_argument("--baseline", help="compare against a saved run")
+    run_parser.add_argument("--tolerance", type=float, default=0.2)
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.2)
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        sys.exit(0 if compare(load(args.baseline), load(args.current), args.tolerance) else 1)
+    unknown = set(args.mixes) - set(MIX_FACTORIES)
+    if unknown:
+        parser.error(f"unknown mixes: {', '.join(sorted(unknown))}")
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
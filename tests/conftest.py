@@ -0,0 +1,20 @@
+# The guards drive the app in a child process each: settings and engines are
+# created when `app` is imported, so every run needs its own environment and
+# database (see benchmarks/common.py).
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def run_module():
+    def run(module: str, *args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [sys.executable, "-m", module, *args], cwd=ROOT, capture_output=True, text=True, timeout=600
+        )
+
+    return run
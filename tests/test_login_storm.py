@@ -0,0 +1,6 @@
+def test_health_p99_stays_low_during_login_storm(run_module):
+    # Enough logins that the storm outlasts the probes on a single core
+    result = run_module(
+        "benchmarks.login_storm", "--logins", "40", "--concurrency", "20", "--max-p99-ms", "50"
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
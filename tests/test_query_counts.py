@@ -0,0 +1,3 @@
+def test_list_endpoints_query_count_does_not_grow_with_page_size(run_module):
+    result = run_module("benchmarks.query_counts")
+    assert result.returncode == 0, result.stdout + result.stderr